@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+# pyramid_oas3 のベンチマーク (python -m benchmarks --help)
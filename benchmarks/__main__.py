@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import argparse
+import sys
+
+from benchmarks import runner
+from benchmarks.cases import CASES
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='pyramid_oas3 benchmarks')
+    parser.add_argument(
+        'patterns', nargs='*',
+        help='run only benchmarks matching these glob patterns')
+    parser.add_argument('--list', action='store_true',
+                        help='list benchmarks and exit')
+    parser.add_argument('-o', '--output',
+                        help='write results as JSON ("-" for stdout)')
+    parser.add_argument('-b', '--baseline',
+                        help='compare with results saved by --output')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative slowdown reported as regression')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='minimum seconds per measurement')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print('\n'.join(sorted(CASES)))
+        return 0
+    result = runner.run(args.patterns, args.repeat, args.min_time)
+    if args.output:
+        runner.save(result, args.output)
+    if args.output != '-':
+        print(runner.format_results(result))
+    if not args.baseline:
+        return 0
+    rows = runner.compare(
+        runner.load(args.baseline), result, args.threshold)
+    print(runner.format_comparison(rows), file=sys.stderr)
+    # 遅くなったものがあれば終了コード 1
+    return 1 if any(row[4] == 'regression' for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
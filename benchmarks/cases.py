@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# ベンチマークの一覧。各関数は計測対象の引数なしの関数を返す
+import json
+
+from pyramid_oas3.jsonschema import OAS3Validator, Resolver, formats
+from pyramid_oas3.traffic import RequestGenerator
+from pyramid_oas3.types import _compile_style, _compile_type
+from benchmarks import specs
+
+
+CASES = {}
+
+
+def case(name):
+    def _decorator(func):
+        CASES[name] = func
+        return func
+    return _decorator
+
+
+def _body_schema(spec, path):
+    return (spec['paths'][path]['post']['requestBody']['content']
+            ['application/json']['schema'])
+
+
+def _validator(spec, path, **kwargs):
+    return OAS3Validator(
+        _body_schema(spec, path), resolver=Resolver('', spec), **kwargs)
+
+
+def _validate_case(make_spec, **kwargs):
+    def _setup():
+        spec, path, data = make_spec()
+        validator = _validator(spec, path, **kwargs)
+        return lambda: validator.validate_result(data)
+    return _setup
+
+
+for _name, _make_spec in (
+        ('large_array', specs.large_array),
+        ('deep_ref', specs.deep_ref),
+        ('big_oneof', specs.big_oneof),
+        ('patterns', specs.patterns)):
+    case('validator.' + _name)(_validate_case(_make_spec))
+    case('validator.{}.check_only'.format(_name))(
+        _validate_case(_make_spec, check_only=True))
+
+
+@case('validator.compile.large_array')
+def compile_large_array():
+    spec, path, _ = specs.large_array(1)
+    return lambda: _validator(spec, path)
+
+
+@case('types.convert_style')
+def convert_style():
+    simple = _compile_style('simple', False, 'array')
+    form = _compile_style('simple', True, 'object')
+    value = ','.join('v{}'.format(i) for i in range(20))
+    obj = ','.join('k{0}=v{0}'.format(i) for i in range(20))
+
+    def _run():
+        simple(value)
+        form(obj)
+    return _run
+
+
+@case('types.convert_type')
+def convert_type():
+    convert = _compile_type({'type': 'object', 'properties': {
+        'i': {'type': 'integer', 'format': 'int32'},
+        'n': {'type': 'number'},
+        'b': {'type': 'boolean'},
+        'a': {'type': 'array', 'items': {'type': 'integer'}},
+    }})
+    items = [str(i) for i in range(20)]
+    return lambda: convert({'i': '123', 'n': '1.5', 'b': 'true',
+                            'a': list(items)})
+
+
+@case('formats')
+def format_checkers():
+    checker = formats.OAS3()
+    values = [
+        ('date-time', '2018-10-18T12:34:56.789+09:00'),
+        ('date', '2018-10-18'),
+        ('email', 'user@example.com'),
+        ('ipv4', '192.168.0.1'),
+        ('ipv6', '2001:db8::1'),
+        ('byte', 'aGVsbG8gd29ybGQ='),
+        ('int32', 12345),
+        ('uri', 'http://example.com/path?query=1'),
+    ]
+    checks = [(checker.compile(fmt), value) for fmt, value in values]
+
+    def _run():
+        for check, value in checks:
+            check(value)
+    return _run
+
+
+def _webapp(spec, route, view, settings=None):
+    from pyramid.config import Configurator
+    from webtest import TestApp
+    base = {'pyramid.includes': 'pyramid_oas3', 'pyramid_oas3.schema': spec}
+    base.update(settings or {})
+    with Configurator(settings=base) as config:
+        config.add_route('bench', route)
+        config.add_view(view, route_name='bench')
+        return TestApp(config.make_wsgi_app())
+
+
+def _echo(request):
+    from pyramid.response import Response
+    return Response(
+        json.dumps(request.json_body), content_type='application/json',
+        charset='utf-8')
+
+
+def _e2e_case(make_spec, settings=None):
+    def _setup():
+        spec, path, data = make_spec()
+        app = _webapp(spec, path, _echo, settings)
+        body = json.dumps(data).encode('utf-8')
+        return lambda: app.post(
+            path, body, content_type='application/json')
+    return _setup
+
+
+case('tween.large_array')(_e2e_case(specs.large_array))
+case('tween.large_array.validate_response')(_e2e_case(
+    specs.large_array, {'pyramid_oas3.validate_response': True}))
+case('tween.big_oneof')(_e2e_case(specs.big_oneof))
+
+
+@case('tween.many_paths')
+def many_paths():
+    from pyramid.response import Response
+    spec, route, _ = specs.many_paths()
+    app = _webapp(spec, route, lambda request: Response(b''))
+    url = route.replace('{id}', '123') + '?limit=10&tags=a,b,c'
+    return lambda: app.get(url)
+
+
+def _generated_case(make_spec, body_size=None, count=5):
+    # スキーマから生成したリクエストを順に送る
+    def _setup():
+        spec, path, _ = make_spec()
+        app = _webapp(spec, path, _echo_any)
+        traffic = RequestGenerator(spec, seed=specs.SEED)
+        op = [op for op in traffic.operations if op.path == path][0]
+        requests = [traffic.generate(op, body_size=body_size)
+                    for _ in range(count)]
+        state = {'index': 0}
+
+        def _run():
+            index = state['index'] = (state['index'] + 1) % count
+            requests[index].send(app)
+        return _run
+    return _setup
+
+
+def _echo_any(request):
+    from pyramid.response import Response
+    return Response(request.body, content_type='application/json')
+
+
+case('tween.generated.large_array')(_generated_case(
+    specs.large_array, body_size=100000))
+case('tween.generated.big_oneof')(_generated_case(
+    specs.big_oneof, body_size=10000))
+case('tween.generated.patterns')(_generated_case(
+    specs.patterns, body_size=10000))
+case('tween.generated.many_paths')(_generated_case(specs.many_paths))
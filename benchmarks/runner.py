@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import fnmatch
+import json
+import platform
+import statistics
+import sys
+import timeit
+
+from benchmarks.cases import CASES
+
+
+def run(patterns=None, repeat=5, min_time=0.2):
+    # 各ケースについて1回あたりの実行時間(秒)を repeat 回計測する
+    results = {}
+    for name in sorted(CASES):
+        if patterns and not any(fnmatch.fnmatch(name, p) for p in patterns):
+            continue
+        func = CASES[name]()
+        func()  # ウォームアップ (遅延コンパイルやキャッシュ)
+        timer = timeit.Timer(func)
+        loops = _loops(timer, min_time)
+        times = [t / loops for t in timer.repeat(repeat, loops)]
+        results[name] = {
+            'loops': loops,
+            'min': min(times),
+            'median': statistics.median(times),
+            'times': times,
+        }
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def _loops(timer, min_time):
+    loops = 1
+    while True:
+        if timer.timeit(loops) >= min_time:
+            return loops
+        loops *= 2
+
+
+def compare(baseline, current, threshold=0.1):
+    # median の比 (current / baseline) を返す。threshold を超えて遅くなったものは
+    # regression とする
+    rows = []
+    base_results = baseline.get('results', {})
+    for name, result in sorted(current['results'].items()):
+        base = base_results.get(name)
+        if base is None:
+            rows.append((name, None, result['median'], None, 'new'))
+            continue
+        ratio = result['median'] / base['median']
+        if ratio > 1 + threshold:
+            status = 'regression'
+        elif ratio < 1 - threshold:
+            status = 'improvement'
+        else:
+            status = 'same'
+        rows.append((name, base['median'], result['median'], ratio, status))
+    return rows
+
+
+def format_results(result):
+    lines = ['{:<45} {:>12} {:>12}'.format('name', 'median(us)', 'min(us)')]
+    for name, r in sorted(result['results'].items()):
+        lines.append('{:<45} {:>12.2f} {:>12.2f}'.format(
+            name, r['median'] * 1e6, r['min'] * 1e6))
+    return '\n'.join(lines)
+
+
+def format_comparison(rows):
+    lines = ['{:<45} {:>12} {:>12} {:>7}  {}'.format(
+        'name', 'base(us)', 'now(us)', 'ratio', 'status')]
+    for name, base, now, ratio, status in rows:
+        lines.append('{:<45} {:>12} {:>12.2f} {:>7}  {}'.format(
+            name, '-' if base is None else '{:.2f}'.format(base * 1e6),
+            now * 1e6, '-' if ratio is None else '{:.2f}'.format(ratio),
+            status))
+    return '\n'.join(lines)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save(result, path):
+    if path == '-':
+        json.dump(result, sys.stdout, indent=2, sort_keys=True)
+        return
+    with open(path, 'w') as f:
+        json.dump(result, f, indent=2, sort_keys=True)
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# ベンチマーク用の合成スキーマとデータ。乱数は固定のシードで生成する
+import random
+
+
+SEED = 20181018
+
+
+def openapi(paths, schemas=None):
+    return {
+        'openapi': '3.0.0',
+        'info': {'version': '1.0.0', 'title': 'Benchmark'},
+        'servers': [{'url': 'http://example.com'}],
+        'paths': paths,
+        'components': {'schemas': schemas or {}},
+    }
+
+
+def json_body(schema, response_schema=None):
+    op = {
+        'requestBody': {
+            'required': True,
+            'content': {'application/json': {'schema': schema}},
+        },
+        'responses': {'200': {'content': {'application/json': {
+            'schema': response_schema or schema}}}},
+    }
+    return {'post': op}
+
+
+def item_schema():
+    return {
+        'type': 'object',
+        'required': ['id', 'name'],
+        'properties': {
+            'id': {'type': 'integer', 'format': 'int64'},
+            'name': {'type': 'string', 'maxLength': 64},
+            'email': {'type': 'string', 'format': 'email'},
+            'created': {'type': 'string', 'format': 'date-time'},
+            'tags': {'type': 'array', 'items': {'type': 'string'}},
+            'score': {'type': 'number', 'minimum': 0},
+        },
+    }
+
+
+def item(rnd, index):
+    return {
+        'id': index,
+        'name': 'item-{}'.format(index),
+        'email': 'user{}@example.com'.format(index),
+        'created': '2018-10-{:02d}T12:34:56+09:00'.format(
+            rnd.randint(1, 28)),
+        'tags': ['t{}'.format(rnd.randint(0, 9)) for _ in range(3)],
+        'score': rnd.random() * 100,
+    }
+
+
+def large_array(size=1000):
+    # 大きな配列 (要素ごとに format の変換を含む)
+    rnd = random.Random(SEED)
+    schema = {'type': 'array', 'items': {'$ref': '#/components/schemas/Item'}}
+    spec = openapi(
+        {'/items': json_body(schema)}, {'Item': item_schema()})
+    return spec, '/items', [item(rnd, i) for i in range(size)]
+
+
+def deep_ref(depth=30):
+    # $ref の入れ子 (Level0 -> Level1 -> ...)
+    schemas = {}
+    for i in range(depth):
+        props = {'value': {'type': 'integer'}}
+        if i + 1 < depth:
+            props['child'] = {'$ref': '#/components/schemas/Level{}'.format(
+                i + 1)}
+        schemas['Level{}'.format(i)] = {
+            'type': 'object', 'required': ['value'], 'properties': props}
+    spec = openapi({'/deep': json_body(
+        {'$ref': '#/components/schemas/Level0'})}, schemas)
+    data = {'value': depth - 1}
+    for i in range(depth - 2, -1, -1):
+        data = {'value': i, 'child': data}
+    return spec, '/deep', data
+
+
+def big_oneof(branches=50, size=100):
+    # 多数の分岐を持つ oneOf (kind の enum でのみ区別される)
+    rnd = random.Random(SEED)
+    schemas = {}
+    for i in range(branches):
+        schemas['Kind{}'.format(i)] = {
+            'type': 'object',
+            'required': ['kind'],
+            'properties': {
+                'kind': {'type': 'string', 'enum': ['kind{}'.format(i)]},
+                'value': {'type': 'integer'},
+            },
+        }
+    schema = {'type': 'array', 'items': {'oneOf': [
+        {'$ref': '#/components/schemas/{}'.format(name)}
+        for name in sorted(schemas)]}}
+    data = [{'kind': 'kind{}'.format(rnd.randrange(branches)), 'value': i}
+            for i in range(size)]
+    return openapi({'/oneof': json_body(schema)}, schemas), '/oneof', data
+
+
+def patterns(fields=20, size=200):
+    # pattern と patternProperties を多用するスキーマ
+    rnd = random.Random(SEED)
+    props = {
+        'f{}'.format(i): {'type': 'string', 'pattern': '^[a-z]{2}[0-9]{%d}$'
+                          % (i % 5 + 1)}
+        for i in range(fields)}
+    schema = {'type': 'array', 'items': {
+        'type': 'object',
+        'properties': props,
+        'patternProperties': {'^x-[a-z]+$': {'type': 'string'}},
+        'additionalProperties': False,
+    }}
+    data = []
+    for _ in range(size):
+        obj = {'f{}'.format(i): 'ab' + ''.join(
+            str(rnd.randint(0, 9)) for _ in range(i % 5 + 1))
+            for i in range(fields)}
+        obj['x-extra'] = 'value'
+        data.append(obj)
+    return openapi({'/patterns': json_body(schema)}), '/patterns', data
+
+
+def many_paths(count=500):
+    # 多数のパス (ルーティングとオペレーションの検索)
+    paths = {}
+    for i in range(count):
+        paths['/resource{}/{{id}}'.format(i)] = {'get': {
+            'parameters': [
+                {'name': 'id', 'in': 'path', 'required': True,
+                 'schema': {'type': 'integer'}},
+                {'name': 'limit', 'in': 'query',
+                 'schema': {'type': 'integer', 'maximum': 100}},
+                {'name': 'tags', 'in': 'query', 'style': 'form',
+                 'explode': False,
+                 'schema': {'type': 'array', 'items': {'type': 'string'}}},
+            ],
+            'responses': {'200': {'description': 'ok'}},
+        }}
+    return openapi(paths), '/resource{}/{{id}}'.format(count - 1), None
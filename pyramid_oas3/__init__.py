@@ -1,20 +1,41 @@
 # -*- coding: utf-8 -*-
 import pyramid
 
+from pyramid_oas3.compact import freeze
 from pyramid_oas3.tween import (
-    validation_tween_factory, ResponseValidationError, UNDEFINED)
+    validation_tween_factory, validation_view_deriver,
+    validation_renderer_deriver, ResponseValidationError, UNDEFINED)
 from pyramid_oas3.jsonschema.exceptions import ValidationErrors
+from pyramid_oas3.metrics import metrics_view
 
 __all__ = [
     'validation_tween_factory',
+    'validation_view_deriver',
+    'validation_renderer_deriver',
     'ValidationErrors',
     'ResponseValidationError',
     'UNDEFINED',
+    'freeze',
 ]
 
 
 def includeme(config):
-    config.add_tween(
-        "pyramid_oas3.validation_tween_factory",
-        under=pyramid.tweens.EXCVIEW
-    )
+    integration = config.registry.settings.get(
+        'pyramid_oas3.integration', 'tween')
+    if integration == 'view':
+        config.add_view_deriver(validation_view_deriver, 'oas3_view')
+    elif integration == 'tween':
+        config.add_tween(
+            "pyramid_oas3.validation_tween_factory",
+            under=pyramid.tweens.EXCVIEW
+        )
+    else:
+        raise ValueError(
+            'unknown pyramid_oas3.integration: {}'.format(integration))
+    config.add_view_deriver(
+        validation_renderer_deriver, 'oas3_renderer',
+        under='rendered_view', over='mapped_view')
+    metrics_path = config.registry.settings.get('pyramid_oas3.metrics_path')
+    if metrics_path:
+        config.add_route('pyramid_oas3.metrics', metrics_path)
+        config.add_view(metrics_view, route_name='pyramid_oas3.metrics')
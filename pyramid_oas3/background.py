@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import queue
+import threading
+
+
+logger = logging.getLogger('pyramid_oas3')
+
+
+def log_failure(request, exc):
+    logger.warning(
+        'response validation failed: %s %s: %s',
+        request.method, request.path, exc.exception)
+
+
+class BackgroundValidator(object):
+    # レスポンスの検証をリクエスト処理の外でワーカースレッドに実行させる。
+    # キューが一杯の場合は検証を破棄する (レイテンシに影響させない)
+    def __init__(self, workers=1, queue_size=100, sink=log_failure):
+        self.workers = workers
+        self.sink = sink
+        self._queue = queue.Queue(queue_size)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self.submitted = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def submit(self, request, func, *args):
+        # func は検証に失敗すると ResponseValidationError を送出する
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((request, func, args))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.submitted += 1
+        return True
+
+    def join(self):
+        self._queue.join()
+
+    def _ensure_started(self):
+        # fork 前に起動したスレッドは子プロセスに引き継がれないので、
+        # 最初の submit 時にプロセスごとに起動する
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._threads = [
+                threading.Thread(
+                    target=self._run, name='pyramid_oas3-{}'.format(i),
+                    daemon=True)
+                for i in range(self.workers)]
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        from pyramid_oas3.tween import ResponseValidationError
+        while True:
+            request, func, args = self._queue.get()
+            try:
+                func(*args)
+            except ResponseValidationError as e:
+                self.failed += 1
+                try:
+                    self.sink(request, e)
+                except Exception:
+                    logger.exception('response validation sink failed')
+            except Exception:
+                logger.exception('background response validation failed')
+            finally:
+                self._queue.task_done()
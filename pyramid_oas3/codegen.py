@@ -0,0 +1,942 @@
+# -*- coding: utf-8 -*-
+# OpenAPI 定義から、スキーマの各ノードを検証する関数を展開した Python モジュールを
+# 生成する (python -m pyramid_oas3.codegen spec.yaml -o validators.py)。
+# 生成したモジュールを pyramid_oas3.compiled_module に指定すると、
+# 起動時にスキーマをクロージャへ変換する代わりに生成済みの関数を利用する
+import argparse
+from collections import deque
+import math
+import sys
+
+from pyramid_oas3.compact import FrozenDict, FrozenList, compact
+from pyramid_oas3.jsonschema import Resolver, formats
+from pyramid_oas3.jsonschema._utils import (
+    BudgetExhausted, ErrorList, copy_default, get_regex, is_uniq,
+    merge_instances)
+from pyramid_oas3.jsonschema._validators import (
+    _prefix_errors as prefix_errors, _run_branch as run_branch)
+from pyramid_oas3.jsonschema.exceptions import (
+    FormatError, Joined, ValidationError)
+from pyramid_oas3.jsonschema.validators import (
+    _CATEGORIES, _CATEGORY_OF_CLASS as CATEGORY_OF_CLASS, _DRAFT4_VALIDATORS,
+    _Validator, _category_of as category_of, _merge_changes as merge_changes)
+from pyramid_oas3.plan import METHODS
+from pyramid_oas3.resolve import dereference
+
+
+__all__ = [
+    'BudgetExhausted', 'CATEGORY_OF_CLASS', 'ErrorList', 'FormatError',
+    'FrozenDict', 'FrozenList', 'Joined', 'ValidationError', 'category_of',
+    'copy_default', 'fill_nodes', 'format_checker', 'generate', 'get_regex',
+    'index_nodes', 'is_uniq', 'main', 'merge_changes', 'merge_instances',
+    'precompiled', 'prepare', 'prefix_errors', 'run_branch',
+]
+
+# 生成したモジュールが利用する format の実装 (OAS3Validator と同じもの)
+format_checker = formats.OAS3().compile
+
+# 生成する関数の種類: (関数名の接頭辞, 検証のみ(変換なし)か)
+_MODES = (('c', False), ('k', True))
+# 子スキーマを持つキーワード
+_SUBSCHEMA_KEYWORDS = (
+    'items', 'additionalItems', 'properties', 'patternProperties',
+    'additionalProperties', 'allOf', 'anyOf', 'oneOf', 'not')
+_CONTAINER_TYPES = {
+    'properties': dict, 'patternProperties': dict, 'required': list,
+    'allOf': list, 'anyOf': list, 'oneOf': list, 'enum': list,
+    'items': (dict, list), 'additionalItems': (dict, bool),
+    'additionalProperties': (dict, bool)}
+
+
+def fill_nodes(nodes, items):
+    # 生成したモジュールの読み込み時に呼ばれ、空の FrozenDict として先に作成した
+    # ノードへ内容を設定する (ノード同士の参照や循環はそのまま再現される)
+    for node, item in zip(nodes, items):
+        dict.update(node, item)
+    return nodes
+
+
+def prepare(spec, count):
+    # 以前のバージョンで生成したモジュールの読み込み時に呼ばれ、参照を解決済みの
+    # 定義とノードの一覧 (生成時と同じ順序) を返す。定義は変更できない形式にする
+    schema = compact(dereference(spec, Resolver('', spec)))
+    nodes = index_nodes(schema)
+    if len(nodes) != count:
+        raise ValueError('compiled module does not match its spec')
+    return schema, nodes
+
+
+def index_nodes(root):
+    # 参照を解決済みの定義に含まれるオブジェクトを幅優先で列挙する。
+    # 同じ定義からは常に同じ順序になるので、生成時と実行時で番号が一致する
+    nodes, seen, queue = [], set(), deque([root])
+    while queue:
+        node = queue.popleft()
+        if not isinstance(node, (dict, list)) or id(node) in seen:
+            continue
+        seen.add(id(node))
+        if isinstance(node, dict):
+            nodes.append(node)
+            queue.extend(node.values())
+        else:
+            queue.extend(node)
+    return nodes
+
+
+def precompiled(nodes, functions):
+    # ValidatorCache の compiled に登録する形式 ({(id, scope): (schema, check)})
+    return {
+        (id(nodes[index]), ''): (nodes[index], func)
+        for index, func in functions.items()}
+
+
+def generate(spec, fill_by_default=False, source=None):
+    # spec (参照を解決する前の定義) から生成したモジュールのソースを返す
+    return _Generator(spec, fill_by_default).generate(source)
+
+
+class _Generator(object):
+    def __init__(self, spec, fill_by_default):
+        self.fill_by_default = bool(fill_by_default)
+        # prepare と同じ手順で定義を作り、そのノードの表をモジュールに埋め込む
+        self.schema = compact(dereference(spec, Resolver('', spec)))
+        self.nodes = index_nodes(self.schema)
+        self.ids = {id(node): i for i, node in enumerate(self.nodes)}
+        self.targets = self._supported(self._collect())
+        self.info = {mode: self._analyze(mode) for mode, _ in _MODES}
+        self._consts = {}
+
+    # 対象となるスキーマノードの収集
+
+    def _collect(self):
+        roots = []
+        components = self.schema.get('components') or {}
+        roots.extend((components.get('schemas') or {}).values())
+        for key in ('parameters', 'headers'):
+            for obj in (components.get(key) or {}).values():
+                roots.extend(_schemas_of(obj))
+        for key in ('requestBodies', 'responses'):
+            for obj in (components.get(key) or {}).values():
+                roots.extend(_content_schemas(obj))
+        for path_item in (self.schema.get('paths') or {}).values():
+            for param in path_item.get('parameters') or ():
+                roots.extend(_schemas_of(param))
+            for method, op_obj in path_item.items():
+                if method not in METHODS or not isinstance(op_obj, dict):
+                    continue
+                for param in op_obj.get('parameters') or ():
+                    roots.extend(_schemas_of(param))
+                roots.extend(_content_schemas(op_obj.get('requestBody')))
+                for res in (op_obj.get('responses') or {}).values():
+                    roots.extend(_content_schemas(res))
+                    for header in ((res or {}).get('headers') or {}).values():
+                        roots.extend(_schemas_of(header))
+
+        found, queue = set(), deque(roots)
+        while queue:
+            node = queue.popleft()
+            if not isinstance(node, dict) or id(node) in found:
+                continue
+            found.add(id(node))
+            queue.extend(_subschemas(node))
+        return sorted(self.ids[i] for i in found)
+
+    def _supported(self, indices):
+        # 生成に対応していないノードと、その祖先はクロージャでの変換に任せる
+        parents = {i: [] for i in indices}
+        unsupported = []
+        for i in indices:
+            node = self.nodes[i]
+            for child in _subschemas(node):
+                if isinstance(child, dict):
+                    parents[self.ids[id(child)]].append(i)
+            if not _locally_supported(node):
+                unsupported.append(i)
+        excluded = set()
+        while unsupported:
+            i = unsupported.pop()
+            if i in excluded:
+                continue
+            excluded.add(i)
+            unsupported.extend(parents[i])
+        return [i for i in indices if i not in excluded]
+
+    # 各ノードの検証内容の解析
+
+    def _analyze(self, mode):
+        # {index: (検証項目があるか, 変換しうるか)} を不動点まで更新する。
+        # 再帰的なスキーマは検証項目も変換もないものとして始める
+        info = {i: (False, False) for i in self.targets}
+        changed = True
+        while changed:
+            changed = False
+            for i in self.targets:
+                checks = self._checks(i, mode, info)
+                state = (
+                    any(checks.values()),
+                    any(t for cs in checks.values() for _, _, t in cs))
+                if state != info[i]:
+                    info[i] = state
+                    changed = True
+        return info
+
+    def _child(self, child, info):
+        # (ノード番号, 変換しうるか)。検証項目が無ければ None
+        if not isinstance(child, dict):
+            return None
+        index = self.ids[id(child)]
+        nonnull, transforms = info[index]
+        return (index, transforms) if nonnull else None
+
+    def _checks(self, i, mode, info):
+        # カテゴリ -> [(keyword, variant, transforms)] (スキーマのキーの順)
+        node = self.nodes[i]
+        check_only = mode == 'k'
+        checks = {category: [] for category in _CATEGORIES}
+        for k, v in node.items():
+            validator = _DRAFT4_VALIDATORS.get(k)
+            if validator is None:
+                continue
+            if k == 'type':
+                types = v if isinstance(v, list) else [v]
+                for category in _CATEGORIES:
+                    if category in types:
+                        continue
+                    variant = 'fail'
+                    if category == 'number' and 'integer' in types:
+                        variant = 'integer'
+                    checks[category].append((k, variant, False))
+                continue
+            check = self._check(node, k, v, check_only, info)
+            if check is None:
+                continue
+            applies_to = getattr(validator, 'applies_to', None)
+            for category in _CATEGORIES:
+                if applies_to is None or category in applies_to:
+                    checks[category].append((k, None, check))
+        if node.get('nullable', False):
+            checks['null'] = []
+        return checks
+
+    def _check(self, node, k, v, check_only, info):
+        # キーワードの検証が変換しうるか。検証不要な場合は None
+        if k == 'format':
+            checker = format_checker(v)
+            if checker is None:
+                return None
+            return not check_only and checker.converts
+        if k in ('items', 'allOf', 'anyOf', 'oneOf') and isinstance(v, list):
+            children = [self._child(s, info) for s in v]
+            if k != 'oneOf' and all(c is None for c in children):
+                return None
+            return any(c[1] for c in children if c is not None)
+        if k in ('items', 'not'):
+            child = self._child(v, info)
+            if k == 'not':
+                return False
+            return None if child is None else child[1]
+        if k in ('additionalItems', 'additionalProperties'):
+            if k == 'additionalItems' and isinstance(
+                    node.get('items', {}), dict):
+                return None
+            if isinstance(v, dict):
+                child = self._child(v, info)
+                return None if child is None else child[1]
+            return None if v else False
+        if k == 'properties':
+            entries = self._properties(node, check_only, info)
+            if not entries:
+                return None
+            return any(
+                (c is not None and c[1]) or default is not None
+                for _, c, default in entries)
+        if k == 'patternProperties':
+            children = [self._child(s, info) for s in v.values()]
+            if all(c is None for c in children):
+                return None
+            return any(c[1] for c in children if c is not None)
+        if k in ('required', 'uniqueItems') and not v:
+            return None
+        return False
+
+    def _properties(self, node, check_only, info):
+        # [(property, child, default)]。default は default 値を持つノードの番号
+        entries = []
+        for prop, subschema in node['properties'].items():
+            child = self._child(subschema, info)
+            default = None
+            if self.fill_by_default and not check_only:
+                default = self._default(subschema)
+            if child is not None or default is not None:
+                entries.append((prop, child, default))
+        return entries
+
+    def _default(self, subschema):
+        # _validators._try_get_default_value と同じ規則で default 値を探す
+        if not isinstance(subschema, dict):
+            return None
+        if 'default' in subschema:
+            return self.ids[id(subschema)]
+        if 'allOf' in subschema:
+            found = [self._default(s) for s in subschema['allOf']]
+            found = [f for f in found if f is not None]
+            if len(found) == 1:
+                return found[0]
+        return None
+
+    # ソースの生成
+
+    def generate(self, source=None):
+        functions = {mode: [] for mode, _ in _MODES}
+        bodies = []
+        for mode, _ in _MODES:
+            for i in self.targets:
+                if self.info[mode][i][0]:
+                    bodies.append(self._function(i, mode))
+                    functions[mode].append(i)
+        out = [
+            '# -*- coding: utf-8 -*-',
+            '# {}pyramid_oas3.codegen で生成 (編集しないこと)'.format(
+                '{} から'.format(source) if source else ''),
+            '# flake8: noqa',
+            'import datetime',
+            '',
+            'from pyramid_oas3 import codegen as _rt',
+            '',
+            '',
+            'FILL_BY_DEFAULT = {!r}'.format(self.fill_by_default),
+            # 参照の解決と変換は生成時に済ませ、結果のノードをそのまま埋め込む
+            '_N = NODES = [_rt.FrozenDict() for _ in range({})]'.format(
+                len(self.nodes)),
+            '_rt.fill_nodes(_N, [',
+        ]
+        out.extend('    {{{}}},'.format(', '.join(
+            '{!r}: {}'.format(k, self._table_value(v))
+            for k, v in node.items())) for node in self.nodes)
+        out += [
+            '])',
+            'SCHEMA = _N[0]',
+            '',
+            '_E = _rt.ValidationError',
+            '_Joined = _rt.Joined',
+            '_FormatError = _rt.FormatError',
+            '_ErrorList = _rt.ErrorList',
+            '_BudgetExhausted = _rt.BudgetExhausted',
+            '_CAT = _rt.CATEGORY_OF_CLASS',
+            '_category_of = _rt.category_of',
+            '_prefix = _rt.prefix_errors',
+            '_run_branch = _rt.run_branch',
+            '_merge_changes = _rt.merge_changes',
+            '_merge_instances = _rt.merge_instances',
+            '_is_uniq = _rt.is_uniq',
+            '_copy_default = _rt.copy_default',
+        ]
+        out.extend('{} = {}'.format(name, expr) for expr, name in sorted(
+            self._consts.items(), key=lambda e: int(e[1][2:])))
+        for body in bodies:
+            out.extend(['', ''])
+            out.extend(body)
+        out.extend(['', ''])
+        for mode, name in (('c', 'CONVERT'), ('k', 'CHECK')):
+            out.append('{} = {{'.format(name))
+            out.extend('    {}: _{}{},'.format(i, mode, i)
+                       for i in functions[mode])
+            out.append('}')
+        return '\n'.join(out) + '\n'
+
+    def _table_value(self, value):
+        # ノードの表に埋め込む値の式。オブジェクトは番号で参照する
+        if isinstance(value, dict):
+            return '_N[{}]'.format(self.ids[id(value)])
+        if isinstance(value, list):
+            return '_rt.FrozenList([{}])'.format(
+                ', '.join(self._table_value(v) for v in value))
+        if type(value) is float and not math.isfinite(value):
+            return "float('{!r}')".format(value)
+        return repr(value)
+
+    def _const(self, expr):
+        name = self._consts.get(expr)
+        if name is None:
+            name = self._consts[expr] = '_K{}'.format(len(self._consts))
+        return name
+
+    def _value(self, i, *keys):
+        # スキーマ中の値の式。単純な値はリテラルとして埋め込む
+        value = self.nodes[i]
+        for key in keys:
+            value = value[key]
+        literal = _literal(value)
+        if literal is not None:
+            return literal
+        if isinstance(value, dict):
+            return self._const('_N[{}]'.format(self.ids[id(value)]))
+        return self._const('_N[{}]{}'.format(
+            i, ''.join('[{!r}]'.format(key) for key in keys)))
+
+    def _function(self, i, mode):
+        info = self.info[mode]
+        check_only = mode == 'k'
+        checks = self._checks(i, mode, info)
+        name = '_{}{}'.format(mode, i)
+        w = _Writer()
+        w.line('def {}(instance, errors):'.format(name))
+        groups = {}
+        for category in _CATEGORIES:
+            groups.setdefault(tuple(checks[category]), []).append(category)
+        with w.indent():
+            if len(groups) == 1:
+                self._group(w, i, check_only, checks[_CATEGORIES[0]])
+            else:
+                w.line('cat = _CAT.get(instance.__class__) or '
+                       '_category_of(instance.__class__)')
+                for group, categories in groups.items():
+                    if not group:
+                        continue
+                    if len(categories) == 1:
+                        w.line('if cat == {!r}:'.format(categories[0]))
+                    else:
+                        w.line('if cat in {!r}:'.format(tuple(categories)))
+                    with w.indent():
+                        self._group(w, i, check_only, group)
+                w.line('return instance')
+        if info[i][1]:
+            w.line('{}.transforms = True'.format(name))
+        return w.lines
+
+    def _group(self, w, i, check_only, checks):
+        # 変換する検証が複数ある場合は _build_node と同じ規則で結果を統合する
+        total = sum(1 for _, _, transforms in checks if transforms)
+        transforming = 0
+        for k, variant, transforms in checks:
+            getattr(self, '_emit_' + k)(
+                w, i, self.nodes[i][k], variant, check_only, transforms)
+            if not transforms or total == 1:
+                continue
+            transforming += 1
+            if transforming == 1:
+                w.line('new = ret')
+            else:
+                w.line('if ret is not instance:')
+                with w.indent():
+                    w.line('new = ret if new is instance else '
+                           '_merge_changes(instance, new, ret)')
+        if total == 0:
+            w.line('return instance')
+        else:
+            w.line('return ret' if total == 1 else 'return new')
+
+    def _fn(self, child, check_only):
+        return '_{}{}'.format('k' if check_only else 'c', child[0])
+
+    def _call(self, w, func, arg, target=None, path=None, schema_path=None):
+        # 子ノードの検証。エラーが追加された場合は位置を前置する
+        w.line('off = len(errors)')
+        w.line('try:')
+        with w.indent():
+            w.line('{}{}({}, errors)'.format(
+                target + ' = ' if target else '', func, arg))
+        w.line('finally:')
+        with w.indent():
+            w.line('if len(errors) != off:')
+            with w.indent():
+                w.line('_prefix(errors, off, {}, {})'.format(
+                    path, schema_path))
+
+    def _error(self, w, template, params, extra=''):
+        w.line('errors.append(_E({!r}, params=({}{}){}))'.format(
+            template, ', '.join(params), ',' if len(params) == 1 else '',
+            extra))
+
+    def _emit_type(self, w, i, types, variant, check_only, transforms):
+        types = types if isinstance(types, list) else [types]
+        message = repr(', '.join(types))
+        if variant == 'integer':
+            w.line('if not isinstance(instance, int):')
+            with w.indent():
+                self._error(w, '{} is not of type {}', ['instance', message])
+        else:
+            self._error(w, '{} is not of type {}', ['instance', message])
+
+    def _emit_items(self, w, i, items, variant, check_only, transforms):
+        info = self.info['k' if check_only else 'c']
+        if transforms:
+            w.line('cp = None')
+        if isinstance(items, dict):
+            func = self._fn(self._child(items, info), check_only)
+            w.line('for index, item in enumerate(instance):')
+            with w.indent():
+                self._call(w, func, 'item', 'r' if transforms else None,
+                           'index')
+                if transforms:
+                    self._copy_on_change(w, 'item', 'index', 'list')
+        else:
+            for index, subschema in enumerate(items):
+                child = self._child(subschema, info)
+                if child is None:
+                    continue
+                w.line('if len(instance) > {}:'.format(index))
+                with w.indent():
+                    w.line('item = instance[{}]'.format(index))
+                    self._call(w, self._fn(child, check_only), 'item',
+                               'r' if transforms else None, index, index)
+                    if transforms:
+                        self._copy_on_change(w, 'item', index, 'list')
+        if transforms:
+            w.line('ret = instance if cp is None else cp')
+
+    def _copy_on_change(self, w, original, key, factory, value='r'):
+        w.line('if {} is not {}:'.format(value, original))
+        with w.indent():
+            w.line('if cp is None:')
+            with w.indent():
+                w.line('cp = {}(instance)'.format(factory))
+            w.line('cp[{}] = {}'.format(key, value))
+
+    def _emit_additionalItems(self, w, i, aI, variant, check_only,
+                              transforms):
+        start = len(self.nodes[i]['items'])
+        if not isinstance(aI, dict):
+            w.line('if len(instance) > {}:'.format(start))
+            with w.indent():
+                self._error(
+                    w, 'Additional items are not allowed '
+                    '({} were unexpected)',
+                    ['_Joined(instance[{}:], as_str=True)'.format(start)])
+            return
+        child = self._child(aI, self.info['k' if check_only else 'c'])
+        if transforms:
+            w.line('cp = None')
+        w.line('for index in range({}, len(instance)):'.format(start))
+        with w.indent():
+            w.line('item = instance[index]')
+            self._call(w, self._fn(child, check_only), 'item',
+                       'r' if transforms else None, 'index')
+            if transforms:
+                self._copy_on_change(w, 'item', 'index', 'list')
+        if transforms:
+            w.line('ret = instance if cp is None else cp')
+
+    def _emit_properties(self, w, i, properties, variant, check_only,
+                         transforms):
+        info = self.info['k' if check_only else 'c']
+        entries = self._properties(self.nodes[i], check_only, info)
+        if not transforms:
+            for prop, child, _ in entries:
+                w.line('v = instance.get({!r})'.format(prop))
+                w.line('if v is not None:')
+                with w.indent():
+                    self._call(w, self._fn(child, check_only), 'v',
+                               path=repr(prop), schema_path=repr(prop))
+            return
+
+        w.line('cp = None')
+        for prop, child, default in entries:
+            key = repr(prop)
+            func = None if child is None else self._fn(child, check_only)
+            target = 'v' if child is not None and child[1] else None
+            w.line('o = instance.get({})'.format(key))
+            if default is None:
+                w.line('if o is not None:')
+                with w.indent():
+                    self._call(w, func, 'o', target, key, key)
+                    if target:
+                        self._copy_on_change(w, 'o', key, 'dict', 'v')
+                continue
+            default_value = self.nodes[default]['default']
+            w.line('if o is None:')
+            with w.indent():
+                if default_value is None:
+                    # default: null でもキーが無ければ設定する (_validators と同じ)
+                    w.line('if {} not in instance:'.format(key))
+                    with w.indent():
+                        w.line('if cp is None:')
+                        with w.indent():
+                            w.line('cp = dict(instance)')
+                        w.line('cp[{}] = None'.format(key))
+                    w.line('v = o')
+                elif isinstance(default_value, (dict, list)):
+                    # リクエストごとに複製する (_validators と同じ)
+                    w.line('v = _copy_default({})'.format(
+                        self._value(default, 'default')))
+                    # dict/list 以外の default 値は検証しない (_validators と同じ)
+                    if func:
+                        self._call(w, func, 'v', 'v' if target else None,
+                                   key, key)
+                else:
+                    w.line('v = {}'.format(self._value(default, 'default')))
+            w.line('else:')
+            with w.indent():
+                if func:
+                    self._call(w, func, 'o', target, key, key)
+                if not target:
+                    w.line('v = o')
+            self._copy_on_change(w, 'o', key, 'dict', 'v')
+        w.line('ret = instance if cp is None else cp')
+
+    def _emit_patternProperties(self, w, i, pP, variant, check_only,
+                                transforms):
+        info = self.info['k' if check_only else 'c']
+        if transforms:
+            w.line('cp = None')
+        for pattern, subschema in pP.items():
+            child = self._child(subschema, info)
+            if child is None:
+                continue
+            regex = self._const('_rt.get_regex({!r})'.format(pattern))
+            w.line('for key, v in instance.items():')
+            with w.indent():
+                w.line('if {}.search(key):'.format(regex))
+                with w.indent():
+                    self._call(w, self._fn(child, check_only), 'v',
+                               'r' if transforms else None, 'key',
+                               repr(pattern))
+                    if transforms:
+                        self._copy_on_change(w, 'v', 'key', 'dict')
+        if transforms:
+            w.line('ret = instance if cp is None else cp')
+
+    def _emit_additionalProperties(self, w, i, aP, variant, check_only,
+                                   transforms):
+        node = self.nodes[i]
+        properties = node.get('properties', {})
+        patterns = node.get('patternProperties', {})
+        conditions = []
+        if properties:
+            conditions.append('name not in {}'.format(self._const(
+                'frozenset({!r})'.format(sorted(properties)))))
+        regex = None
+        if patterns and isinstance(patterns, dict):
+            regex = self._const(
+                '_rt.get_regex({!r})'.format('|'.join(patterns)))
+            conditions.append('not {}.search(name)'.format(regex))
+        if conditions:
+            w.line('extras = set()')
+            w.line('for name in instance:')
+            with w.indent():
+                w.line('if {}:'.format(' and '.join(conditions)))
+                with w.indent():
+                    w.line('extras.add(name)')
+        else:
+            w.line('extras = set(instance)')
+
+        if not isinstance(aP, dict):
+            w.line('if extras:')
+            with w.indent():
+                if regex:
+                    self._error(
+                        w, '{} do not match any of the regexes: {}',
+                        ['_Joined(sorted(extras))',
+                         '_Joined({!r})'.format(sorted(patterns))])
+                else:
+                    self._error(
+                        w, 'Additional properties are not allowed '
+                        '({} were unexpected)', ['extras'])
+            return
+        child = self._child(aP, self.info['k' if check_only else 'c'])
+        if transforms:
+            w.line('cp = None')
+        w.line('for extra in extras:')
+        with w.indent():
+            w.line('v = instance[extra]')
+            self._call(w, self._fn(child, check_only), 'v',
+                       'r' if transforms else None, 'extra')
+            if transforms:
+                self._copy_on_change(w, 'v', 'extra', 'dict')
+        if transforms:
+            w.line('ret = instance if cp is None else cp')
+
+    def _emit_required(self, w, i, required, variant, check_only,
+                       transforms):
+        for index, prop in enumerate(required):
+            key = self._value(i, 'required', index)
+            w.line('if {} not in instance:'.format(key))
+            with w.indent():
+                self._error(w, '{} is a required property', [key])
+
+    def _emit_format(self, w, i, format, variant, check_only, transforms):
+        checker = self._const('_rt.format_checker({!r})'.format(format))
+        w.line('try:')
+        with w.indent():
+            w.line('{}{}(instance)'.format(
+                'ret = ' if transforms else '', checker))
+        w.line('except _FormatError as e:')
+        with w.indent():
+            w.line('errors.append(_E(e._template, params=e._params, '
+                   'cause=e.__cause__))')
+            if transforms:
+                w.line('ret = instance')
+
+    def _branches(self, w, i, k, check_only, on_valid):
+        # oneOf/anyOf の各分岐を実行し、成功したものを valids に追加する
+        info = self.info['k' if check_only else 'c']
+        w.line('valids = []')
+        w.line('all_errors = []')
+        for index, subschema in enumerate(self.nodes[i][k]):
+            child = self._child(subschema, info)
+            if child is None:
+                w.line('valids.append({})'.format(
+                    on_valid('instance', index)))
+                continue
+            w.line('erroff = len(errors)')
+            w.line('r = _run_branch({}, instance, errors)'.format(
+                self._fn(child, check_only)))
+            w.line('if len(errors) == erroff:')
+            with w.indent():
+                w.line('valids.append({})'.format(on_valid('r', index)))
+            w.line('else:')
+            with w.indent():
+                w.line('_prefix(errors, erroff, None, {})'.format(index))
+                w.line('all_errors.extend(errors[erroff:])')
+                w.line('del errors[erroff:]')
+
+    def _not_valid_under_any(self, w):
+        self._error(
+            w, '{} is not valid under any of the given schemas',
+            ['instance'], ', context=all_errors')
+
+    def _emit_oneOf(self, w, i, oneOf, variant, check_only, transforms):
+        self._branches(w, i, 'oneOf', check_only, lambda value, index: (
+            '({}, {})'.format(value, self._value(i, 'oneOf', index))))
+        if transforms:
+            w.line('ret = valids[0][0] if len(valids) == 1 else instance')
+        w.line('if not valids:')
+        with w.indent():
+            self._not_valid_under_any(w)
+        w.line('elif len(valids) > 1:')
+        with w.indent():
+            self._error(w, '{} is valid under each of {}', [
+                'instance', '_Joined([schema for _, schema in valids])'])
+
+    def _emit_anyOf(self, w, i, anyOf, variant, check_only, transforms):
+        self._branches(
+            w, i, 'anyOf', check_only, lambda value, index: value)
+        w.line('if not valids:')
+        with w.indent():
+            self._not_valid_under_any(w)
+        if transforms:
+            w.line('if not valids or all(v is instance for v in valids):')
+            with w.indent():
+                w.line('ret = instance')
+            w.line('else:')
+            with w.indent():
+                w.line('ret = _merge_instances(valids)')
+
+    def _emit_allOf(self, w, i, allOf, variant, check_only, transforms):
+        info = self.info['k' if check_only else 'c']
+        results = []
+        for index, subschema in enumerate(allOf):
+            child = self._child(subschema, info)
+            if child is None:
+                results.append('instance')
+                continue
+            target = None
+            if transforms:
+                target = 'r{}'.format(index)
+                results.append(target)
+            self._call(w, self._fn(child, check_only), 'instance', target,
+                       schema_path=index)
+        if not transforms:
+            return
+        changed = [r for r in results if r != 'instance']
+        w.line('if {}:'.format(' and '.join(
+            '{} is instance'.format(r) for r in changed)))
+        with w.indent():
+            w.line('ret = instance')
+        w.line('else:')
+        with w.indent():
+            w.line('ret = _merge_instances([{}])'.format(', '.join(results)))
+
+    def _emit_not(self, w, i, not_, variant, check_only, transforms):
+        child = self._child(not_, self.info['k' if check_only else 'c'])
+        params = [self._value(i, 'not'), 'instance']
+        if child is None:
+            self._error(w, '{} is not allowed for {}', params)
+            return
+        w.line('tmp = _ErrorList(limit=1)')
+        w.line('try:')
+        with w.indent():
+            w.line('{}(instance, tmp)'.format(self._fn(child, check_only)))
+        w.line('except _BudgetExhausted:')
+        with w.indent():
+            w.line('pass')
+        w.line('if len(tmp) == 0:')
+        with w.indent():
+            self._error(w, '{} is not allowed for {}', params)
+
+    def _emit_enum(self, w, i, enum, variant, check_only, transforms):
+        value = self._value(i, 'enum')
+        w.line('if instance not in {}:'.format(value))
+        with w.indent():
+            self._error(w, '{} is not one of {}', ['instance', value])
+
+    def _emit_uniqueItems(self, w, i, uI, variant, check_only, transforms):
+        w.line('if not _is_uniq(instance):')
+        with w.indent():
+            self._error(w, '{} has non-unique elements', ['instance'])
+
+    def _emit_pattern(self, w, i, pattern, variant, check_only, transforms):
+        regex = self._const('_rt.get_regex({!r})'.format(pattern))
+        w.line('if not {}.search(instance):'.format(regex))
+        with w.indent():
+            self._error(w, '{} does not match {}',
+                        ['instance', self._value(i, 'pattern')])
+
+    def _emit_multipleOf(self, w, i, mO, variant, check_only, transforms):
+        value = self._value(i, 'multipleOf')
+        if isinstance(mO, float):
+            w.line('quotient = instance / {}'.format(value))
+            w.line('if int(quotient) != quotient:')
+        else:
+            w.line('if instance % {}:'.format(value))
+        with w.indent():
+            self._error(w, '{} is not a multiple of {}', ['instance', value])
+
+    def _compare(self, w, i, k, op, template):
+        # op: (比較する式, 演算子)。メッセージには instance (と閾値) を埋め込む
+        value = self._value(i, k)
+        w.line('if {} {} {}:'.format(op[0], op[1], value))
+        with w.indent():
+            self._error(
+                w, template, ['instance', value][:template.count('{}')])
+
+    def _emit_minimum(self, w, i, minimum, variant, check_only, transforms):
+        if self.nodes[i].get('exclusiveMinimum', False):
+            self._compare(w, i, 'minimum', ('instance', '<='),
+                          '{} is less than or equal to the minimum of {}')
+        else:
+            self._compare(w, i, 'minimum', ('instance', '<'),
+                          '{} is less than the minimum of {}')
+
+    def _emit_maximum(self, w, i, maximum, variant, check_only, transforms):
+        if self.nodes[i].get('exclusiveMaximum', False):
+            self._compare(w, i, 'maximum', ('instance', '>='),
+                          '{} is greater than or equal to the maximum of {}')
+        else:
+            self._compare(w, i, 'maximum', ('instance', '>'),
+                          '{} is greater than the maximum of {}')
+
+    def _emit_minItems(self, w, i, v, variant, check_only, transforms):
+        self._compare(w, i, 'minItems', ('len(instance)', '<'),
+                      '{} is too short')
+
+    def _emit_maxItems(self, w, i, v, variant, check_only, transforms):
+        self._compare(w, i, 'maxItems', ('len(instance)', '>'),
+                      '{} is too long')
+
+    def _emit_minLength(self, w, i, v, variant, check_only, transforms):
+        self._compare(w, i, 'minLength', ('len(instance)', '<'),
+                      '{} is too short')
+
+    def _emit_maxLength(self, w, i, v, variant, check_only, transforms):
+        self._compare(w, i, 'maxLength', ('len(instance)', '>'),
+                      '{} is too long')
+
+    def _emit_minProperties(self, w, i, v, variant, check_only, transforms):
+        self._compare(w, i, 'minProperties', ('len(instance)', '<'),
+                      '{} does not have enough properties')
+
+    def _emit_maxProperties(self, w, i, v, variant, check_only, transforms):
+        self._compare(w, i, 'maxProperties', ('len(instance)', '>'),
+                      '{} has too many properties')
+
+
+class _Writer(object):
+    def __init__(self):
+        self.lines = []
+        self._level = 0
+
+    def line(self, text):
+        self.lines.append('    ' * self._level + text)
+
+    def indent(self):
+        return _Indent(self)
+
+
+class _Indent(object):
+    def __init__(self, writer):
+        self._writer = writer
+
+    def __enter__(self):
+        self._writer._level += 1
+
+    def __exit__(self, *exc):
+        self._writer._level -= 1
+
+
+def _literal(value):
+    if value is None or type(value) in (bool, int, str):
+        return repr(value)
+    if type(value) is float and math.isfinite(value):
+        return repr(value)
+    return None
+
+
+def _locally_supported(node):
+    if '$ref' in node or 'id' in node or 'dependencies' in node:
+        return False
+    for k, v in node.items():
+        expected = _CONTAINER_TYPES.get(k)
+        if expected is not None and not isinstance(v, expected):
+            return False
+    types = node.get('type')
+    if types is not None:
+        for typ in types if isinstance(types, list) else [types]:
+            if typ not in _Validator._types:
+                return False
+    return True
+
+
+def _subschemas(node):
+    for k in _SUBSCHEMA_KEYWORDS:
+        v = node.get(k)
+        if isinstance(v, dict):
+            if k in ('properties', 'patternProperties'):
+                yield from v.values()
+            else:
+                yield v
+        elif isinstance(v, list) and k != 'additionalItems':
+            yield from v
+
+
+def _schemas_of(obj):
+    # パラメータ/ヘッダのスキーマ
+    if not isinstance(obj, dict):
+        return []
+    schemas = [obj.get('schema')]
+    return schemas + _content_schemas(obj)
+
+
+def _content_schemas(obj):
+    if not isinstance(obj, dict):
+        return []
+    return [(media or {}).get('schema')
+            for media in (obj.get('content') or {}).values()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m pyramid_oas3.codegen',
+        description='generate a validator module from an OpenAPI document')
+    parser.add_argument('spec', help='OpenAPI document (YAML or JSON)')
+    parser.add_argument('-o', '--output',
+                        help='output module path (default: stdout)')
+    parser.add_argument(
+        '--fill-by-default', action='store_true',
+        help='generate for pyramid_oas3.fill_by_default = true')
+    args = parser.parse_args(argv)
+
+    from pyramid_oas3.snapshot import _parse
+    with open(args.spec, 'rb') as f:
+        spec = _parse(args.spec, f.read())
+    source = generate(spec, args.fill_by_default, args.spec)
+    if not args.output or args.output == '-':
+        sys.stdout.write(source)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(source)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# preforking なサーバー (gunicorn など) のワーカー間で定義を共有しやすくする
+import gc
+import sys
+
+
+class FrozenDict(dict):
+    # 変更できない dict。isinstance(x, dict) を前提とした既存の処理でそのまま使える
+    __slots__ = ()
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError('{} is immutable'.format(type(self).__name__))
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+
+class FrozenList(list):
+    __slots__ = ()
+
+    _immutable = FrozenDict._immutable
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _immutable
+    append = clear = extend = insert = pop = remove = reverse = sort = (
+        _immutable)
+
+
+def compact(node):
+    # 参照を解決済みの定義 (循環しうる) を変更できない形式に複製する。
+    # 文字列は intern して共有する。default の値も変更できない形式になるが、
+    # リクエストのデータに設定する際に dict/list へ複製される
+    return _Compactor().copy(node)
+
+
+class _Compactor(object):
+    def __init__(self):
+        self._copies = {}
+
+    def copy(self, node):
+        if isinstance(node, str):
+            return sys.intern(node)
+        if not isinstance(node, (dict, list)):
+            return node
+        copied = self._copies.get(id(node))
+        if copied is not None:
+            return copied[1]
+        if isinstance(node, list):
+            copied = FrozenList()
+            # 子ノードより先に登録して循環を辿れるようにする
+            self._copies[id(node)] = (node, copied)
+            list.extend(copied, [self.copy(v) for v in node])
+            return copied
+        copied = FrozenDict()
+        self._copies[id(node)] = (node, copied)
+        dict.update(copied, {
+            self.copy(k): self.copy(v) for k, v in node.items()})
+        return copied
+
+
+def freeze():
+    # fork する直前に呼び出すと、それまでに作成したオブジェクト (定義や
+    # コンパイル済みの検証関数など) を GC の追跡対象から外す。子プロセスの GC が
+    # それらのページに書き込まなくなり、copy-on-write で共有されたままになる。
+    # 参照カウントの更新による書き込みは避けられない。戻り値は対象外にした数
+    if not hasattr(gc, 'freeze'):
+        return 0
+    gc.freeze()
+    return gc.get_freeze_count()
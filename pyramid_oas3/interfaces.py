@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from zope.interface import Interface
+
+
+class IValidatorCache(Interface):
+    """スキーマノードごとに構築済みの Validator を保持するキャッシュ"""
+
+
+class IOAS3Context(Interface):
+    """OpenAPI 定義から構築した検証用の状態(OperationPlan など)"""
+
+
+class IStageMetrics(Interface):
+    """オペレーション・ステージごとの処理時間のヒストグラム"""
+
+
+class ISchemaProfiler(Interface):
+    """スキーマの位置・キーワードごとの検証時間の集計"""
+
+
+class IAllocationTracker(Interface):
+    """オペレーション・ステージごとのメモリ確保量"""
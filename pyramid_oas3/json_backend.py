@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import json
+
+from pyramid.path import DottedNameResolver
+
+
+# 自動選択時に試すJSONデコーダ(いずれもbytesを直接デコードできる)
+_AUTO_BACKENDS = ('orjson', 'ujson', 'rapidjson')
+
+
+def resolve_json_loads(backend=None):
+    # backend: None/'auto' (インストール済みの高速なデコーダを自動選択),
+    # モジュール名/ドット区切りの名前 (モジュールの場合はその loads を利用),
+    # または bytes を受け取る呼び出し可能オブジェクト
+    if backend is None or backend == 'auto':
+        for name in _AUTO_BACKENDS:
+            try:
+                return _with_fallback(
+                    _loads_of(DottedNameResolver().resolve(name)))
+            except ImportError:
+                continue
+        return json.loads
+    if isinstance(backend, str):
+        backend = DottedNameResolver().resolve(backend)
+    return _loads_of(backend)
+
+
+def _loads_of(obj):
+    loads = getattr(obj, 'loads', obj)
+    if not callable(loads):
+        raise ValueError('invalid json backend: {!r}'.format(obj))
+    return loads
+
+
+# 高速なデコーダが拒否するが標準ライブラリが受け付ける入力の目印
+_FALLBACK_TOKENS = ('NaN', 'Infinity')
+# 64bit に収まらない整数の拒否を示すエラーメッセージ (orjson/ujson)
+_FALLBACK_MESSAGES = ('64-bit', 'too big', 'too small')
+
+
+def _with_fallback(loads):
+    # 高速なデコーダは NaN/Infinity や巨大な整数など標準ライブラリが受け付ける
+    # 入力を拒否するので、それらの場合のみ標準ライブラリで再試行する。
+    # 不正なJSONを二度パースしないよう、それ以外のエラーはそのまま送出する
+    def _loads(s):
+        try:
+            return loads(s)
+        except Exception as e:
+            if not _needs_fallback(s, e):
+                raise
+        return json.loads(s)
+    return _loads
+
+
+def _needs_fallback(s, exc):
+    message = str(exc).lower()
+    if any(m in message for m in _FALLBACK_MESSAGES):
+        return True
+    if isinstance(s, (bytes, bytearray)):
+        return any(t.encode('ascii') in s for t in _FALLBACK_TOKENS)
+    return any(t in s for t in _FALLBACK_TOKENS)
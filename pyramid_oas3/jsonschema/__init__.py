@@ -1,5 +1,18 @@
+from pyramid_oas3.jsonschema._profiler import SchemaProfiler
 from pyramid_oas3.jsonschema._resolvers import _Resolver as Resolver
-from pyramid_oas3.jsonschema.validators import OAS3 as OAS3Validator
+from pyramid_oas3.jsonschema._utils import regex_cache_info
+from pyramid_oas3.jsonschema.validators import (
+    OAS3 as OAS3Validator, OAS3Native as OAS3NativeValidator,
+    StructureKeys, ValidationResult, ValidatorCache)
 
 
-__all__ = ['OAS3Validator', 'Resolver']
+__all__ = [
+    'OAS3Validator',
+    'OAS3NativeValidator',
+    'Resolver',
+    'SchemaProfiler',
+    'StructureKeys',
+    'ValidationResult',
+    'ValidatorCache',
+    'regex_cache_info',
+]
@@ -9,12 +9,20 @@ import rfc3987
 RE_HOSTNAME = re.compile(r'^[A-Za-z0-9][A-Za-z0-9\.\-]{1,255}$')
 
 
+def _check_only(func):
+    # 値を検証するのみで変換しない
+    func.converts = False
+    return func
+
+
+@_check_only
 def int32(v):
     if isinstance(v, int) and (v < -2**31 or v > 2**31 - 1):
         raise ValueError('{} is out of int32 range'.format(v))
     return v
 
 
+@_check_only
 def int64(v):
     if isinstance(v, int) and (v < -2**63 or v > 2**63 - 1):
         raise ValueError('{} is out of int64 range'.format(v))
@@ -56,6 +64,7 @@ def date_time(v):
     raise ValueError('invalid date-time format')
 
 
+@_check_only
 def email(v):
     if isinstance(v, str):
         # TODO(kazuki): more strict
@@ -64,6 +73,7 @@ def email(v):
     return v
 
 
+@_check_only
 def hostname(v):
     if isinstance(v, str):
         # TODO(kazuki): more strict
@@ -84,12 +94,14 @@ def ipv6(v):
     return IPv6Address(v)
 
 
+@_check_only
 def uri(v):
     if isinstance(v, str):
         rfc3987.parse(v, rule='URI')
     return v
 
 
+@_check_only
 def uriref(v):
     if isinstance(v, str):
         rfc3987.parse(v, rule='URI_reference')
@@ -0,0 +1,102 @@
+from collections import deque
+import threading
+from time import perf_counter
+
+from pyramid_oas3.jsonschema import _validators
+
+
+class SchemaProfiler(object):
+    # スキーマの位置 (JSON pointer) とキーワードごとに、検証の呼び出し回数と
+    # 処理時間を集計する。total は子ノードの検証を含む時間、own は含まない時間。
+    # 再帰的な $ref では total が重複して計上される
+    def __init__(self):
+        self.stats = {}  # (location, keyword) -> [calls, total, own]
+        self._pointers = {}
+        self._documents = {}
+        self._local = threading.local()
+
+    def wrap(self, validator, schema, keyword, check):
+        stat = self.stats.setdefault(
+            (self.location(validator.resolver, schema), keyword),
+            [0, 0.0, 0.0])
+        if isinstance(check, dict):
+            # type などカテゴリごとの関数を返すキーワード
+            wrapped = {}
+            for category, c in check.items():
+                if c not in wrapped:
+                    wrapped[c] = self._wrap(stat, c)
+            return {category: wrapped[c] for category, c in check.items()}
+        return self._wrap(stat, check)
+
+    def _wrap(self, stat, check):
+        local = self._local
+
+        def _profiled(instance, errors):
+            stack = getattr(local, 'stack', None)
+            if stack is None:
+                stack = local.stack = [0.0]
+            stack.append(0.0)
+            started = perf_counter()
+            try:
+                return check(instance, errors)
+            finally:
+                elapsed = perf_counter() - started
+                children = stack.pop()
+                stack[-1] += elapsed
+                stat[0] += 1
+                stat[1] += elapsed
+                stat[2] += elapsed - children
+        if _validators.transforms(check):
+            _profiled.transforms = True
+        return _profiled
+
+    def location(self, resolver, schema):
+        pointer = self._pointers.get(id(schema))
+        if pointer is None:
+            for uri, document in resolver._store.items():
+                if id(document) not in self._documents:
+                    self._documents[id(document)] = document
+                    self._index(document, uri + '#')
+            pointer = self._pointers.get(id(schema), '(unknown)')
+        return pointer
+
+    def _index(self, document, pointer):
+        # 参照を解決済みの定義では同じノードに複数の経路があるので、
+        # 幅優先で辿り最も短い pointer を採用する
+        queue = deque([(document, pointer)])
+        while queue:
+            node, pointer = queue.popleft()
+            if isinstance(node, dict):
+                if id(node) in self._pointers:
+                    continue
+                self._pointers[id(node)] = pointer
+                items = node.items()
+            elif isinstance(node, list):
+                items = enumerate(node)
+            else:
+                continue
+            for k, v in items:
+                queue.append((v, '{}/{}'.format(
+                    pointer, str(k).replace('~', '~0').replace('/', '~1'))))
+
+    def top(self, limit=None, key='own'):
+        # (location, keyword, calls, total, own) を key の降順で返す
+        index = ('calls', 'total', 'own').index(key)
+        entries = sorted(
+            ((location, keyword) + tuple(stat)
+             for (location, keyword), stat in self.stats.items()
+             if stat[0]),
+            key=lambda e: e[2 + index], reverse=True)
+        return entries[:limit]
+
+    def report(self, limit=20, key='own'):
+        lines = ['{:>10} {:>12} {:>12}  {}'.format(
+            'calls', 'total(s)', 'own(s)', 'location')]
+        for location, keyword, calls, total, own in self.top(limit, key):
+            lines.append('{:>10} {:>12.6f} {:>12.6f}  {}/{}'.format(
+                calls, total, own, location, keyword))
+        return '\n'.join(lines)
+
+    def reset(self):
+        for stat in self.stats.values():
+            stat[:] = [0, 0.0, 0.0]
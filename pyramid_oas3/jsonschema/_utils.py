@@ -1,3 +1,58 @@
+from functools import lru_cache
+import re
+
+
+# reviver が値を削除することを示す (is で比較する)
+UNDEFINED = object()
+
+# プロセス全体で共有するコンパイル済み正規表現のキャッシュ
+get_regex = lru_cache(8192)(re.compile)
+
+
+def regex_cache_info():
+    return get_regex.cache_info()
+
+
+def prefill_regex_cache(schema, _seen=None):
+    # 参照を解決済みのスキーマは循環しうるので、一度訪れたノードは辿らない
+    if not isinstance(schema, (dict, list)):
+        return
+    if _seen is None:
+        _seen = set()
+    if id(schema) in _seen:
+        return
+    _seen.add(id(schema))
+    if isinstance(schema, list):
+        for v in schema:
+            prefill_regex_cache(v, _seen)
+        return
+    for k, v in schema.items():
+        if k == 'pattern' and isinstance(v, str):
+            get_regex(v)
+        elif k == 'patternProperties' and isinstance(v, dict) and v:
+            for pattern in v:
+                get_regex(pattern)
+            # additionalProperties の判定で使われる形式
+            get_regex('|'.join(v))
+        prefill_regex_cache(v, _seen)
+
+
+class BudgetExhausted(Exception):
+    pass
+
+
+class ErrorList(list):
+    # limit 個のエラーが追加された時点で BudgetExhausted を送出し、検証を打ち切る
+    def __init__(self, limit=None):
+        super().__init__()
+        self.limit = limit
+
+    def append(self, error):
+        super().append(error)
+        if self.limit is not None and len(self) >= self.limit:
+            raise BudgetExhausted
+
+
 def ensure_list(thing):
     if not isinstance(thing, list):
         return [thing]
@@ -32,6 +87,16 @@ def merge_instances(others):
     return base
 
 
+def copy_default(value):
+    # default 値はリクエストのデータに設定されビューで変更されうるので、
+    # dict/list はリクエストごとに複製する (変更できない形式の定義にも対応する)
+    if isinstance(value, dict):
+        return {k: copy_default(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [copy_default(v) for v in value]
+    return value
+
+
 def is_uniq(array):
     def unbool(e, true=object(), false=object()):
         if e is True:
@@ -49,3 +114,14 @@ def is_uniq(array):
                 return False
             seen.append(e)
         return True
+
+
+def strip_undefined(instance):
+    # reviver により UNDEFINED となった要素を取り除く
+    if isinstance(instance, dict):
+        if any(v is UNDEFINED for v in instance.values()):
+            return {k: v for k, v in instance.items() if v is not UNDEFINED}
+    elif isinstance(instance, list):
+        if any(v is UNDEFINED for v in instance):
+            return [v for v in instance if v is not UNDEFINED]
+    return instance
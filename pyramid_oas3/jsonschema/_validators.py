@@ -1,72 +1,246 @@
 from pyramid_oas3.jsonschema import _utils
-from pyramid_oas3.jsonschema.exceptions import ValidationError
+from pyramid_oas3.jsonschema.exceptions import (
+    FormatError, Joined, ValidationError)
 
 
-def ref(validator, ref, instance, schema, errors):
+# 各キーワードはスキーマ読み込み時に一度だけ呼び出され、
+# インスタンスを検証する関数 (instance, errors) -> new_instance を返す。
+# 何も検証する必要がない場合は None を返す。
+# applies_to で対象カテゴリを限定したキーワードは、
+# それ以外のカテゴリのインスタンスに対しては呼び出されない。
+# インスタンスを変換する(新しいオブジェクトを返しうる)関数には
+# transforms 属性を付与する。変換が不要な場合はコピーを作らない関数を返す。
+
+def _applies_to(*categories):
+    def _decorator(func):
+        func.applies_to = frozenset(categories)
+        return func
+    return _decorator
+
+
+def _transforming(func):
+    func.transforms = True
+    return func
+
+
+def transforms(check):
+    return check is not None and getattr(check, 'transforms', False)
+
+
+def _prefix_errors(errors, offset, path=None, schema_path=None):
+    for error in errors[offset:]:
+        error._prefix(path, schema_path)
+
+
+def _run_branch(check, instance, errors):
+    # エラー数の上限が設定されている場合、oneOf/anyOf の各分岐は
+    # 最初のエラーで失敗と判断して打ち切る
+    limit = getattr(errors, 'limit', None)
+    if limit is None:
+        return check(instance, errors)
+    errors.limit = min(limit, len(errors) + 1)
+    try:
+        return check(instance, errors)
+    except _utils.BudgetExhausted:
+        return instance
+    finally:
+        errors.limit = limit
+
+
+def ref(validator, ref, schema):
     scope, resolved = validator.resolver.resolve(ref)
     validator.resolver.push_scope(scope)
     try:
-        return validator._descend(instance, resolved, errors)
+        return validator._compile(resolved)
     finally:
         validator.resolver.pop_scope()
 
 
-def type(validator, types, instance, schema, errors):
+def type(validator, types, schema):
     types = _utils.ensure_list(types)
-    if not any(validator.is_type(instance, type, schema) for type in types):
-        errors.append(ValidationError('{} is not of type {}'.format(
-            instance, ', '.join(types))))
-
-
-def items(validator, items, instance, schema, errors):
-    if not validator.is_type(instance, 'array', schema):
-        return
-
-    if validator.is_type(items, 'object', schema):
-        new_instance = [None] * len(instance)
-        new_schema = items
-        for index, item in enumerate(instance):
-            new_instance[index], new_schema = validator._descend(
-                item, items, errors, path=index)
-    else:
-        new_instance = [None] * min(len(instance), len(items))
-        new_schema = list(items)
-        for (index, item), subschema in zip(enumerate(instance), items):
-            new_instance[index], new_schema[index] = validator._descend(
-                item, subschema, errors, path=index, schema_path=index)
-    return new_instance, new_schema
-
+    for typ in types:
+        if typ not in validator._types:
+            raise validator._unknown_type(typ, schema)
+    message = ', '.join(types)
+    # ネイティブな値を許容する Validator では、format に対応する型
+    # (date-time なら datetime など) も string として扱う
+    native = None
+    if 'string' in types and validator._native_formats:
+        native = validator._native_formats.get(schema.get('format'))
+
+    def _fail(instance, errors):
+        errors.append(ValidationError(
+            '{} is not of type {}', params=(instance, message)))
+        return instance
 
-def properties(validator, properties, instance, schema, errors):
-    if not validator.is_type(instance, 'object', schema):
-        return
+    def _native(instance, errors):
+        if not native(instance):
+            errors.append(ValidationError(
+                '{} is not of type {}', params=(instance, message)))
+        return instance
 
-    new_schema = {}
-    new_instance = dict(instance)
-    for property, subschema in properties.items():
-        prop_value = instance.get(property)
-        if prop_value is None:
-            filled, default_value = _try_get_default_value(
-                validator, subschema)
-            if filled:
-                if isinstance(default_value, (dict, list)):
-                    prop_value = default_value
-                else:
-                    # dict/list以外の場合はformatで型が変わっている可能性があるので
-                    # default値を信頼してvalidationは実施しない
-                    new_instance[property] = default_value
-                    new_schema[property] = subschema
+    def _integer(instance, errors):
+        if not isinstance(instance, int):
+            errors.append(ValidationError(
+                '{} is not of type {}', params=(instance, message)))
+        return instance
+
+    # インスタンスのカテゴリが確定していれば number 以外は静的に判定できる
+    checks = {}
+    for category in validator._categories:
+        if category in types:
+            continue
+        if category == 'number' and 'integer' in types:
+            checks[category] = _integer
+        elif category == 'other' and native is not None:
+            checks[category] = _native
+        else:
+            checks[category] = _fail
+    return checks
+
+
+@_applies_to('array')
+def items(validator, items, schema):
+    if isinstance(items, dict):
+        check = validator._compile(items)
+        if check is None:
+            return None
+
+        if not transforms(check):
+            def _check_items(instance, errors):
+                for index, item in enumerate(instance):
+                    offset = len(errors)
+                    try:
+                        check(item, errors)
+                    finally:
+                        if len(errors) != offset:
+                            _prefix_errors(errors, offset, path=index)
+                return instance
+            return _check_items
+
+        @_transforming
+        def _items(instance, errors):
+            new_instance = None
+            for index, item in enumerate(instance):
+                offset = len(errors)
+                try:
+                    ret = check(item, errors)
+                finally:
+                    if len(errors) != offset:
+                        _prefix_errors(errors, offset, path=index)
+                if ret is not item:
+                    if new_instance is None:
+                        new_instance = list(instance)
+                    new_instance[index] = ret
+            return instance if new_instance is None else new_instance
+        return _items
+
+    checks = [validator._compile(subschema) for subschema in items]
+    if all(check is None for check in checks):
+        return None
+
+    if not any(transforms(check) for check in checks):
+        def _check_items_array(instance, errors):
+            for index, (item, check) in enumerate(zip(instance, checks)):
+                if check is None:
                     continue
-            else:
-                new_schema[property] = subschema
+                offset = len(errors)
+                try:
+                    check(item, errors)
+                finally:
+                    if len(errors) != offset:
+                        _prefix_errors(
+                            errors, offset, path=index, schema_path=index)
+            return instance
+        return _check_items_array
+
+    @_transforming
+    def _items_array(instance, errors):
+        new_instance = None
+        for index, (item, check) in enumerate(zip(instance, checks)):
+            if check is None:
                 continue
-        new_instance[property], new_schema[property] = validator._descend(
-            prop_value, subschema, errors, path=property, schema_path=property)
-    return new_instance, new_schema
+            offset = len(errors)
+            try:
+                ret = check(item, errors)
+            finally:
+                if len(errors) != offset:
+                    _prefix_errors(
+                        errors, offset, path=index, schema_path=index)
+            if ret is not item:
+                if new_instance is None:
+                    new_instance = list(instance)
+                new_instance[index] = ret
+        return instance if new_instance is None else new_instance
+    return _items_array
+
+
+@_applies_to('object')
+def properties(validator, properties, schema):
+    entries = []
+    for property, subschema in properties.items():
+        check = validator._compile(subschema)
+        filled, default_value = _try_get_default_value(validator, subschema)
+        if check is not None or filled:
+            entries.append((property, check, filled, default_value))
+    if not entries:
+        return None
+
+    if not any(transforms(check) or filled
+               for _, check, filled, _ in entries):
+        def _check_properties(instance, errors):
+            for property, check, _, _ in entries:
+                prop_value = instance.get(property)
+                if prop_value is None:
+                    continue
+                offset = len(errors)
+                try:
+                    check(prop_value, errors)
+                finally:
+                    if len(errors) != offset:
+                        _prefix_errors(
+                            errors, offset,
+                            path=property, schema_path=property)
+            return instance
+        return _check_properties
+
+    @_transforming
+    def _properties(instance, errors):
+        # 値が変化したプロパティがある場合のみコピーする (copy-on-write)
+        new_instance = None
+        for property, check, filled, default_value in entries:
+            original = prop_value = instance.get(property)
+            # default: null でもキーが無ければ設定する
+            absent = False
+            if prop_value is None:
+                if not filled:
+                    continue
+                absent = property not in instance
+                prop_value = _utils.copy_default(default_value)
+            # dict/list以外のdefault値はformatで型が変わっている可能性があるので
+            # default値を信頼してvalidationは実施しない
+            if check is not None and (
+                    original is not None or
+                    isinstance(prop_value, (dict, list))):
+                offset = len(errors)
+                try:
+                    prop_value = check(prop_value, errors)
+                finally:
+                    if len(errors) != offset:
+                        _prefix_errors(
+                            errors, offset,
+                            path=property, schema_path=property)
+            if absent or prop_value is not original:
+                if new_instance is None:
+                    new_instance = dict(instance)
+                new_instance[property] = prop_value
+        return instance if new_instance is None else new_instance
+    return _properties
 
 
 def _try_get_default_value(validator, subschema):
-    if not validator._fill_by_default or not isinstance(subschema, dict):
+    if (not validator._fill_by_default or validator._check_only or
+            not isinstance(subschema, dict)):
         return False, None
     ref_value = subschema.get('$ref')
     if ref_value:
@@ -89,259 +263,500 @@ def _try_get_default_value(validator, subschema):
     return False, None
 
 
-def format(validator, format, instance, schema, errors):
-    if validator.format_checker is not None:
+def format(validator, format, schema):
+    if validator.format_checker is None:
+        return None
+    checker = validator.format_checker.compile(format)
+    if checker is None:
+        return None
+
+    if validator._check_only or not getattr(checker, 'converts', True):
+        def _check_format(instance, errors):
+            try:
+                checker(instance)
+            except FormatError as e:
+                errors.append(ValidationError(
+                    e._template, params=e._params, cause=e.__cause__))
+            return instance
+        return _check_format
+
+    @_transforming
+    def _format(instance, errors):
         try:
-            instance = validator.format_checker.check(instance, format)
-        except Exception as e:
-            errors.append(ValidationError(str(e), cause=e.__cause__))
-    return instance, format
-
-
-def oneOf(validator, oneOf, instance, schema, errors):
-    valids = []
-    all_errors = []
-    for index, subschema in enumerate(oneOf):
-        erroff = len(errors)
-        ret = validator._descend(
-            instance, subschema, errors, schema_path=index)
-        if len(errors) == erroff:
-            valids.append((ret, subschema))
-        else:
-            all_errors.extend(errors[erroff:])
-            del errors[erroff:]
-
-    if len(valids) == 1:
-        return valids[0][0][0], oneOf
+            return checker(instance)
+        except FormatError as e:
+            errors.append(ValidationError(
+                e._template, params=e._params, cause=e.__cause__))
+            return instance
+    return _format
 
-    if not valids:
-        errors.append(ValidationError(
-            '{} is not valid under any of the given schemas'.format(instance),
-            context=all_errors,
-        ))
-    elif len(valids) > 1:
-        errors.append(ValidationError(
-            '{} is valid under each of {}'.format(
-                instance, ', '.join(repr(schema) for _, schema in valids))))
-
-
-def allOf(validator, allOf, instance, schema, errors):
-    if not allOf:
-        return
-    ret = []
-    for index, subschema in enumerate(allOf):
-        tmp, _ = validator._descend(
-            instance, subschema, errors, schema_path=index)
-        ret.append(tmp)
-    return _utils.merge_instances(ret), allOf
-
-
-def anyOf(validator, anyOf, instance, schema, errors):
-    valids, all_errors = [], []
-    for index, subschema in enumerate(anyOf):
-        erroff = len(errors)
-        ret, _ = validator._descend(
-            instance, subschema, errors, schema_path=index)
-        if len(errors) == erroff:
-            valids.append(ret)
-        else:
-            all_errors.extend(errors[erroff:])
-            del errors[erroff:]
 
-    if len(valids) > 0:
-        return _utils.merge_instances(valids), anyOf
+def oneOf(validator, oneOf, schema):
+    checks = [validator._compile(subschema) for subschema in oneOf]
 
-    errors.append(ValidationError(
-        '{} is not valid under any of the given schemas'.format(instance),
-        context=all_errors,
-    ))
+    @_transforming
+    def _oneOf(instance, errors):
+        valids = []
+        all_errors = []
+        for index, (check, subschema) in enumerate(zip(checks, oneOf)):
+            if check is None:
+                valids.append((instance, subschema))
+                continue
+            erroff = len(errors)
+            ret = _run_branch(check, instance, errors)
+            if len(errors) == erroff:
+                valids.append((ret, subschema))
+            else:
+                _prefix_errors(errors, erroff, schema_path=index)
+                all_errors.extend(errors[erroff:])
+                del errors[erroff:]
 
+        if len(valids) == 1:
+            return valids[0][0]
 
-def required(validator, required, instance, schema, errors):
-    if not validator.is_type(instance, 'object', schema):
-        return
-    for property in required:
-        if property not in instance:
+        if not valids:
             errors.append(ValidationError(
-                '{} is a required property'.format(property)))
-
-
-def additionalItems(validator, aI, instance, schema, errors):
-    if (not validator.is_type(instance, 'array', schema) or
-            validator.is_type(schema.get('items', {}), 'object', schema)):
-        return
-
-    items_array = schema.get('items', [])
-    if validator.is_type(aI, 'object', schema):
-        new_instance = list(instance)
-        for index, item in enumerate(
-                instance[len(items_array):], start=len(items_array)):
-            new_instance[index] = validator._descend(
-                item, aI, errors, path=index)
-    elif not aI and len(instance) > len(items_array):
-        errors.append(ValidationError(
-            'Additional items are not allowed ({} were unexpected)'.format(
-                ', '.join([
-                    str(x) for x in instance[len(items_array):]]))))
-
+                '{} is not valid under any of the given schemas',
+                params=(instance,), context=all_errors,
+            ))
+        elif len(valids) > 1:
+            errors.append(ValidationError(
+                '{} is valid under each of {}',
+                params=(instance, Joined([schema for _, schema in valids]))))
+        return instance
+    if not any(transforms(check) for check in checks):
+        _oneOf.transforms = False
+    return _oneOf
+
+
+def allOf(validator, allOf, schema):
+    checks = [validator._compile(subschema) for subschema in allOf]
+    if all(check is None for check in checks):
+        return None
+
+    if not any(transforms(check) for check in checks):
+        def _check_allOf(instance, errors):
+            for index, check in enumerate(checks):
+                if check is None:
+                    continue
+                offset = len(errors)
+                try:
+                    check(instance, errors)
+                finally:
+                    if len(errors) != offset:
+                        _prefix_errors(errors, offset, schema_path=index)
+            return instance
+        return _check_allOf
+
+    @_transforming
+    def _allOf(instance, errors):
+        ret = []
+        for index, check in enumerate(checks):
+            if check is None:
+                ret.append(instance)
+                continue
+            offset = len(errors)
+            try:
+                ret.append(check(instance, errors))
+            finally:
+                if len(errors) != offset:
+                    _prefix_errors(errors, offset, schema_path=index)
+        if all(r is instance for r in ret):
+            return instance
+        return _utils.merge_instances(ret)
+    return _allOf
+
+
+def anyOf(validator, anyOf, schema):
+    checks = [validator._compile(subschema) for subschema in anyOf]
+    if all(check is None for check in checks):
+        return None
+    merge = any(transforms(check) for check in checks)
+
+    def _anyOf(instance, errors):
+        valids, all_errors = [], []
+        for index, check in enumerate(checks):
+            if check is None:
+                valids.append(instance)
+                continue
+            erroff = len(errors)
+            ret = _run_branch(check, instance, errors)
+            if len(errors) == erroff:
+                valids.append(ret)
+            else:
+                _prefix_errors(errors, erroff, schema_path=index)
+                all_errors.extend(errors[erroff:])
+                del errors[erroff:]
 
-def additionalProperties(validator, aP, instance, schema, errors):
-    if not validator.is_type(instance, 'object', schema):
-        return
+        if len(valids) > 0:
+            if not merge or all(v is instance for v in valids):
+                return instance
+            return _utils.merge_instances(valids)
 
-    extras = set()
+        errors.append(ValidationError(
+            '{} is not valid under any of the given schemas',
+            params=(instance,), context=all_errors,
+        ))
+        return instance
+    if merge:
+        _anyOf.transforms = True
+    return _anyOf
+
+
+@_applies_to('object')
+def required(validator, required, schema):
+    if not required:
+        return None
+
+    def _required(instance, errors):
+        for property in required:
+            if property not in instance:
+                errors.append(ValidationError(
+                    '{} is a required property', params=(property,)))
+        return instance
+    return _required
+
+
+@_applies_to('array')
+def additionalItems(validator, aI, schema):
+    items_array = schema.get('items', {})
+    if isinstance(items_array, dict):
+        return None
+    start = len(items_array)
+
+    if isinstance(aI, dict):
+        check = validator._compile(aI)
+        if check is None:
+            return None
+
+        if not transforms(check):
+            def _check_additionalItems(instance, errors):
+                for index in range(start, len(instance)):
+                    offset = len(errors)
+                    try:
+                        check(instance[index], errors)
+                    finally:
+                        if len(errors) != offset:
+                            _prefix_errors(errors, offset, path=index)
+                return instance
+            return _check_additionalItems
+
+        @_transforming
+        def _additionalItems(instance, errors):
+            new_instance = None
+            for index in range(start, len(instance)):
+                item = instance[index]
+                offset = len(errors)
+                try:
+                    ret = check(item, errors)
+                finally:
+                    if len(errors) != offset:
+                        _prefix_errors(errors, offset, path=index)
+                if ret is not item:
+                    if new_instance is None:
+                        new_instance = list(instance)
+                    new_instance[index] = ret
+            return instance if new_instance is None else new_instance
+        return _additionalItems
+    elif not aI:
+        def _no_additionalItems(instance, errors):
+            if len(instance) > start:
+                errors.append(ValidationError(
+                    'Additional items are not allowed ({} were unexpected)',
+                    params=(Joined(instance[start:], as_str=True),)))
+            return instance
+        return _no_additionalItems
+    return None
+
+
+@_applies_to('object')
+def additionalProperties(validator, aP, schema):
     properties = schema.get("properties", {})
     patterns = schema.get("patternProperties", {})
     if patterns and isinstance(patterns, dict):
-        patterns = validator._get_regex('|'.join(patterns))
+        regex = validator._get_regex('|'.join(patterns))
     else:
-        patterns = None
-    for name in instance:
-        if name not in properties:
-            if patterns and patterns.search(name):
-                continue
-            extras.add(name)
-
-    if validator.is_type(aP, 'object', schema):
-        new_instance = dict(instance)
-        for extra in extras:
-            new_instance[extra], _ = validator._descend(
-                instance[extra], aP, errors, path=extra)
-        return new_instance, aP
-    elif not aP and extras:
-        if patterns:
-            patterns = sorted(schema['patternProperties'])
-            errors.append(ValidationError(
-                '{} do not match any of the regexes: {}'.format(
-                    ', '.join(map(repr, sorted(extras))),
-                    ', '.join(map(repr, patterns)))))
-        else:
-            errors.append(ValidationError(
-                'Additional properties are not allowed '
-                '({} were unexpected)'.format(extras)))
-
-
-def minItems(validator, minItems, instance, schema, errors):
-    if (validator.is_type(instance, 'array', schema)
-            and len(instance) < minItems):
-        errors.append(ValidationError('{} is too short'.format(instance,)))
+        regex = None
 
+    def _extras(instance):
+        extras = set()
+        for name in instance:
+            if name not in properties:
+                if regex and regex.search(name):
+                    continue
+                extras.add(name)
+        return extras
+
+    if isinstance(aP, dict):
+        check = validator._compile(aP)
+        if check is None:
+            return None
+
+        if not transforms(check):
+            def _check_additionalProperties(instance, errors):
+                for extra in _extras(instance):
+                    offset = len(errors)
+                    try:
+                        check(instance[extra], errors)
+                    finally:
+                        if len(errors) != offset:
+                            _prefix_errors(errors, offset, path=extra)
+                return instance
+            return _check_additionalProperties
+
+        @_transforming
+        def _additionalProperties(instance, errors):
+            new_instance = None
+            for extra in _extras(instance):
+                value = instance[extra]
+                offset = len(errors)
+                try:
+                    ret = check(value, errors)
+                finally:
+                    if len(errors) != offset:
+                        _prefix_errors(errors, offset, path=extra)
+                if ret is not value:
+                    if new_instance is None:
+                        new_instance = dict(instance)
+                    new_instance[extra] = ret
+            return instance if new_instance is None else new_instance
+        return _additionalProperties
+    elif not aP:
+        def _no_additionalProperties(instance, errors):
+            extras = _extras(instance)
+            if not extras:
+                return instance
+            if regex:
+                errors.append(ValidationError(
+                    '{} do not match any of the regexes: {}',
+                    params=(Joined(sorted(extras)), Joined(sorted(patterns)))))
+            else:
+                errors.append(ValidationError(
+                    'Additional properties are not allowed '
+                    '({} were unexpected)', params=(extras,)))
+            return instance
+        return _no_additionalProperties
+    return None
+
+
+@_applies_to('array')
+def minItems(validator, minItems, schema):
+    def _minItems(instance, errors):
+        if len(instance) < minItems:
+            errors.append(ValidationError(
+                '{} is too short', params=(instance,)))
+        return instance
+    return _minItems
 
-def maxItems(validator, maxItems, instance, schema, errors):
-    if (validator.is_type(instance, 'array', schema)
-            and len(instance) > maxItems):
-        errors.append(ValidationError('{} is too long'.format(instance,)))
 
+@_applies_to('array')
+def maxItems(validator, maxItems, schema):
+    def _maxItems(instance, errors):
+        if len(instance) > maxItems:
+            errors.append(ValidationError(
+                '{} is too long', params=(instance,)))
+        return instance
+    return _maxItems
 
-def minLength(validator, mL, instance, schema, errors):
-    if (validator.is_type(instance, 'string', schema)
-            and len(instance) < mL):
-        errors.append(ValidationError('{} is too short'.format(instance,)))
 
+@_applies_to('string')
+def minLength(validator, mL, schema):
+    def _minLength(instance, errors):
+        if len(instance) < mL:
+            errors.append(ValidationError(
+                '{} is too short', params=(instance,)))
+        return instance
+    return _minLength
 
-def maxLength(validator, mL, instance, schema, errors):
-    if (validator.is_type(instance, 'string', schema)
-            and len(instance) > mL):
-        errors.append(ValidationError('{} is too long'.format(instance,)))
 
+@_applies_to('string')
+def maxLength(validator, mL, schema):
+    def _maxLength(instance, errors):
+        if len(instance) > mL:
+            errors.append(ValidationError(
+                '{} is too long', params=(instance,)))
+        return instance
+    return _maxLength
 
-def minimum(validator, minimum, instance, schema, errors):
-    if not validator.is_type(instance, 'number', schema):
-        return
 
+@_applies_to('number')
+def minimum(validator, minimum, schema):
     if schema.get('exclusiveMinimum', False):
-        failed = instance <= minimum
-        cmp = 'less than or equal to'
-    else:
-        failed = instance < minimum
-        cmp = 'less than'
-    if failed:
-        errors.append(ValidationError(
-            '{} is {} the minimum of {}'.format(instance, cmp, minimum)))
-
+        def _exclusiveMinimum(instance, errors):
+            if instance <= minimum:
+                errors.append(ValidationError(
+                    '{} is less than or equal to the minimum of {}',
+                    params=(instance, minimum)))
+            return instance
+        return _exclusiveMinimum
+
+    def _minimum(instance, errors):
+        if instance < minimum:
+            errors.append(ValidationError(
+                '{} is less than the minimum of {}',
+                params=(instance, minimum)))
+        return instance
+    return _minimum
 
-def maximum(validator, maximum, instance, schema, errors):
-    if not validator.is_type(instance, 'number', schema):
-        return
 
+@_applies_to('number')
+def maximum(validator, maximum, schema):
     if schema.get('exclusiveMaximum', False):
-        failed = instance >= maximum
-        cmp = 'greater than or equal to'
-    else:
-        failed = instance > maximum
-        cmp = 'greater than'
+        def _exclusiveMaximum(instance, errors):
+            if instance >= maximum:
+                errors.append(ValidationError(
+                    '{} is greater than or equal to the maximum of {}',
+                    params=(instance, maximum)))
+            return instance
+        return _exclusiveMaximum
+
+    def _maximum(instance, errors):
+        if instance > maximum:
+            errors.append(ValidationError(
+                '{} is greater than the maximum of {}',
+                params=(instance, maximum)))
+        return instance
+    return _maximum
 
-    if failed:
-        errors.append(ValidationError(
-            '{} is {} the maximum of {}'.format(instance, cmp, maximum)))
 
+@_applies_to('object')
+def minProperties(validator, mP, schema):
+    def _minProperties(instance, errors):
+        if len(instance) < mP:
+            errors.append(ValidationError(
+                '{} does not have enough properties', params=(instance,)))
+        return instance
+    return _minProperties
 
-def minProperties(validator, mP, instance, schema, errors):
-    if validator.is_type(instance, 'object', schema) and len(instance) < mP:
-        errors.append(ValidationError(
-            '{} does not have enough properties'.format(instance)))
 
+@_applies_to('object')
+def maxProperties(validator, mP, schema):
+    def _maxProperties(instance, errors):
+        if len(instance) > mP:
+            errors.append(ValidationError(
+                '{} has too many properties', params=(instance,)))
+        return instance
+    return _maxProperties
 
-def maxProperties(validator, mP, instance, schema, errors):
-    if validator.is_type(instance, 'object', schema) and len(instance) > mP:
-        errors.append(ValidationError(
-            '{} has too many properties'.format(instance)))
 
+def enum(validator, enum, schema):
+    def _enum(instance, errors):
+        if instance not in enum:
+            errors.append(ValidationError(
+                '{} is not one of {}', params=(instance, enum)))
+        return instance
+    return _enum
 
-def enum(validator, enum, instance, schema, errors):
-    if instance not in enum:
-        errors.append(ValidationError(
-            '{} is not one of {}'.format(instance, enum)))
 
+@_applies_to('array')
+def uniqueItems(validator, uI, schema):
+    if not uI:
+        return None
 
-def uniqueItems(validator, uI, instance, schema, errors):
-    if (uI and validator.is_type(instance, 'array', schema) and
-            not _utils.is_uniq(instance)):
+    def _uniqueItems(instance, errors):
+        if not _utils.is_uniq(instance):
+            errors.append(ValidationError(
+                '{} has non-unique elements', params=(instance,)))
+        return instance
+    return _uniqueItems
+
+
+def not_(validator, not_, schema):
+    check = validator._compile(not_)
+
+    def _not(instance, errors):
+        if check is not None:
+            # エラーの有無のみが必要なので最初のエラーで打ち切る
+            tmp_errors = _utils.ErrorList(limit=1)
+            try:
+                check(instance, tmp_errors)
+            except _utils.BudgetExhausted:
+                pass
+            if len(tmp_errors) != 0:
+                return instance
         errors.append(ValidationError(
-            '{} has non-unique elements'.format(instance)))
-
-
-def not_(validator, not_, instance, schema, errors):
-    tmp_errors = []
-    validator._descend(instance, not_, tmp_errors)
-    if len(tmp_errors) != 0:
-        return
-    errors.append(ValidationError(
-        '{} is not allowed for {}'.format(not_, instance)))
+            '{} is not allowed for {}', params=(not_, instance)))
+        return instance
+    return _not
 
 
-def dependencies(validator, deps, instance, schema, errors):
+def dependencies(validator, deps, schema):
     raise NotImplementedError
 
 
-def multipleOf(validator, mO, instance, schema, errors):
-    if not validator.is_type(instance, 'number', schema):
-        return
+@_applies_to('number')
+def multipleOf(validator, mO, schema):
     if isinstance(mO, float):
-        quotient = instance / mO
-        failed = int(quotient) != quotient
-    else:
-        failed = instance % mO
-    if failed:
-        errors.append(ValidationError(
-            '{} is not a multiple of {}'.format(instance, mO)))
+        def _multipleOf_float(instance, errors):
+            quotient = instance / mO
+            if int(quotient) != quotient:
+                errors.append(ValidationError(
+                    '{} is not a multiple of {}', params=(instance, mO)))
+            return instance
+        return _multipleOf_float
+
+    def _multipleOf(instance, errors):
+        if instance % mO:
+            errors.append(ValidationError(
+                '{} is not a multiple of {}', params=(instance, mO)))
+        return instance
+    return _multipleOf
 
 
-def pattern(validator, pattern, instance, schema, errors):
-    if (validator.is_type(instance, 'string', schema) and
-            not validator._get_regex(pattern).search(instance)):
-        errors.append(ValidationError(
-            '{} does not match {}'.format(instance, pattern)))
+@_applies_to('string')
+def pattern(validator, pattern, schema):
+    regex = validator._get_regex(pattern)
+
+    def _pattern(instance, errors):
+        if not regex.search(instance):
+            errors.append(ValidationError(
+                '{} does not match {}', params=(instance, pattern)))
+        return instance
+    return _pattern
 
 
-def patternProperties(validator, pP, instance, schema, errors):
-    if not validator.is_type(instance, 'object', schema):
-        return
-    new_instance = dict(instance)
+@_applies_to('object')
+def patternProperties(validator, pP, schema):
+    entries = []
     for pattern, subschema in pP.items():
-        x = validator._get_regex(pattern)
-        for k, v in instance.items():
-            if x.search(k):
-                new_instance[k] = validator._descend(
-                    v, subschema, errors, path=k, schema_path=pattern)
-    return new_instance, pP
+        check = validator._compile(subschema)
+        if check is not None:
+            entries.append((validator._get_regex(pattern), pattern, check))
+    if not entries:
+        return None
+
+    if not any(transforms(check) for _, _, check in entries):
+        def _check_patternProperties(instance, errors):
+            for regex, pattern, check in entries:
+                for k, v in instance.items():
+                    if regex.search(k):
+                        offset = len(errors)
+                        try:
+                            check(v, errors)
+                        finally:
+                            if len(errors) != offset:
+                                _prefix_errors(
+                                    errors, offset,
+                                    path=k, schema_path=pattern)
+            return instance
+        return _check_patternProperties
+
+    @_transforming
+    def _patternProperties(instance, errors):
+        new_instance = None
+        for regex, pattern, check in entries:
+            for k, v in instance.items():
+                if regex.search(k):
+                    offset = len(errors)
+                    try:
+                        ret = check(v, errors)
+                    finally:
+                        if len(errors) != offset:
+                            _prefix_errors(
+                                errors, offset, path=k, schema_path=pattern)
+                    if ret is not v:
+                        if new_instance is None:
+                            new_instance = dict(instance)
+                        new_instance[k] = ret
+        return instance if new_instance is None else new_instance
+    return _patternProperties
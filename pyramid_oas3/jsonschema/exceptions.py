@@ -1,14 +1,137 @@
 from collections import deque
-import pprint
 import textwrap
 
 
+# エラーメッセージの書式化に関する上限値。configure() で変更できる
+_limits = {
+    # メッセージに埋め込む値1つあたりの最大文字数
+    'max_length': 256,
+    # oneOf/anyOf などの context に保持するエラーの最大数
+    'max_context': 16,
+    # context の入れ子の最大の深さ
+    'max_depth': 4,
+    # ValidationErrors の文字列表現/構造化表現に含めるエラーの最大数
+    'max_errors': 100,
+}
+
+
+def configure(**kwargs):
+    for k, v in kwargs.items():
+        if k not in _limits:
+            raise TypeError('unknown limit: {}'.format(k))
+        if v is not None:
+            _limits[k] = int(v)
+
+
+def _shorten(text):
+    limit = _limits['max_length']
+    if len(text) <= limit:
+        return text
+    return '{}...({} chars)'.format(text[:max(limit - 3, 0)], len(text))
+
+
+class Joined(object):
+    # 複数の値を ', ' で区切って埋め込む引数。
+    # as_str が真なら各値を str()、偽なら repr() で書式化する
+    __slots__ = ('items', 'as_str')
+
+    def __init__(self, items, as_str=False):
+        self.items = items
+        self.as_str = as_str
+
+
+class _Full(Exception):
+    pass
+
+
+class _Writer(object):
+    # 上限の文字数を超えた時点で _Full を送出し、それ以上の書式化を打ち切る
+    __slots__ = ('parts', 'size', 'limit')
+
+    def __init__(self, limit):
+        self.parts = []
+        self.size = 0
+        self.limit = limit
+
+    def write(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size > self.limit:
+            raise _Full
+
+    def value(self, value, as_str, active):
+        # as_str なら str(value)、そうでなければ repr(value) と同じ文字列を書き出す
+        typ = type(value)
+        if isinstance(value, dict) and typ.__repr__ is dict.__repr__:
+            if id(value) in active:
+                return self.write('{...}')
+            active.add(id(value))
+            self.write('{')
+            for i, (k, v) in enumerate(value.items()):
+                if i:
+                    self.write(', ')
+                self.value(k, False, active)
+                self.write(': ')
+                self.value(v, False, active)
+            active.discard(id(value))
+            return self.write('}')
+        if isinstance(value, list) and typ.__repr__ is list.__repr__:
+            if id(value) in active:
+                return self.write('[...]')
+            active.add(id(value))
+            self.write('[')
+            self.items(value, False, active)
+            active.discard(id(value))
+            return self.write(']')
+        if typ is tuple:
+            self.write('(')
+            self.items(value, False, active)
+            return self.write(',)' if len(value) == 1 else ')')
+        if (typ is set or typ is frozenset) and value:
+            self.write('{' if typ is set else 'frozenset({')
+            self.items(value, False, active)
+            return self.write('}' if typ is set else '})')
+        if typ is str and not as_str and len(value) > self.limit:
+            # 長い文字列は打ち切られるので先頭だけを repr する
+            value = value[:self.limit]
+        self.write(str(value) if as_str else repr(value))
+
+    def items(self, values, as_str, active):
+        for i, v in enumerate(values):
+            if i:
+                self.write(', ')
+            self.value(v, as_str, active)
+
+
+def _format_param(param):
+    # str.format で埋め込んだ場合と同じ文字列を max_length 文字までで返す。
+    # 大きな値でも上限を超えた時点で書式化を打ち切る
+    limit = _limits['max_length']
+    if isinstance(param, str):
+        return _shorten(param)
+    writer = _Writer(limit)
+    try:
+        if isinstance(param, Joined):
+            writer.items(param.items, param.as_str, set())
+        else:
+            writer.value(param, True, set())
+    except _Full:
+        return ''.join(writer.parts)[:max(limit - 3, 0)] + '...'
+    return ''.join(writer.parts)
+
+
+def _format_message(template, params):
+    if not params:
+        return template
+    return template.format(*[_format_param(p) for p in params])
+
+
 def _dedent(x):
     return textwrap.dedent(x).strip('\n')
 
 
 def _pformat_and_indent(obj, times=1):
-    return textwrap.indent(pprint.pformat(obj), ' ' * (4 * times))
+    return textwrap.indent(_format_param(obj), ' ' * (4 * times))
 
 
 def _format_as_index(indices):
@@ -17,6 +140,15 @@ def _format_as_index(indices):
     return '[{}]'.format(']['.join(repr(index) for index in indices))
 
 
+def _trim_context(errors, depth):
+    if depth <= 0:
+        return []
+    for error in errors:
+        if isinstance(error, _Error) and error.context:
+            error.context = _trim_context(error.context, depth - 1)
+    return errors
+
+
 _unset = object()
 
 
@@ -39,14 +171,29 @@ class UnknownTypeError(Exception):
 
 
 class _Error(Exception):
+    # 大量に生成されうるので __slots__ で属性を保持する。
+    # メッセージは template と params から必要になった時点で書式化する。
+    # path/schema_path は先頭への追加が多いので逆順のリストで保持する。
+    __slots__ = (
+        '_template', '_params', '_message', '_rpath', '_rschema_path',
+        'context', 'context_truncated', 'validator', 'validator_value',
+        'instance', 'schema', 'parent')
+
     def __init__(
             self, message, validator=_unset, path=(), cause=None, context=(),
             validator_value=_unset, instance=_unset, schema=_unset,
-            schema_path=(), parent=None):
-        self.message = message
-        self.path = self.relative_path = deque(path)
-        self.schema_path = self.relative_schema_path = deque(schema_path)
-        self.context = list(context)
+            schema_path=(), parent=None, params=()):
+        self._template = message
+        self._params = params
+        self._message = None
+        self._rpath = list(reversed(path)) if path else []
+        self._rschema_path = (
+            list(reversed(schema_path)) if schema_path else [])
+        context = list(context)
+        max_context = _limits['max_context']
+        self.context_truncated = max(len(context) - max_context, 0)
+        self.context = _trim_context(
+            context[:max_context], _limits['max_depth'])
         self.__cause__ = cause
         self.validator = validator
         self.validator_value = validator_value
@@ -54,9 +201,32 @@ class _Error(Exception):
         self.schema = schema
         self.parent = parent
 
-        for error in context:
+        for error in self.context:
             error.parent = self
 
+    @property
+    def message(self):
+        if self._message is None:
+            self._message = _format_message(self._template, self._params)
+        return self._message
+
+    @property
+    def path(self):
+        return deque(reversed(self._rpath))
+
+    @property
+    def schema_path(self):
+        return deque(reversed(self._rschema_path))
+
+    relative_path = path
+    relative_schema_path = schema_path
+
+    def _prefix(self, path=None, schema_path=None):
+        if path is not None:
+            self._rpath.append(path)
+        if schema_path is not None:
+            self._rschema_path.append(schema_path)
+
     def __repr__(self):
         return "<%s: %r>" % (self.__class__.__name__, self.message)
 
@@ -84,6 +254,18 @@ class _Error(Exception):
                 _pformat_and_indent(self.instance),
             )
 
+    def as_dict(self):
+        ret = {
+            'message': self.message,
+            'path': list(self.path),
+            'schema_path': list(self.schema_path),
+        }
+        if self.context:
+            ret['context'] = [_error_as_dict(e) for e in self.context]
+        if self.context_truncated:
+            ret['context_truncated'] = self.context_truncated
+        return ret
+
     @property
     def absolute_path(self):
         parent = self.parent
@@ -105,12 +287,20 @@ class _Error(Exception):
         return path
 
 
+def _error_as_dict(error):
+    if isinstance(error, _Error):
+        return error.as_dict()
+    return {'message': _shorten(str(error))}
+
+
 class ValidationError(_Error):
+    __slots__ = ()
     _word_for_schema_in_error_message = "schema"
     _word_for_instance_in_error_message = "instance"
 
 
 class SchemaError(_Error):
+    __slots__ = ()
     _word_for_schema_in_error_message = "metaschema"
     _word_for_instance_in_error_message = "schema"
 
@@ -120,11 +310,16 @@ class RefResolutionError(Exception):
 
 
 class FormatError(Exception):
-    def __init__(self, message, cause=None):
-        self.message = message
+    def __init__(self, message, cause=None, params=()):
+        self._template = message
+        self._params = params
         if cause:
             self.__cause__ = cause
 
+    @property
+    def message(self):
+        return _format_message(self._template, self._params)
+
     def __str__(self):
         return self.message
 
@@ -140,5 +335,23 @@ class ValidationErrors(Exception):
         self.errors = errors
 
     def __str__(self):
-        return 'found {} validation error(s)\n{}'.format(
-            len(self.errors), '\n\n'.join([str(e) for e in self.errors]))
+        max_errors = _limits['max_errors']
+        ret = 'found {} validation error(s)\n{}'.format(
+            len(self.errors),
+            '\n\n'.join([str(e) for e in self.errors[:max_errors]]))
+        if len(self.errors) > max_errors:
+            ret += '\n\n... and {} more'.format(len(self.errors) - max_errors)
+        return ret
+
+    def as_dict(self, max_errors=None):
+        # クライアントへそのまま返却できる、サイズ上限付きの構造化表現
+        if max_errors is None:
+            max_errors = _limits['max_errors']
+        ret = {
+            'message': 'found {} validation error(s)'.format(
+                len(self.errors)),
+            'errors': [_error_as_dict(e) for e in self.errors[:max_errors]],
+        }
+        if len(self.errors) > max_errors:
+            ret['truncated'] = len(self.errors) - max_errors
+        return ret
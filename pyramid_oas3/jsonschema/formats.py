@@ -7,14 +7,24 @@ class FormatChecker(object):
         self._formats = formats
 
     def check(self, instance, format):
-        checker = self._formats.get(format)
+        checker = self.compile(format)
         if not checker:
             return instance
-        try:
-            return checker(instance)
-        except Exception as e:
-            raise FormatError('{} is not a {}'.format(
-                instance, format)) from e
+        return checker(instance)
+
+    def compile(self, format):
+        checker = self._formats.get(format)
+        if not checker:
+            return None
+
+        def _check(instance):
+            try:
+                return checker(instance)
+            except Exception as e:
+                raise FormatError(
+                    '{} is not a {}', params=(instance, format)) from e
+        _check.converts = getattr(checker, 'converts', True)
+        return _check
 
 
 class Draft4(FormatChecker):
@@ -1,89 +1,191 @@
+import datetime
+from ipaddress import IPv4Address, IPv6Address
 import numbers
-from functools import lru_cache
-import re
 
 from pyramid_oas3.jsonschema.exceptions import (
     UnknownTypeError, ValidationErrors)
 from pyramid_oas3.jsonschema._resolvers import _Resolver
-from pyramid_oas3.jsonschema import _validators, formats
+from pyramid_oas3.jsonschema import _utils, _validators, formats
+
+
+_CATEGORIES = ('object', 'array', 'string', 'number', 'boolean', 'null',
+               'other')
+_CATEGORY_OF_CLASS = {
+    dict: 'object',
+    list: 'array',
+    str: 'string',
+    int: 'number',
+    float: 'number',
+    bool: 'boolean',
+    type(None): 'null',
+}
+
+
+def _category_of(cls):
+    category = _CATEGORY_OF_CLASS.get(cls)
+    if category is not None:
+        return category
+    if issubclass(cls, bool):
+        category = 'boolean'
+    elif issubclass(cls, dict):
+        category = 'object'
+    elif issubclass(cls, list):
+        category = 'array'
+    elif issubclass(cls, str):
+        category = 'string'
+    elif issubclass(cls, numbers.Number):
+        category = 'number'
+    else:
+        category = 'other'
+    _CATEGORY_OF_CLASS[cls] = category
+    return category
 
 
 class _Validator(object):
+    _categories = _CATEGORIES
+    _types = {
+        'array': list,
+        'boolean': bool,
+        'integer': int,
+        'null': type(None),
+        'number': numbers.Number,
+        'object': dict,
+        'string': str,
+    }
+    # format -> string として許容するネイティブな値の判定関数 (None: 許容しない)
+    _native_formats = None
+    _get_regex = staticmethod(_utils.get_regex)
+
     def __init__(
             self, validators, format_checker, schema, resolver=None,
-            fill_by_default=False):
+            fill_by_default=False, compiled=None, check_only=False,
+            reviver=None, profiler=None, dedup=None):
         self._validators = validators
         self._schema = schema
         self._fill_by_default = fill_by_default
-        self._types = {
-            'array': list,
-            'boolean': bool,
-            'integer': int,
-            'null': type(None),
-            'number': numbers.Number,
-            'object': dict,
-            'string': str,
-        }
+        # True の場合はインスタンスの変換(format, default値)を行わず検証のみ行う
+        self._check_only = check_only
+        # reviver(value, schema) をスキーマの各ノードで検証前に適用する
+        self._reviver = reviver
+        # SchemaProfiler を指定するとキーワードごとの処理時間を集計する
+        self._profiler = profiler
         self.format_checker = format_checker
         self.resolver = resolver
         if resolver is None:
             self.resolver = _Resolver('', schema)
-        self._get_regex = lru_cache(8192)(re.compile)
+        # compiled を共有すると、同じ設定の Validator 間で
+        # コンパイル済みのスキーマノードを再利用できる
+        self._compiled = {} if compiled is None else compiled
+        # StructuralDedup を共有すると、構造が同じノードのコンパイル結果も再利用する
+        self._dedup = dedup
+        self._compiling = set()
+        self._check = self._compile(schema)
+
+    def _compile(self, schema):
+        # スキーマを (instance, errors) -> new_instance な関数に変換する。
+        # 検証すべき項目が無いスキーマ({}など)は None を返す。
+        # 同じスキーマノードは一度だけ変換し、再帰的な $ref は遅延参照で解決する。
+        if not isinstance(schema, dict):
+            return None
+        key = (id(schema), self.resolver.resolution_scope)
+        entry = self._compiled.get(key)
+        if entry is not None:
+            return entry[1]
+        if key in self._compiling:
+            compiled = self._compiled
+
+            def _deferred(instance, errors):
+                check = compiled[key][1]
+                if check is None:
+                    return instance
+                return check(instance, errors)
+            # 変換の有無はまだ確定しないので、変換しうるものとして扱う
+            _deferred.transforms = (
+                not self._check_only or self._reviver is not None)
+            return _deferred
+
+        dedup = self._dedup
+        structure = None
+        if dedup is not None:
+            structure = dedup.key(schema, key[1])
+            entry = None if structure is None else dedup.checks.get(structure)
+            if entry is not None:
+                dedup.deduplicated += 1
+                self._compiled[key] = (schema, entry[0])
+                return entry[0]
 
-    def _validate(self, instance, schema, errors):
+        self._compiling.add(key)
+        try:
+            check = self._compile_node(schema)
+        finally:
+            self._compiling.discard(key)
+        # $ref は参照先のノードで適用されるので二重に適用しない
+        if self._reviver is not None and '$ref' not in schema:
+            check = _reviving(self._reviver, schema, check)
+        self._compiled[key] = (schema, check)
+        if dedup is not None:
+            dedup.compiled += 1
+            if structure is not None:
+                dedup.checks[structure] = (check,)
+        return check
+
+    def _compile_node(self, schema):
         scope = schema.get('id')
         if scope:
             self.resolver.push_scope(scope)
         try:
             ref = schema.get('$ref')
             if ref is not None:
-                schema = {'$ref': ref}
-            new_instance = instance
-            new_schema = {}
+                return self._validators['$ref'](self, ref, schema)
+
+            checks = {category: [] for category in self._categories}
             for k, v in schema.items():
                 validator = self._validators.get(k)
                 if validator is None:
                     continue
-                if ref is None and self._is_nullable_and_skip_validation(
-                        instance, schema):
+                check = validator(self, v, schema)
+                if check is None:
                     continue
-                ret = validator(self, v, instance, schema, errors)
-                if ret is None:
-                    tmp_instance, tmp_schema = instance, v
-                else:
-                    tmp_instance, tmp_schema = ret
-                if id(tmp_instance) != id(instance):
-                    new_instance = tmp_instance
-                if k == '$ref':
-                    new_schema.update(tmp_schema)
-                else:
-                    new_schema[k] = tmp_schema
-            return new_instance, new_schema
+                if self._profiler is not None:
+                    check = self._profiler.wrap(self, schema, k, check)
+                if isinstance(check, dict):
+                    for category, c in check.items():
+                        checks[category].append(c)
+                    continue
+                applies_to = getattr(validator, 'applies_to', None)
+                for category, category_checks in checks.items():
+                    if applies_to is None or category in applies_to:
+                        category_checks.append(check)
+            if schema.get('nullable', False):
+                checks['null'] = []
         finally:
             if scope:
                 self.resolver.pop_scope()
+        return _build_node(checks)
 
-    def _descend(self, instance, schema, errors, path=None, schema_path=None):
-        err_off = len(errors)
-        ret = self._validate(instance, schema, errors)
-        for error in errors[err_off:]:
-            if path is not None:
-                error.path.appendleft(path)
-            if schema_path is not None:
-                error.schema_path.appendleft(schema_path)
-        return ret
+    def _unknown_type(self, typ, schema):
+        return UnknownTypeError(typ, None, schema)
+
+    def validate(self, instance, max_errors=None, **kwargs):
+        result = self.validate_result(instance, max_errors=max_errors)
+        if result.errors:
+            raise ValidationErrors(result.errors)
+        return result.instance, self._schema
 
-    def validate(self, instance, **kwargs):
-        errors = []
-        new, schema = self._validate(instance, self._schema, errors, **kwargs)
-        if errors:
-            raise ValidationErrors(errors)
-        return new, schema
+    def validate_result(self, instance, max_errors=None):
+        # max_errors 個のエラーが見つかった時点で検証を打ち切る (None: 無制限)
+        errors = _utils.ErrorList(limit=max_errors)
+        new = instance
+        if self._check is not None:
+            try:
+                new = self._check(instance, errors)
+            except _utils.BudgetExhausted:
+                new = instance
+        return ValidationResult(new, list(errors))
 
     def is_valid(self, instance, **kwargs):
         try:
-            self.validate(instance)
-            return True
+            return self.validate_result(instance, max_errors=1).valid
         except NotImplementedError:
             raise
         except Exception:
@@ -97,55 +199,276 @@ class _Validator(object):
             return False
         return isinstance(instance, pytype)
 
-    def _is_nullable_and_skip_validation(self, instance, schema):
-        if instance is not None:
-            return False
-        return schema.get('nullable', False)
+
+class ValidationResult(object):
+    __slots__ = ('instance', 'errors')
+
+    def __init__(self, instance, errors):
+        self.instance = instance
+        self.errors = errors
+
+    def __bool__(self):
+        return not self.errors
+
+    @property
+    def valid(self):
+        return not self.errors
+
+    def raise_for_errors(self):
+        if self.errors:
+            raise ValidationErrors(self.errors)
+        return self.instance
+
+
+def _reviving(reviver, schema, check):
+    # 検証と同じ走査の中で reviver を適用する。子要素はそれぞれのノードで
+    # 適用されるので、UNDEFINED となった子要素はここで取り除く
+    def _revive(instance, errors):
+        value = reviver(instance, schema)
+        if value is _utils.UNDEFINED or check is None:
+            return value
+        ret = check(value, errors)
+        if ret is not value:
+            ret = _utils.strip_undefined(ret)
+        return ret
+    _revive.transforms = True
+    return _revive
+
+
+def _merge_changes(instance, new_instance, other):
+    # 複数のキーワード(properties と additionalProperties など)がそれぞれ
+    # 変換したコピーを返した場合、other で変化した要素を new_instance に反映する
+    if isinstance(instance, dict):
+        if isinstance(new_instance, dict) and isinstance(other, dict):
+            for k, v in other.items():
+                if k not in instance or v is not instance[k]:
+                    new_instance[k] = v
+            return new_instance
+    elif isinstance(instance, list):
+        if (isinstance(new_instance, list) and isinstance(other, list) and
+                len(new_instance) == len(other) == len(instance)):
+            for i, v in enumerate(other):
+                if v is not instance[i]:
+                    new_instance[i] = v
+            return new_instance
+    return other
+
+
+def _build_node(checks):
+    checks = {category: tuple(c) for category, c in checks.items()}
+    transforming = any(
+        _validators.transforms(c) for cs in checks.values() for c in cs)
+    unique = set(checks.values())
+    if len(unique) == 1:
+        common = unique.pop()
+        if not common:
+            return None
+        if len(common) == 1:
+            return common[0]
+
+        if not transforming:
+            def _check_node_any(instance, errors):
+                for check in common:
+                    check(instance, errors)
+                return instance
+            return _check_node_any
+
+        def _node_any(instance, errors):
+            new_instance = instance
+            for check in common:
+                ret = check(instance, errors)
+                if ret is not instance:
+                    if new_instance is instance:
+                        new_instance = ret
+                    else:
+                        new_instance = _merge_changes(
+                            instance, new_instance, ret)
+            return new_instance
+        _node_any.transforms = True
+        return _node_any
+
+    by_class = {}
+    for cls, category in list(_CATEGORY_OF_CLASS.items()):
+        by_class[cls] = checks[category]
+
+    if not transforming:
+        def _check_node(instance, errors):
+            cls = instance.__class__
+            category_checks = by_class.get(cls)
+            if category_checks is None:
+                category_checks = by_class[cls] = checks[_category_of(cls)]
+            for check in category_checks:
+                check(instance, errors)
+            return instance
+        return _check_node
+
+    def _node(instance, errors):
+        cls = instance.__class__
+        category_checks = by_class.get(cls)
+        if category_checks is None:
+            category_checks = by_class[cls] = checks[_category_of(cls)]
+        new_instance = instance
+        for check in category_checks:
+            ret = check(instance, errors)
+            if ret is not instance:
+                if new_instance is instance:
+                    new_instance = ret
+                else:
+                    new_instance = _merge_changes(instance, new_instance, ret)
+        return new_instance
+    _node.transforms = True
+    return _node
+
+
+_DRAFT4_VALIDATORS = {
+    '$ref': _validators.ref,
+    'type': _validators.type,
+    'items': _validators.items,
+    'properties': _validators.properties,
+    'required': _validators.required,
+    'format': _validators.format,
+    'oneOf': _validators.oneOf,
+    'additionalItems': _validators.additionalItems,
+    'additionalProperties': _validators.additionalProperties,
+    'allOf': _validators.allOf,
+    'anyOf': _validators.anyOf,
+    'minItems': _validators.minItems,
+    'maxItems': _validators.maxItems,
+    'minProperties': _validators.minProperties,
+    'maxProperties': _validators.maxProperties,
+    'minLength': _validators.minLength,
+    'maxLength': _validators.maxLength,
+    'minimum': _validators.minimum,
+    'maximum': _validators.maximum,
+    'enum': _validators.enum,
+    'uniqueItems': _validators.uniqueItems,
+    'not': _validators.not_,
+    'dependencies': _validators.dependencies,
+    'multipleOf': _validators.multipleOf,
+    'pattern': _validators.pattern,
+    'patternProperties': _validators.patternProperties,
+}
 
 
 class Draft4(_Validator):
+    _default_format_checker = formats.Draft4()
+
     def __init__(self, schema, format_checker=None, **kwargs):
         if format_checker is None:
-            format_checker = formats.Draft4()
-        super().__init__({
-            '$ref': _validators.ref,
-            'type': _validators.type,
-            'items': _validators.items,
-            'properties': _validators.properties,
-            'required': _validators.required,
-            'format': _validators.format,
-            'oneOf': _validators.oneOf,
-            'additionalItems': _validators.additionalItems,
-            'additionalProperties': _validators.additionalProperties,
-            'allOf': _validators.allOf,
-            'anyOf': _validators.anyOf,
-            'minItems': _validators.minItems,
-            'maxItems': _validators.maxItems,
-            'minProperties': _validators.minProperties,
-            'maxProperties': _validators.maxProperties,
-            'minLength': _validators.minLength,
-            'maxLength': _validators.maxLength,
-            'minimum': _validators.minimum,
-            'maximum': _validators.maximum,
-            'enum': _validators.enum,
-            'uniqueItems': _validators.uniqueItems,
-            'not': _validators.not_,
-            'dependencies': _validators.dependencies,
-            'multipleOf': _validators.multipleOf,
-            'pattern': _validators.pattern,
-            'patternProperties': _validators.patternProperties,
-        }, format_checker, schema, **kwargs)
+            format_checker = self._default_format_checker
+        super().__init__(
+            _DRAFT4_VALIDATORS, format_checker, schema, **kwargs)
 
 
 class Draft5(Draft4):
-    def __init__(self, schema, format_checker=None, **kwargs):
-        if format_checker is None:
-            format_checker = formats.Draft5()
-        super().__init__(schema, format_checker=format_checker, **kwargs)
+    _default_format_checker = formats.Draft5()
 
 
 class OAS3(Draft5):
-    def __init__(self, schema, format_checker=None, **kwargs):
-        if format_checker is None:
-            format_checker = formats.OAS3()
-        super().__init__(schema, format_checker=format_checker, **kwargs)
+    _default_format_checker = formats.OAS3()
+
+
+class OAS3Native(OAS3):
+    # シリアライズ前のビューの戻り値など、format で変換済みの値を検証する
+    # 文字列を変換した場合と同じ規則にする (date-time はタイムゾーン必須、
+    # date は datetime を含まない)
+    _native_formats = {
+        'date-time': lambda v: (
+            isinstance(v, datetime.datetime) and v.utcoffset() is not None),
+        'date': lambda v: (
+            isinstance(v, datetime.date) and
+            not isinstance(v, datetime.datetime)),
+        'byte': lambda v: isinstance(v, bytes),
+        'binary': lambda v: isinstance(v, bytes),
+        'ipv4': lambda v: isinstance(v, IPv4Address),
+        'ipv6': lambda v: isinstance(v, IPv6Address),
+    }
+
+
+class StructureKeys(object):
+    # 構造が同じスキーマノードに同じ番号を割り当てる (hash-consing)。
+    # キーの順序も構造に含める。循環を含むノードは None (同一性でのみ共有する)
+    def __init__(self):
+        self._keys = {}  # id(node) -> (node, 番号)
+        self._table = {}  # (種類, 子の番号/値のタプル) -> 番号
+        self._visiting = set()
+
+    def __call__(self, node):
+        entry = self._keys.get(id(node))
+        if entry is not None:
+            return entry[1]
+        if id(node) in self._visiting:
+            return None
+        self._visiting.add(id(node))
+        try:
+            if isinstance(node, dict):
+                parts = tuple(
+                    (k, self._part(v)) for k, v in node.items())
+                cyclic = any(p is None for _, p in parts)
+            else:
+                parts = tuple(self._part(v) for v in node)
+                cyclic = None in parts
+        finally:
+            self._visiting.discard(id(node))
+        number = None
+        if not cyclic:
+            shape = (node.__class__.__name__, parts)
+            number = self._table.setdefault(shape, len(self._table))
+        self._keys[id(node)] = (node, number)
+        return number
+
+    def _part(self, value):
+        if isinstance(value, (dict, list)):
+            number = self(value)
+            return None if number is None else ('n', number)
+        return (value.__class__, value)
+
+    def __len__(self):
+        return len(self._table)
+
+
+class StructuralDedup(object):
+    # ValidatorCache ごとの (構造の番号, スコープ) -> コンパイル結果
+    def __init__(self, keys):
+        self._keys = keys
+        self.checks = {}
+        self.compiled = 0
+        self.deduplicated = 0
+
+    def key(self, schema, scope):
+        number = self._keys(schema)
+        return None if number is None else (number, scope)
+
+
+class ValidatorCache(object):
+    def __init__(self, cls, precompiled=None, structure_keys=None, **kwargs):
+        self._cls = cls
+        self._kwargs = kwargs
+        self._validators = {}
+        # resolver が共通の場合のみコンパイル結果を共有できる
+        self._compiled = {} if kwargs.get('resolver') else None
+        if precompiled and self._compiled is not None:
+            # codegen で生成した関数をコンパイル済みのノードとして利用する
+            self._compiled.update(precompiled)
+        # reviver/profiler はノードの同一性に依存するので構造では共有しない
+        self.dedup = None
+        if (structure_keys is not None and self._compiled is not None and
+                kwargs.get('reviver') is None and
+                kwargs.get('profiler') is None):
+            self.dedup = StructuralDedup(structure_keys)
+            kwargs['dedup'] = self.dedup
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, schema):
+        entry = self._validators.get(id(schema))
+        if entry is not None:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        validator = self._cls(schema, compiled=self._compiled, **self._kwargs)
+        self._validators[id(schema)] = (schema, validator)
+        return validator
+
+    def __len__(self):
+        return len(self._validators)
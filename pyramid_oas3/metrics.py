@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+from bisect import bisect_left
+import threading
+from time import perf_counter
+import tracemalloc
+
+from pyramid.response import Response
+
+from pyramid_oas3.interfaces import IStageMetrics
+
+
+STAGES = (
+    'route', 'query', 'params', 'body_decode', 'body_validate', 'body_stream',
+    'handler', 'response')
+# ヒストグラムのバケットの上限値(秒)
+BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram(object):
+    # 各バケットの件数(累積ではない)と合計値のみを保持する。
+    # GIL 下での加算なので、並行に更新されても件数が多少ずれる程度
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class StageMetrics(object):
+    # (オペレーション, ステージ) ごとの処理時間のヒストグラム
+    def __init__(self):
+        self.histograms = {}
+
+    def observe(self, operation, stage, seconds):
+        key = (operation, stage)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms.setdefault(key, Histogram())
+        histogram.observe(seconds)
+
+    def prometheus_text(self, name='pyramid_oas3_stage_seconds'):
+        lines = [
+            '# HELP {} Time spent in each pyramid_oas3 stage.'.format(name),
+            '# TYPE {} histogram'.format(name)]
+        for (operation, stage), h in sorted(self.histograms.items()):
+            labels = 'operation="{}",stage="{}"'.format(
+                _escape(operation), stage)
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), h.counts):
+                cumulative += count
+                lines.append('{}_bucket{{{},le="{}"}} {}'.format(
+                    name, labels, bound, cumulative))
+            lines.append('{}_sum{{{}}} {}'.format(name, labels, h.sum))
+            lines.append('{}_count{{{}}} {}'.format(name, labels, h.count))
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Instrumentation(object):
+    # 各ステージの開始/終了を metrics と hooks に通知する。
+    # hooks は on_stage_start(request, operation, stage) と
+    # on_stage_end(request, operation, stage, seconds) を持つオブジェクト。
+    # 無効な場合は OAS3Context.instrumentation が None になり何も呼ばれない
+    def __init__(self, metrics=None, hooks=()):
+        self.metrics = metrics
+        self.hooks = tuple(hooks)
+
+    # start を呼ぶ前 (オペレーションが決まる前) から計測する場合に利用する
+    clock = staticmethod(perf_counter)
+
+    def start(self, request, operation, stage):
+        for hook in self.hooks:
+            hook.on_stage_start(request, operation, stage)
+        return perf_counter()
+
+    def record(self, request, operation, stage, started):
+        # clock() で得た時刻からのステージとして、start と end を続けて通知する。
+        # OpenAPI のオペレーションに該当しないリクエストでは何も通知しない
+        for hook in self.hooks:
+            hook.on_stage_start(request, operation, stage)
+        self.end(request, operation, stage, started)
+
+    def end(self, request, operation, stage, started):
+        elapsed = perf_counter() - started
+        if self.metrics is not None:
+            self.metrics.observe(operation, stage, elapsed)
+        for hook in self.hooks:
+            hook.on_stage_end(request, operation, stage, elapsed)
+
+
+class AllocationTracker(object):
+    # instrumentation hook としてステージごとのメモリ確保量を tracemalloc で計測する。
+    # allocated はステージ終了時点で増加していたバイト数、peak はステージ中の
+    # ピーク時の増加量 (入れ子のステージの分も含む)。tracemalloc はプロセス全体で計測するので、
+    # 正確な値を得るには単一スレッドのワーカーで計測する。
+    # reset_peak が無い環境 (Python 3.9 未満) では peak は allocated と同じ値になる
+    def __init__(self):
+        self.stats = {}  # (operation, stage) -> [count, allocated, peak]
+        self._local = threading.local()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def on_stage_start(self, request, operation, stage):
+        # ステージは入れ子になりうる (renderer_validation の response は
+        # handler の中で実行される) ので、スレッドごとにスタックで管理する。
+        # ピークをリセットする前に、外側のステージのそれまでのピークを退避する
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1][2] = max(stack[-1][2], peak)
+        reset_peak = getattr(tracemalloc, 'reset_peak', None)
+        if reset_peak is not None:
+            reset_peak()
+        stack.append([stage, current, current])
+
+    def on_stage_end(self, request, operation, stage, seconds):
+        stack = getattr(self._local, 'stack', None)
+        if not stack or all(entry[0] != stage for entry in stack):
+            return
+        entry = stack.pop()
+        while entry[0] != stage:
+            entry = stack.pop()
+        _, started, saved_peak = entry
+        current, peak = tracemalloc.get_traced_memory()
+        if getattr(tracemalloc, 'reset_peak', None) is None:
+            peak = current
+        allocated = current - started
+        peak = max(allocated, max(peak, saved_peak) - started)
+        stat = self.stats.get((operation, stage))
+        if stat is None:
+            stat = self.stats.setdefault((operation, stage), [0, 0, 0])
+        stat[0] += 1
+        stat[1] += allocated
+        stat[2] = max(stat[2], peak)
+
+    def top(self, limit=None, key='peak'):
+        # (operation, stage, count, allocated, peak) を key の降順で返す
+        index = ('count', 'allocated', 'peak').index(key)
+        entries = sorted(
+            ((operation, stage) + tuple(stat)
+             for (operation, stage), stat in self.stats.items()),
+            key=lambda e: e[2 + index], reverse=True)
+        return entries[:limit]
+
+    def report(self, limit=20, key='peak'):
+        lines = ['{:>10} {:>14} {:>14}  {}'.format(
+            'count', 'allocated(B)', 'peak(B)', 'operation/stage')]
+        for operation, stage, count, allocated, peak in self.top(limit, key):
+            lines.append('{:>10} {:>14} {:>14}  {} {}'.format(
+                count, allocated, peak, operation, stage))
+        return '\n'.join(lines)
+
+    def reset(self):
+        self.stats.clear()
+
+
+def metrics_view(request):
+    # pyramid_oas3.metrics_path に登録する Prometheus 形式の出力
+    metrics = request.registry.queryUtility(IStageMetrics)
+    text = metrics.prometheus_text() if metrics is not None else ''
+    return Response(
+        text, content_type='text/plain; version=0.0.4', charset='utf-8')
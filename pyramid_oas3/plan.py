@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+from pyramid_oas3.resolve import dereference
+from pyramid_oas3.stream import JSONArrayDecoder, NDJSONDecoder
+from pyramid_oas3.types import _compile_style, _compile_type
+
+
+MIME_JSON = 'application/json'
+# レコードごとに検証する改行区切りのJSONのメディアタイプ
+MIME_LINE_DELIMITED = frozenset([
+    'application/x-ndjson', 'application/jsonl', 'application/x-jsonlines',
+    'application/jsonlines'])
+METHODS = ('get', 'put', 'post', 'delete', 'options', 'head', 'patch', 'trace')
+X_CHECK_ONLY = 'x-pyramid-oas3-check-only'
+X_MAX_ERRORS = 'x-pyramid-oas3-max-errors'
+X_STREAM = 'x-pyramid-oas3-stream'
+X_RESPONSE_SAMPLE_RATE = 'x-pyramid-oas3-response-sample-rate'
+# ストリーミング検証で扱える配列スキーマのキーワード
+STREAM_KEYWORDS = frozenset([
+    'type', 'items', 'minItems', 'maxItems', 'title', 'description',
+    'example', 'externalDocs', 'deprecated', 'readOnly', 'writeOnly', 'xml'])
+
+
+class OperationPlan(object):
+    def __init__(self, op_obj, parameters, request_body, security,
+                 max_errors=None, response_sampler=None, name=None):
+        self.op_obj = op_obj
+        # 計測などで利用するオペレーション名 (operationId または "METHOD path")
+        self.name = name or op_obj.get('operationId')
+        self.parameters = parameters
+        self.request_body = request_body
+        self.security = security
+        # 検証を打ち切るまでのエラー数 (None: 無制限)
+        self.max_errors = max_errors
+        # レスポンスを検証するかを決める ResponseSampler (None: 常に検証)
+        self.response_sampler = response_sampler
+
+
+class ParameterPlan(object):
+    def __init__(self, in_, name, required, unsupported=False,
+                 deep_object=False, keep_list=False, default=None,
+                 has_default=False, decoders=(), validator=None):
+        self.in_ = in_
+        self.name = name
+        self.required = required
+        self.unsupported = unsupported
+        self.deep_object = deep_object
+        self.deep_object_prefix = name + '['
+        self.keep_list = keep_list
+        self.default = default
+        self.has_default = has_default
+        # (type, style_converter, type_converter) のリスト
+        self.decoders = decoders
+        self.validator = validator
+
+
+class RequestBodyPlan(object):
+    def __init__(self, required, media_types, accepts_json, json_validator,
+                 stream=None, line_streams=None):
+        self.required = required
+        self.media_types = media_types
+        self.accepts_json = accepts_json
+        self.json_validator = json_validator
+        self.stream = stream
+        # メディアタイプ -> 改行区切りJSONの StreamPlan
+        self.line_streams = line_streams or {}
+
+
+class StreamPlan(object):
+    def __init__(self, decoder_factory, item_validator, min_items=0,
+                 max_items=None, lazy=False, item_schema_path=None):
+        self.decoder_factory = decoder_factory
+        self.item_validator = item_validator
+        self.item_schema_path = item_schema_path
+        self.min_items = min_items
+        self.max_items = max_items
+        # True: ビューへ検証済み要素のイテレータを渡す
+        self.lazy = lazy
+
+
+def compile_operations(schema, Validator, resolver, fill_by_default,
+                       CheckValidator=None, check_only=False,
+                       max_errors=None, sampler_factory=None,
+                       dereferenced=False):
+    default_security = schema.get('security', None)
+    plans = {}
+    for path, path_item in schema['paths'].items():
+        for method, op_obj in path_item.items():
+            if method not in METHODS:
+                continue
+            # 検証のみ(変換なし)モードはオペレーション単位で上書きできる
+            V = Validator
+            if (CheckValidator is not None and
+                    op_obj.get(X_CHECK_ONLY, check_only)):
+                V = CheckValidator
+            plan = plans[(path, method)] = compile_operation(
+                op_obj, V, resolver, default_security, fill_by_default,
+                op_obj.get(X_MAX_ERRORS, max_errors), dereferenced)
+            if plan.name is None:
+                plan.name = '{} {}'.format(method.upper(), path)
+            if sampler_factory is not None:
+                # sampler_factory(rate) の rate が None の場合は全体の設定を使う。
+                # YAML などで文字列として書かれた値も受け付ける
+                rate = op_obj.get(X_RESPONSE_SAMPLE_RATE)
+                plan.response_sampler = sampler_factory(
+                    None if rate is None else float(rate))
+    return plans
+
+
+def compile_operation(
+        op_obj, Validator, resolver, default_security, fill_by_default,
+        max_errors=None, dereferenced=False):
+    # 検証を簡単にするためにパラメータの $ref をすべて解決する。
+    # 解決済みの定義 (dereferenced=True) ではスキーマのノードを複製せずに使う
+    params = op_obj.get('parameters')
+    if params and not dereferenced:
+        params = dereference(params, resolver)
+    return OperationPlan(
+        op_obj,
+        [compile_parameter(param_obj, Validator, fill_by_default)
+         for param_obj in params or []],
+        compile_request_body(
+            op_obj.get('requestBody'), Validator, resolver,
+            op_obj.get(X_STREAM, False)),
+        op_obj.get('security', default_security),
+        int(max_errors) if max_errors else None)
+
+
+def compile_parameter(param_obj, Validator, fill_by_default):
+    in_, name, schema = (
+        param_obj['in'], param_obj['name'], param_obj.get('schema'))
+    required = param_obj.get('required', False)
+    try:
+        typ, type_tries = _parameter_types(schema)
+    except NotImplementedError:
+        # 未対応のパラメータはリクエスト時に NotImplementedError とする
+        return ParameterPlan(in_, name, required, unsupported=True)
+    style = param_obj.get(
+        'style', 'form' if in_ in ('query', 'cookie') else 'simple')
+    explode = param_obj.get('explode', True if style == 'form' else False)
+    if (param_obj.get('allowEmptyValue', False) or
+            in_ == 'cookie' or
+            style in ('matrix', 'label', 'spaceDelimited', 'pipeDelimited') or
+            (in_ == 'query' and style == 'form' and typ == 'object' and
+             explode)):
+        return ParameterPlan(in_, name, required, unsupported=True)
+
+    decoders = [
+        (t, _compile_style(style, explode, t),
+         _compile_type(schema, default_type=t) if schema else None)
+        for t in type_tries]
+    return ParameterPlan(
+        in_, name, required,
+        deep_object=(in_ == 'query' and style == 'deepObject'),
+        keep_list=(style == 'form' and explode and typ == 'array'),
+        default=schema.get('default') if schema else None,
+        has_default=bool(
+            in_ == 'query' and schema and fill_by_default and
+            'default' in schema),
+        decoders=decoders,
+        validator=Validator(schema) if schema else None)
+
+
+def _parameter_types(schema):
+    type_tries = []
+    if not schema:
+        typ = 'object'
+    elif 'type' in schema:
+        typ = schema['type']
+    else:
+        # QUICKHACK(kazuki): プリミティブ型のoneOf/anyOfのみ許容する
+        def _check_subschemas(s):
+            st = s.get('type')
+            if st is not None:
+                if st in ('integer', 'number', 'string', 'boolean'):
+                    if st not in type_tries:
+                        type_tries.append(st)
+                    return st
+                raise NotImplementedError
+            ss_list = s.get('oneOf', s.get('anyOf'))
+            if not ss_list:
+                raise NotImplementedError
+            for ss in ss_list:
+                t = _check_subschemas(ss)
+            return t
+        typ = _check_subschemas(schema)
+        if typ is None:
+            raise NotImplementedError
+    if not type_tries:
+        type_tries.append(typ)
+    return typ, type_tries
+
+
+def compile_request_body(reqbody, Validator, resolver, stream=False):
+    if not reqbody:
+        return None
+    if '$ref' in reqbody:
+        _, reqbody = resolver.resolve(reqbody['$ref'])
+    content = reqbody.get('content', {})
+    json_validator = stream_plan = None
+    media_type_obj = content.get(MIME_JSON)
+    if media_type_obj is not None:
+        json_schema = media_type_obj.get('schema')
+        if stream:
+            stream_plan = compile_stream(
+                json_schema, Validator, resolver, lazy=(stream == 'iterator'))
+        elif json_schema:
+            json_validator = Validator(json_schema)
+    line_streams = {
+        media_type: compile_line_stream(
+            (content[media_type] or {}).get('schema'), Validator)
+        for media_type in MIME_LINE_DELIMITED.intersection(content.keys())}
+    return RequestBodyPlan(
+        reqbody.get('required', False), set(content.keys()),
+        media_type_obj is not None, json_validator, stream_plan,
+        line_streams)
+
+
+def compile_stream(schema, Validator, resolver, lazy=False):
+    # トップレベルの配列を要素ごとに検証するプランを作成する。
+    # 配列全体を必要とするキーワード (uniqueItems など) は扱えない
+    schema = schema or {}
+    while '$ref' in schema:
+        _, schema = resolver.resolve(schema['$ref'])
+    unsupported = set(schema.keys()) - STREAM_KEYWORDS
+    items = schema.get('items', {})
+    if (schema.get('type', 'array') != 'array' or unsupported or
+            not isinstance(items, dict)):
+        raise ValueError(
+            '{} requires a plain array schema (unsupported: {})'.format(
+                X_STREAM, ', '.join(sorted(unsupported)) or 'type/items'))
+    return StreamPlan(
+        JSONArrayDecoder, Validator(items) if items else None,
+        schema.get('minItems', 0), schema.get('maxItems'), lazy, 'items')
+
+
+def compile_line_stream(schema, Validator):
+    # 改行区切りのJSONでは schema を各レコードに適用する
+    return StreamPlan(
+        NDJSONDecoder, Validator(schema) if schema else None, lazy=True)
@@ -1,16 +1,93 @@
+import warnings
+
+from pyramid_oas3.jsonschema._resolvers import _urldefrag
+
+
+def dereference(node, resolver):
+    # node 以下の $ref を参照先のノードに置き換えた複製を返す (node は変更しない)。
+    # 同じノードへの参照は同じオブジェクトを共有し、再帰的なスキーマは
+    # 循環したグラフになる。解決できない(外部の) $ref はそのまま残す
+    return _Dereferencer(resolver).copy(node)
+
+
 def resolve_refs(node, resolver):
-    if isinstance(node, list):
-        for v in node:
-            resolve_refs(v, resolver)
+    # 互換のために残す。以前と同じく node 自体の $ref をその場で解決する
+    warnings.warn(
+        'resolve_refs is deprecated, use dereference instead',
+        DeprecationWarning, stacklevel=2)
+    _update(node, dereference(node, resolver), set())
+
+
+def _update(node, resolved, seen):
+    # 元の dict/list を置き換えずに、$ref を持つ dict のみ参照先の内容で更新する
+    if id(node) in seen:
         return
-    if not isinstance(node, dict):
+    seen.add(id(node))
+    if isinstance(node, dict):
+        if isinstance(node.get('$ref'), str):
+            node.clear()
+            node.update(resolved)
+            return
+        items = node.items()
+    elif isinstance(node, list):
+        items = enumerate(node)
+    else:
         return
-    ref_url = node.get('$ref', None)
-    if ref_url is not None:
-        node.clear()
-        _, fragment = resolver.resolve(ref_url)
-        resolve_refs(fragment, resolver)
-        node.update(fragment)
-        return
-    for v in node.values():
-        resolve_refs(v, resolver)
+    for k, v in items:
+        _update(v, resolved[k], seen)
+
+
+class _Dereferencer(object):
+    def __init__(self, resolver):
+        self._resolver = resolver
+        self._copies = {}
+        self._resolving = set()
+
+    def copy(self, node):
+        if not isinstance(node, (dict, list)):
+            return node
+        key = (id(node), self._resolver.resolution_scope)
+        copied = self._copies.get(key)
+        if copied is not None:
+            return copied[1]
+        ref = node.get('$ref') if isinstance(node, dict) else None
+        if isinstance(ref, str):
+            return self._copy_ref(node, key, ref)
+        if isinstance(node, list):
+            copied = []
+            self._copies[key] = (node, copied)
+            copied.extend(self.copy(v) for v in node)
+            return copied
+        copied = {}
+        # 子ノードより先に登録して循環を検出する
+        self._copies[key] = (node, copied)
+        scope = node.get('id')
+        if isinstance(scope, str) and scope:
+            self._resolver.push_scope(scope)
+        try:
+            for k, v in node.items():
+                copied[k] = self.copy(v)
+        finally:
+            if isinstance(scope, str) and scope:
+                self._resolver.pop_scope()
+        return copied
+
+    def _copy_ref(self, node, key, ref):
+        if key in self._resolving:
+            raise ValueError('circular $ref: {}'.format(ref))
+        try:
+            url, target = self._resolver.resolve(ref)
+        except (NotImplementedError, RuntimeError):
+            copied = dict(node)
+            self._copies[key] = (node, copied)
+            return copied
+        self._resolving.add(key)
+        # フラグメントを除いたスコープで辿り、参照元によらず同じ複製を共有する
+        self._resolver.push_scope(_urldefrag(url)[0])
+        try:
+            copied = self.copy(target)
+        finally:
+            self._resolver.pop_scope()
+            self._resolving.discard(key)
+        self._copies[key] = (node, copied)
+        return copied
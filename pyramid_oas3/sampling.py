@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+
+class ResponseSampler(object):
+    # オペレーション単位でレスポンスを検証するかを決める。
+    # 乱数ではなく累積値で判定するので、検証の割合(CPUコスト)が一定になる。
+    # 複数スレッドから更新されても割合が多少ずれるだけなのでロックしない
+    def __init__(self, rate=1.0, adaptive=0, min_rate=0.01):
+        self.base_rate = self.rate = float(rate)
+        # adaptive 回連続で成功するごとに割合を半分にする (0: 固定)
+        self.adaptive = int(adaptive)
+        self.min_rate = min(float(min_rate), self.rate)
+        # 割合が 0 でなければ最初のレスポンスは必ず検証する
+        self._credit = 1.0 - self.rate if self.rate > 0 else 0.0
+        self._streak = 0
+
+    def should_validate(self):
+        credit = self._credit + self.rate
+        if credit < 1.0:
+            self._credit = credit
+            return False
+        self._credit = credit - 1.0
+        return True
+
+    def record(self, ok):
+        if not self.adaptive:
+            return
+        if not ok:
+            # 失敗したら元の割合に戻す
+            self._streak = 0
+            self.rate = self.base_rate
+            return
+        self._streak += 1
+        if self._streak >= self.adaptive:
+            self._streak = 0
+            self.rate = max(self.min_rate, self.rate / 2)
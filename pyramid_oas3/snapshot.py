@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# 参照を解決済みの OpenAPI 定義をファイルに保存し、起動時に再利用する
+import hashlib
+import json
+import os
+import pickle
+import stat
+import tempfile
+
+from pyramid_oas3.jsonschema import Resolver
+from pyramid_oas3.resolve import dereference
+
+
+# 保存形式を変更した場合は更新する (キャッシュのキーに含まれる)
+SNAPSHOT_VERSION = 1
+
+
+def load_spec(schema=None, path=None, cache_dir=None):
+    # 参照を解決済みの定義を返す。schema (dict) か path (YAML/JSON) を指定する。
+    # cache_dir を指定すると定義のハッシュをキーとして解決結果を保存し、
+    # 次回以降は定義のパースと参照の解決を行わずにそれを読み込む
+    data = None
+    if schema is None:
+        with open(path, 'rb') as f:
+            data = f.read()
+    key = None
+    if cache_dir:
+        key = spec_hash(data if data is not None else _fingerprint(
+            schema).encode('utf-8'))
+        spec = load_snapshot(cache_dir, key)
+        if spec is not None:
+            return spec
+    if schema is None:
+        schema = _parse(path, data)
+    spec = dereference(schema, Resolver('', schema))
+    if key is not None:
+        save_snapshot(cache_dir, key, spec)
+    return spec
+
+
+def spec_hash(data):
+    h = hashlib.sha256('{}:'.format(SNAPSHOT_VERSION).encode('ascii'))
+    h.update(data)
+    return h.hexdigest()
+
+
+def _fingerprint(node):
+    # 辞書で指定された定義のキャッシュのキー。YAML の date と同じ内容の文字列など、
+    # 型が異なる値を区別するために repr を利用する (キーの順序には依存しない)
+    if isinstance(node, dict):
+        return '{' + ','.join(sorted(
+            _fingerprint(k) + ':' + _fingerprint(v)
+            for k, v in node.items())) + '}'
+    if isinstance(node, list):
+        return '[' + ','.join(_fingerprint(v) for v in node) + ']'
+    return repr(node)
+
+
+def snapshot_path(cache_dir, key):
+    return os.path.join(cache_dir, 'pyramid_oas3-{}.pickle'.format(key))
+
+
+def load_snapshot(cache_dir, key):
+    # 存在しない・読み込めない場合は None。pickle は読み込み時に任意のコードを
+    # 実行できるので、自分以外が書き込めるファイルは読み込まない
+    try:
+        with open(snapshot_path(cache_dir, key), 'rb') as f:
+            if not _is_trusted(os.fstat(f.fileno())):
+                return None
+            return pickle.load(f)
+    except Exception:
+        return None
+
+
+def _is_trusted(st):
+    # 現在のユーザーが所有し、グループ・他のユーザーが書き込めないファイルのみ
+    if st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        return False
+    return not hasattr(os, 'getuid') or st.st_uid == os.getuid()
+
+
+def save_snapshot(cache_dir, key, spec):
+    # 複数のワーカーが同時に書き込んでも壊れないように rename で置き換える
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(spec, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, snapshot_path(cache_dir, key))
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _parse(path, data):
+    if path.endswith('.json'):
+        return json.loads(data.decode('utf-8'))
+    import yaml
+    return yaml.safe_load(data)
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+import codecs
+import json
+
+from pyramid_oas3.jsonschema.exceptions import (
+    ValidationError, ValidationErrors)
+
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = ' \t\r\n'
+_NUMBER_CHARS = frozenset('0123456789.eE+-')
+# JSONDecodeError の位置がバッファ末尾からこの範囲内なら入力途中とみなす
+# ("\uXXXX" の途中で切れた場合を含む)
+_INCOMPLETE_MARGIN = 6
+
+
+class JSONArrayDecoder(object):
+    # トップレベルの配列をチャンク単位で受け取り、要素を順に取り出す。
+    # バッファには未処理のチャンクと処理中の要素のみを保持する。
+    # 要素の終端を知る必要があるので loads は利用せず raw_decode を使う
+    def __init__(self, loads=None):
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._buf = ''
+        self._state = 'start'  # start -> first -> value/sep -> end
+        self._retry_size = 0
+
+    def feed(self, data):
+        self._buf += self._text.decode(data)
+        return self._drain(False)
+
+    def close(self):
+        self._buf += self._text.decode(b'', True)
+        items = self._drain(True)
+        if self._state != 'end':
+            raise ValueError('unexpected end of json array')
+        return items
+
+    def _drain(self, final):
+        buf, pos, items = self._buf, 0, []
+        if not final and len(buf) < self._retry_size:
+            return items
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos == len(buf):
+                break
+            state, c = self._state, buf[pos]
+            if state == 'start':
+                if c != '[':
+                    raise NotAnArray
+                self._state = 'first'
+                pos += 1
+            elif state == 'end':
+                raise ValueError('extra data after json array')
+            elif c == ']' and state != 'value':
+                self._state = 'end'
+                pos += 1
+            elif state == 'sep':
+                if c != ',':
+                    raise ValueError("expecting ',' delimiter")
+                self._state = 'value'
+                pos += 1
+            else:
+                item, end = self._decode(buf, pos, final)
+                if end is None:
+                    break
+                items.append(item)
+                self._state = 'sep'
+                pos = end
+        self._buf = buf[pos:]
+        self._retry_size = len(self._buf) * 2 if pos == 0 else 0
+        return items
+
+    def _decode(self, buf, pos, final):
+        try:
+            item, end = self._decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError as e:
+            if final or not (
+                    e.msg.startswith('Unterminated string') or
+                    e.pos >= len(buf) - _INCOMPLETE_MARGIN):
+                # バッファ内の位置は入力全体の位置と一致しないので含めない
+                raise ValueError(e.msg)
+            return None, None
+        # 数値はチャンク境界で分割されている可能性がある
+        if (not final and isinstance(item, (int, float)) and
+                all(c in _NUMBER_CHARS for c in buf[end:])):
+            return None, None
+        return item, end
+
+
+class NotAnArray(ValueError):
+    pass
+
+
+class NDJSONDecoder(object):
+    # 改行区切りのJSON (NDJSON/JSON Lines) を1行1レコードとして取り出す。
+    # 空行 (空白のみの行を含む) は読み飛ばす。エラーメッセージのレコード番号は
+    # 検証エラーの path と同じく空行を除いた0始まりの番号
+    def __init__(self, loads=json.loads):
+        self._loads = loads
+        self._pending = []
+        self._count = 0
+
+    def feed(self, data):
+        lines = data.split(b'\n')
+        if len(lines) == 1:
+            self._pending.append(data)
+            return []
+        self._pending.append(lines[0])
+        lines[0] = b''.join(self._pending)
+        self._pending = [lines.pop()]
+        return [self._decode(line) for line in lines if line.strip()]
+
+    def close(self):
+        last = b''.join(self._pending)
+        self._pending = []
+        if not last.strip():
+            return []
+        return [self._decode(last)]
+
+    def _decode(self, line):
+        index = self._count
+        self._count += 1
+        try:
+            return self._loads(line)
+        except Exception as e:
+            raise ValueError('record {}: {}'.format(index, e))
+
+
+def iter_chunks(fp, chunk_size=DEFAULT_CHUNK_SIZE):
+    while True:
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_validated(stream, chunks, max_errors=None, json_loads=json.loads):
+    # 要素ごとに検証しながら順に返す。最初に見つかった違反で打ち切る
+    validator = StreamValidator(stream, max_errors, json_loads)
+    for chunk in chunks:
+        if chunk:
+            for item in validator.feed(chunk):
+                yield item
+    for item in validator.close():
+        yield item
+
+
+class StreamValidator(object):
+    # チャンクを受け取るごとにデコード・検証し、検証済みの要素を返す。
+    # 違反を見つけた時点で ValidationErrors を送出する
+    def __init__(self, stream, max_errors=None, json_loads=json.loads):
+        self._stream = stream
+        self._decoder = stream.decoder_factory(json_loads)
+        self._max_errors = max_errors
+        self.count = 0
+
+    def feed(self, chunk):
+        return self._validate(self._decode(self._decoder.feed, chunk))
+
+    def close(self):
+        items = self._validate(self._decode(self._decoder.close))
+        if self.count < self._stream.min_items:
+            raise ValidationErrors(ValidationError(
+                'body has less than {} items',
+                params=(self._stream.min_items,)))
+        return items
+
+    def _decode(self, method, *args):
+        try:
+            return method(*args)
+        except NotAnArray:
+            raise ValidationErrors(ValidationError(
+                'body is not of type {}', params=('array',)))
+        except ValueError as e:
+            raise ValidationErrors(ValidationError(
+                'invalid json: {}', params=(str(e),)))
+
+    def _validate(self, items):
+        stream = self._stream
+        validator = stream.item_validator
+        for index, item in enumerate(items):
+            if stream.max_items is not None and self.count >= stream.max_items:
+                raise ValidationErrors(ValidationError(
+                    'body has more than {} items',
+                    params=(stream.max_items,)))
+            if validator is not None:
+                result = validator.validate_result(
+                    item, max_errors=self._max_errors)
+                if not result:
+                    for error in result.errors:
+                        error._prefix(self.count, stream.item_schema_path)
+                    raise ValidationErrors(result.errors)
+                items[index] = result.instance
+            self.count += 1
+        return items
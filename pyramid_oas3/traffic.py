@@ -0,0 +1,693 @@
+# -*- coding: utf-8 -*-
+# OpenAPI 定義から負荷試験用のリクエストを生成する。
+# 生成したインスタンスは検証して、スキーマを満たすまで生成し直す
+from base64 import b64encode
+import datetime
+from fractions import Fraction
+import json
+import math
+import random
+import string
+from urllib.parse import quote, urlencode, urlparse
+import uuid
+
+from pyramid_oas3.jsonschema import (
+    OAS3Validator, Resolver, ValidatorCache)
+from pyramid_oas3.plan import MIME_JSON, MIME_LINE_DELIMITED, METHODS
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # pragma: no cover (Python < 3.11)
+    import sre_parse
+
+
+_ALPHABET = string.ascii_letters + string.digits
+_PRINTABLE = [chr(c) for c in range(32, 127)]
+_CATEGORIES = {
+    sre_parse.CATEGORY_DIGIT: string.digits,
+    sre_parse.CATEGORY_WORD: _ALPHABET + '_',
+    sre_parse.CATEGORY_SPACE: ' ',
+}
+_NOT_CATEGORIES = {
+    sre_parse.CATEGORY_NOT_DIGIT: sre_parse.CATEGORY_DIGIT,
+    sre_parse.CATEGORY_NOT_WORD: sre_parse.CATEGORY_WORD,
+    sre_parse.CATEGORY_NOT_SPACE: sre_parse.CATEGORY_SPACE,
+}
+_REPEATS = tuple(
+    getattr(sre_parse, name) for name in (
+        'MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT')
+    if hasattr(sre_parse, name))
+# 上限の無い繰り返し・長さで追加する最大数
+_UNBOUNDED = 4
+_MAX_ATTEMPTS = 50
+_ANY_TYPES = ('object', 'array', 'string', 'integer', 'number', 'boolean')
+_INT_RANGES = {
+    'int32': (-2**31, 2**31 - 1),
+    'int64': (-2**63, 2**63 - 1),
+}
+
+
+class GenerationError(ValueError):
+    pass
+
+
+class InstanceGenerator(object):
+    # スキーマを満たす(または満たさない)インスタンスを生成する。
+    # 同じ seed からは同じ順序で同じインスタンスが生成される
+    def __init__(self, spec, seed=None, optional_rate=0.5, max_depth=8):
+        self._spec = spec
+        self._resolver = Resolver('', spec)
+        self._validators = ValidatorCache(
+            OAS3Validator, resolver=self._resolver, check_only=True)
+        self.random = random.Random(seed)
+        # 必須でないプロパティを含める確率
+        self.optional_rate = optional_rate
+        # これより深い位置では必須の要素のみ生成する
+        self.max_depth = max_depth
+        # size 指定時の配列の要素数と、それを適用する深さ
+        self._array_length = None
+        self._sized_depth = None
+
+    def generate(self, schema, size=None):
+        # size を指定すると、JSON にシリアライズした大きさが size バイト
+        # 程度になるまで上限の無い配列の要素数を増やす
+        if size is None:
+            return self._generate_valid(schema)
+        # 毎回同じ乱数の状態から生成し、配列の要素数のみを変える
+        # (大きさを決めるまでは検証しない)
+        state = self.random.getstate()
+        length, last = 1, None
+        try:
+            for _ in range(16):
+                self.random.setstate(state)
+                self._array_length = length
+                current = len(json.dumps(
+                    self._generate_root(schema), default=str))
+                if current >= size or current == last:
+                    break
+                last = current
+                length = max(length + 1, int(length * size / current) + 1)
+            self.random.setstate(state)
+            return self._generate_valid(schema)
+        finally:
+            self._array_length = None
+
+    def generate_invalid(self, schema, size=None):
+        # 妥当なインスタンスの一部をスキーマに違反する値で置き換える
+        validator = self._validators(schema)
+        for _ in range(_MAX_ATTEMPTS):
+            instance = self.generate(schema, size)
+            candidates = list(self._walk(schema, instance, ()))
+            self.random.shuffle(candidates)
+            for path, subschema in candidates:
+                values = self._violations(subschema)
+                if not values:
+                    continue
+                invalid = _replace(
+                    instance, path, self.random.choice(values))
+                if not validator.is_valid(invalid):
+                    return invalid
+        raise GenerationError('cannot generate an invalid instance')
+
+    def is_valid(self, schema, instance):
+        return self._validators(schema).is_valid(instance)
+
+    def _generate_valid(self, schema):
+        validator = self._validators(schema)
+        for _ in range(_MAX_ATTEMPTS):
+            instance = self._generate_root(schema)
+            if validator.is_valid(instance):
+                return instance
+        raise GenerationError('cannot generate a valid instance')
+
+    def _generate_root(self, schema):
+        self._sized_depth = None
+        return self._generate(schema, 0)
+
+    def _resolve(self, schema):
+        while isinstance(schema, dict) and '$ref' in schema:
+            schema = self._resolver.resolve(schema['$ref'])[1]
+        return schema if isinstance(schema, dict) else {}
+
+    def _generate(self, schema, depth):
+        schema = self._resolve(schema)
+        rnd = self.random
+        if 'enum' in schema:
+            return rnd.choice(schema['enum'])
+        if 'allOf' in schema:
+            return self._generate(self._merge_all(schema), depth)
+        for key in ('oneOf', 'anyOf'):
+            if key in schema:
+                # 分岐を一つ選び、外側のキーワードと合わせて生成する
+                branch = self._resolve(rnd.choice(schema[key]))
+                merged = dict(schema)
+                del merged[key]
+                return self._generate(
+                    self._merge_all({'allOf': [merged, branch]}), depth)
+        if schema.get('nullable') and rnd.random() < 0.05:
+            return None
+        typ = schema.get('type')
+        if isinstance(typ, list):
+            typ = rnd.choice(typ)
+        if typ is None:
+            typ = (rnd.choice(_ANY_TYPES) if 'not' in schema
+                   else _guess_type(schema))
+        return getattr(self, '_generate_' + typ)(schema, depth)
+
+    def _merge_all(self, schema):
+        merged = {k: v for k, v in schema.items() if k != 'allOf'}
+        for sub in schema['allOf']:
+            sub = self._resolve(sub)
+            if 'allOf' in sub:
+                sub = self._merge_all(sub)
+            for k, v in sub.items():
+                if k == 'properties':
+                    props = dict(merged.get('properties', {}))
+                    for name, prop in v.items():
+                        if name in props:
+                            prop = {'allOf': [props[name], prop]}
+                        props[name] = prop
+                    merged['properties'] = props
+                elif k == 'required':
+                    merged['required'] = list(merged.get('required', [])) + [
+                        r for r in v if r not in merged.get('required', [])]
+                elif k not in merged:
+                    merged[k] = v
+        return merged
+
+    def _generate_object(self, schema, depth):
+        rnd = self.random
+        properties = schema.get('properties', {})
+        required = schema.get('required', [])
+        rate = self.optional_rate if depth < self.max_depth else 0.0
+        instance = {}
+        for name, prop in properties.items():
+            if name in required or rnd.random() < rate:
+                instance[name] = self._generate(prop, depth + 1)
+        for name in required:
+            if name not in instance:
+                instance[name] = self._generate_string({}, depth + 1)
+        additional = schema.get('additionalProperties', True)
+        if additional is not False:
+            count = schema.get('minProperties', 0) - len(instance)
+            # 追加のプロパティのみで構成されるオブジェクトの場合も追加する
+            if ((isinstance(additional, dict) or not properties) and
+                    rnd.random() < rate):
+                count = max(count, rnd.randint(1, 3))
+            for i in range(count):
+                value = (self._generate(additional, depth + 1)
+                         if isinstance(additional, dict)
+                         else self._generate_string({}, depth + 1))
+                instance['extra{}'.format(i)] = value
+        return instance
+
+    def _generate_array(self, schema, depth):
+        items = schema.get('items', {})
+        low = schema.get('minItems', 0)
+        high = schema.get('maxItems')
+        if isinstance(items, list):
+            length = len(items)
+        elif self._array_length is not None and (
+                self._sized_depth in (None, depth)):
+            # 最も浅い位置の配列のみ大きくする
+            self._sized_depth = depth
+            length = max(low, self._array_length)
+        elif depth < self.max_depth:
+            length = self.random.randint(low, low + _UNBOUNDED)
+        else:
+            length = low
+        if high is not None:
+            length = min(length, high)
+        instance, seen = [], set()
+        for i in range(length):
+            sub = items[i] if isinstance(items, list) else items
+            for _ in range(_MAX_ATTEMPTS):
+                value = self._generate(sub, depth + 1)
+                key = json.dumps(value, sort_keys=True, default=str)
+                if not schema.get('uniqueItems') or key not in seen:
+                    break
+            seen.add(key)
+            instance.append(value)
+        return instance
+
+    def _generate_string(self, schema, depth):
+        rnd = self.random
+        fmt = schema.get('format')
+        if 'pattern' in schema:
+            return self._generate_regex(schema['pattern'])
+        if fmt in _FORMATS:
+            return _FORMATS[fmt](rnd)
+        low = schema.get('minLength', 0)
+        high = schema.get('maxLength', max(low, 1) + 15)
+        length = rnd.randint(max(low, min(high, 1)), high)
+        return ''.join(rnd.choice(_ALPHABET) for _ in range(length))
+
+    def _generate_integer(self, schema, depth):
+        low, high = _INT_RANGES.get(schema.get('format'), (None, None))
+        low, high = self._bounds(schema, low, high, 1)
+        low, high = int(math.ceil(low)), int(math.floor(high))
+        step = schema.get('multipleOf')
+        if step:
+            # 小数の multipleOf (0.5 など) の倍数になる整数は、
+            # 既約分数にした分子の倍数
+            return self._multiple(low, high, Fraction(str(step)).numerator)
+        return self.random.randint(low, high)
+
+    def _generate_number(self, schema, depth):
+        low, high = self._bounds(schema, None, None, 1e-6)
+        if 'multipleOf' in schema:
+            return self._multiple(low, high, schema['multipleOf'])
+        return self.random.uniform(low, high)
+
+    def _multiple(self, low, high, step):
+        # low 以上 high 以下の step の倍数
+        return step * self.random.randint(
+            int(math.ceil(low / step)), int(math.floor(high / step)))
+
+    def _bounds(self, schema, low, high, epsilon):
+        if 'minimum' in schema:
+            low = schema['minimum']
+            if schema.get('exclusiveMinimum'):
+                low += epsilon
+        if 'maximum' in schema:
+            high = schema['maximum']
+            if schema.get('exclusiveMaximum'):
+                high -= epsilon
+        if low is None:
+            low = min(0, high - 1000) if high is not None else 0
+        if high is None:
+            high = low + 1000
+        return low, high
+
+    def _generate_boolean(self, schema, depth):
+        return self.random.random() < 0.5
+
+    def _generate_null(self, schema, depth):
+        return None
+
+    def _generate_regex(self, pattern):
+        out = []
+        self._emit(sre_parse.parse(pattern), out, {})
+        return ''.join(out)
+
+    def _emit(self, items, out, groups):
+        rnd = self.random
+        for op, av in items:
+            if op == sre_parse.LITERAL:
+                out.append(chr(av))
+            elif op == sre_parse.NOT_LITERAL:
+                out.append(rnd.choice([c for c in _ALPHABET if ord(c) != av]))
+            elif op == sre_parse.ANY:
+                out.append(rnd.choice(_ALPHABET))
+            elif op == sre_parse.IN:
+                out.append(self._pick_in(av))
+            elif op in _REPEATS:
+                low, high, sub = av
+                high = min(high, low + _UNBOUNDED)
+                for _ in range(rnd.randint(low, high)):
+                    self._emit(sub, out, groups)
+            elif op == sre_parse.SUBPATTERN:
+                group, sub = av[0], av[-1]
+                start = len(out)
+                self._emit(sub, out, groups)
+                if group is not None:
+                    groups[group] = ''.join(out[start:])
+            elif op == getattr(sre_parse, 'ATOMIC_GROUP', None):
+                self._emit(av, out, groups)
+            elif op == sre_parse.BRANCH:
+                self._emit(rnd.choice(av[1]), out, groups)
+            elif op == sre_parse.GROUPREF:
+                out.append(groups.get(av, ''))
+            elif op in (sre_parse.AT, sre_parse.ASSERT,
+                        sre_parse.ASSERT_NOT):
+                continue
+            else:
+                raise GenerationError('unsupported pattern: {}'.format(op))
+
+    def _pick_in(self, items):
+        if items and items[0][0] == sre_parse.NEGATE:
+            return self.random.choice([
+                c for c in _PRINTABLE if not _in_set(c, items[1:])])
+        op, av = self.random.choice(items)
+        if op == sre_parse.LITERAL:
+            return chr(av)
+        if op == sre_parse.RANGE:
+            return chr(self.random.randint(*av))
+        if op == sre_parse.CATEGORY:
+            if av in _CATEGORIES:
+                return self.random.choice(_CATEGORIES[av])
+            return self.random.choice([
+                c for c in _PRINTABLE
+                if c not in _CATEGORIES[_NOT_CATEGORIES[av]]])
+        raise GenerationError('unsupported pattern: {}'.format(op))
+
+    def _walk(self, schema, instance, path):
+        # (インスタンス内の位置, その位置のスキーマ) を列挙する
+        schema = self._resolve(schema)
+        yield path, schema
+        if isinstance(instance, dict):
+            for name, prop in schema.get('properties', {}).items():
+                if name in instance:
+                    for entry in self._walk(
+                            prop, instance[name], path + (name,)):
+                        yield entry
+        elif isinstance(instance, list):
+            items = schema.get('items')
+            if isinstance(items, dict):
+                for index, item in enumerate(instance):
+                    for entry in self._walk(items, item, path + (index,)):
+                        yield entry
+
+    def _violations(self, schema):
+        # schema に違反する値の候補を返す
+        typ = schema.get('type')
+        candidates = []
+        if 'enum' in schema:
+            candidates.append('not-in-enum')
+        if typ is not None:
+            candidates.append(12345 if typ == 'string' else 'not-a-' + typ)
+        if 'required' in schema and schema['required']:
+            instance = self._generate(schema, self.max_depth)
+            if isinstance(instance, dict):
+                del instance[self.random.choice(schema['required'])]
+                candidates.append(instance)
+        if 'maxLength' in schema:
+            candidates.append('x' * (schema['maxLength'] + 1))
+        if schema.get('minLength', 0) > 0:
+            candidates.append('')
+        if 'pattern' in schema or schema.get('format') in _FORMATS:
+            candidates.append('!')
+        if 'maximum' in schema:
+            candidates.append(schema['maximum'] + 1)
+        if 'minimum' in schema:
+            candidates.append(schema['minimum'] - 1)
+        if 'maxItems' in schema:
+            candidates.append([None] * (schema['maxItems'] + 1))
+        if schema.get('minItems', 0) > 0:
+            candidates.append([])
+        if typ is None and any(
+                k in schema for k in ('oneOf', 'anyOf', 'allOf', 'not')):
+            # 型が分岐側にある場合は別の型の値で違反させる
+            candidates.extend([12345, 'junk', [], {}, True])
+        return candidates
+
+
+# 必須パラメータを省略して不正なリクエストとする
+_OMIT = object()
+
+
+def _guess_type(schema):
+    if 'properties' in schema or 'additionalProperties' in schema:
+        return 'object'
+    if 'items' in schema:
+        return 'array'
+    if 'minimum' in schema or 'maximum' in schema:
+        return 'number'
+    return 'string'
+
+
+def _in_set(c, items):
+    for op, av in items:
+        if op == sre_parse.LITERAL and c == chr(av):
+            return True
+        if op == sre_parse.RANGE and av[0] <= ord(c) <= av[1]:
+            return True
+        if op == sre_parse.CATEGORY:
+            if av in _CATEGORIES:
+                if c in _CATEGORIES[av]:
+                    return True
+            elif c not in _CATEGORIES[_NOT_CATEGORIES[av]]:
+                return True
+    return False
+
+
+def _replace(instance, path, value):
+    if not path:
+        return value
+    copy = dict(instance) if isinstance(instance, dict) else list(instance)
+    copy[path[0]] = _replace(instance[path[0]], path[1:], value)
+    return copy
+
+
+def _date_time(rnd):
+    dt = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)
+    return (dt + datetime.timedelta(seconds=rnd.randint(0, 10**9))).isoformat()
+
+
+def _date(rnd):
+    return (datetime.date(2000, 1, 1) +
+            datetime.timedelta(days=rnd.randint(0, 10000))).isoformat()
+
+
+def _word(rnd, length=8):
+    return ''.join(rnd.choice(string.ascii_lowercase) for _ in range(length))
+
+
+_FORMATS = {
+    'date-time': _date_time,
+    'date': _date,
+    'email': lambda rnd: '{}@{}.example.com'.format(_word(rnd), _word(rnd)),
+    'hostname': lambda rnd: '{}.example.com'.format(_word(rnd)),
+    'ipv4': lambda rnd: '.'.join(str(rnd.randint(0, 255)) for _ in range(4)),
+    'ipv6': lambda rnd: ':'.join(
+        '{:x}'.format(rnd.randint(0, 0xffff)) for _ in range(8)),
+    'uri': lambda rnd: 'http://example.com/{}'.format(_word(rnd)),
+    'uriref': lambda rnd: '/{}'.format(_word(rnd)),
+    'byte': lambda rnd: b64encode(
+        bytes(rnd.randint(0, 255) for _ in range(12))).decode('ascii'),
+    'uuid': lambda rnd: str(uuid.UUID(int=rnd.getrandbits(128))),
+}
+
+
+class GeneratedRequest(object):
+    def __init__(self, operation, method, url, headers, body, content_type,
+                 valid):
+        self.operation = operation
+        self.method = method
+        self.url = url
+        self.headers = headers
+        self.body = body
+        self.content_type = content_type
+        # False の場合は検証エラーとなるように生成されている
+        self.valid = valid
+
+    def send(self, app, **kwargs):
+        # WebTest の TestApp でリクエストを送る
+        kwargs.setdefault('expect_errors', not self.valid)
+        params = {'method': self.method.upper(), 'headers': self.headers}
+        if self.body is not None:
+            params['body'] = self.body
+            params['content_type'] = self.content_type
+        params.update(kwargs)
+        return app.request(self.url, **params)
+
+    def __repr__(self):
+        return '<GeneratedRequest {} {}{}>'.format(
+            self.method.upper(), self.url, '' if self.valid else ' invalid')
+
+
+class Operation(object):
+    def __init__(self, name, method, path, op_obj):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.op_obj = op_obj
+
+
+class RequestGenerator(object):
+    # 各オペレーションのリクエストを生成する。
+    # pyramid_oas3 が未対応のパラメータ (cookie など) は生成しない
+    def __init__(self, spec, seed=None, headers=None, **kwargs):
+        self.instances = InstanceGenerator(spec, seed, **kwargs)
+        self.random = self.instances.random
+        self._resolve = self.instances._resolve
+        self._headers = headers or {}
+        servers = spec.get('servers') or [{'url': '/'}]
+        self._prefix = urlparse(servers[0]['url']).path.rstrip('/')
+        self.operations = []
+        for path, path_item in spec['paths'].items():
+            for method, op_obj in path_item.items():
+                if method not in METHODS:
+                    continue
+                name = op_obj.get('operationId') or '{} {}'.format(
+                    method.upper(), path)
+                self.operations.append(Operation(name, method, path, op_obj))
+
+    def operation(self, name):
+        for op in self.operations:
+            if op.name == name:
+                return op
+        raise KeyError(name)
+
+    def generate(self, operation=None, invalid=False, body_size=None):
+        if operation is None:
+            operation = self.random.choice(self.operations)
+        elif not isinstance(operation, Operation):
+            operation = self.operation(operation)
+        params = [self._resolve(p) for p in operation.op_obj.get(
+            'parameters', [])]
+        params = [p for p in params if _supported(p)]
+        reqbody = self._resolve(operation.op_obj.get('requestBody'))
+        media_type, body_schema = _pick_media_type(reqbody)
+        # 不正なリクエストではパラメータかボディのどちらか一つを違反させる
+        broken = broken_values = None
+        if invalid:
+            targets = [(p, self._param_violations(p)) for p in params]
+            targets = [t for t in targets if t[1]]
+            if media_type is not None and body_schema is not None:
+                targets.append((reqbody, None))
+            if not targets:
+                raise GenerationError(
+                    '{} has nothing to violate'.format(operation.name))
+            broken, broken_values = self.random.choice(targets)
+
+        path, query, headers = operation.path, [], dict(self._headers)
+        for param in params:
+            in_ = param['in']
+            if not (in_ == 'path' or param.get('required') or
+                    param is broken or
+                    self.random.random() < self.instances.optional_rate):
+                continue
+            if param is broken:
+                value = self.random.choice(broken_values)
+                if value is _OMIT:
+                    continue
+            else:
+                value = self._param_value(param)
+            if in_ == 'path':
+                path = path.replace(
+                    '{' + param['name'] + '}',
+                    quote(_serialize_param(param, value), safe=''))
+            elif in_ == 'header':
+                headers[param['name']] = _serialize_param(param, value)
+            else:
+                query.extend(_serialize_query(param, value))
+
+        body = content_type = None
+        if media_type is not None:
+            content_type = media_type
+            body = self._body(
+                media_type, body_schema, broken is reqbody, body_size)
+        url = self._prefix + path
+        if query:
+            url += '?' + urlencode(query)
+        return GeneratedRequest(
+            operation.name, operation.method, url, headers, body,
+            content_type, not invalid)
+
+    def iter_requests(self, count, invalid_rate=0.0, body_size=None):
+        # 各オペレーションを順に count 個のリクエストを生成する
+        for i in range(count):
+            operation = self.operations[i % len(self.operations)]
+            invalid = self.random.random() < invalid_rate
+            yield self.generate(operation, invalid, body_size)
+
+    def _param_value(self, param):
+        # パスのパラメータは空文字列にするとルーティングできないので生成し直す。
+        schema = param.get('schema') or {}
+        for _ in range(_MAX_ATTEMPTS):
+            value = self.instances.generate(schema)
+            # 空の配列・オブジェクトは区切り文字の形式で表現できない
+            if value != [] and value != {} and (
+                    param['in'] != 'path' or _serialize_param(param, value)):
+                return value
+        raise GenerationError(
+            'cannot generate parameter {}'.format(param['name']))
+
+    def _param_violations(self, param):
+        # 文字列にシリアライズしても違反となる値のみを候補とする
+        schema = self._resolve(param.get('schema') or {})
+        typ = schema.get('type')
+        values = []
+        if typ in ('integer', 'number', 'boolean'):
+            values.append('!')
+            values.extend(
+                v for v in self.instances._violations(schema)
+                if isinstance(v, (int, float)) and not isinstance(v, bool))
+        elif typ == 'array':
+            items = self._resolve(schema.get('items'))
+            if items.get('type') in ('integer', 'number', 'boolean'):
+                values.append('!')
+        elif typ in (None, 'string'):
+            values.extend(
+                v for v in self.instances._violations(schema)
+                if isinstance(v, str))
+        if param['in'] == 'path':
+            values = [v for v in values if v]
+        elif param.get('required'):
+            values.append(_OMIT)
+        return values
+
+    def _body(self, media_type, schema, invalid, size):
+        gen = self.instances
+        if media_type in MIME_LINE_DELIMITED:
+            count = max(1, (size or 0) // 64) if size else 3
+            lines = [gen.generate(schema) for _ in range(count)]
+            if invalid:
+                lines[-1] = gen.generate_invalid(schema)
+            return b''.join(
+                json.dumps(line).encode('utf-8') + b'\n' for line in lines)
+        if schema is None:
+            return bytes(gen.random.randint(0, 255) for _ in range(size or 16))
+        body = (gen.generate_invalid(schema, size) if invalid
+                else gen.generate(schema, size))
+        return json.dumps(body).encode('utf-8')
+
+
+def _supported(param):
+    # compile_parameter で未対応とされるパラメータは除外する
+    in_ = param['in']
+    style = param.get(
+        'style', 'form' if in_ in ('query', 'cookie') else 'simple')
+    explode = param.get('explode', style == 'form')
+    schema = param.get('schema') or {}
+    return not (
+        in_ not in ('path', 'query', 'header') or
+        param.get('allowEmptyValue', False) or
+        style in ('matrix', 'label', 'spaceDelimited', 'pipeDelimited') or
+        (in_ == 'query' and style == 'form' and explode and
+         schema.get('type', 'object') == 'object'))
+
+
+def _pick_media_type(reqbody):
+    if not reqbody:
+        return None, None
+    content = reqbody.get('content', {})
+    for media_type in [MIME_JSON] + sorted(MIME_LINE_DELIMITED):
+        if media_type in content:
+            return media_type, (content[media_type] or {}).get('schema')
+    for media_type, media in sorted(content.items()):
+        if '*' not in media_type:
+            return media_type, None
+    return 'application/octet-stream', None
+
+
+def _format_primitive(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def _serialize_param(param, value):
+    # simple / form (explode しない) 形式
+    if isinstance(value, list):
+        return ','.join(_format_primitive(v) for v in value)
+    if isinstance(value, dict):
+        style = param.get('style', 'simple')
+        if style == 'simple' and param.get('explode', False):
+            return ','.join('{}={}'.format(k, _format_primitive(v))
+                            for k, v in value.items())
+        return ','.join('{},{}'.format(k, _format_primitive(v))
+                        for k, v in value.items())
+    return _format_primitive(value)
+
+
+def _serialize_query(param, value):
+    name = param['name']
+    style = param.get('style', 'form')
+    if style == 'deepObject' and isinstance(value, dict):
+        return [('{}[{}]'.format(name, k), _format_primitive(v))
+                for k, v in value.items()]
+    if isinstance(value, list) and param.get('explode', style == 'form'):
+        return [(name, _format_primitive(v)) for v in value]
+    return [(name, _serialize_param(param, value))]
@@ -1,79 +1,268 @@
 # -*- coding: utf-8 -*-
-import json
+import logging
 from urllib.parse import parse_qs, urlparse
+import warnings
 
 from pyramid.httpexceptions import (
     HTTPBadRequest, HTTPNotAcceptable, HTTPUnauthorized)
-
-from pyramid_oas3.jsonschema import OAS3Validator, Resolver
+from pyramid.path import DottedNameResolver
+from pyramid.settings import asbool, aslist
+from pyramid.util import InstancePropertyHelper
+
+from pyramid_oas3.background import BackgroundValidator, log_failure
+from pyramid_oas3.compact import compact, freeze
+from pyramid_oas3.interfaces import (
+    IAllocationTracker, IOAS3Context, ISchemaProfiler, IStageMetrics,
+    IValidatorCache)
+from pyramid_oas3.json_backend import resolve_json_loads
+from pyramid_oas3.metrics import (
+    AllocationTracker, Instrumentation, StageMetrics)
+from pyramid_oas3.sampling import ResponseSampler
+from pyramid_oas3.snapshot import load_spec
+from pyramid_oas3.jsonschema import (
+    OAS3NativeValidator, OAS3Validator, Resolver, SchemaProfiler,
+    StructureKeys, ValidatorCache)
+from pyramid_oas3.jsonschema._utils import (
+    UNDEFINED, copy_default, prefill_regex_cache)
 from pyramid_oas3.jsonschema.exceptions import (
-    ValidationErrors, ValidationError, StyleError)
-from pyramid_oas3.resolve import resolve_refs
-from pyramid_oas3.types import _convert_type, _convert_style
-
-
-UNDEFINED = object()
-MIME_JSON = 'application/json'
-
-
-def validation_tween_factory(handler, registry):
-    from pyramid.interfaces import IRoutesMapper
-    settings = {
-        k[13:]: v
-        for k, v in registry.settings.items()
-        if k.startswith('pyramid_oas3.')}
-    validate_response = settings.get('validate_response', False)
-    response_reviver = settings.get('response_reviver', None)
-    fill_default = settings.get('fill_by_default', False)
-    schema = settings['schema']
-    resolver = Resolver('', schema)
-    default_security = schema.get('security', None)
-    route_mapper = registry.queryUtility(IRoutesMapper)
-    prefixes = list(set([
-        urlparse(server['url']).path.rstrip('/')
-        for server in schema.get('servers', [])]))
-    if not prefixes:
-        prefixes = ['/']
-
-    # 検証を簡単にするためにパラメータの $ref をすべて解決する。
-    paths = schema['paths']
-    for path, path_item in paths.items():
-        for method, op_obj in path_item.items():
-            if method not in ('get', 'put', 'post', 'delete', 'options',
-                              'head', 'patch', 'trace'):
-                continue
-            params = op_obj.get('parameters')
-            if params:
-                resolve_refs(params, resolver)
-
-    def Validator(schema):
-        return OAS3Validator(
-            schema, resolver=resolver, fill_by_default=fill_default)
+    ValidationErrors, ValidationError, StyleError,
+    configure as configure_errors)
+from pyramid_oas3.plan import (
+    METHODS, MIME_JSON, MIME_LINE_DELIMITED, compile_line_stream,
+    compile_operations, compile_stream)
+from pyramid_oas3.stream import (
+    DEFAULT_CHUNK_SIZE, StreamValidator, iter_chunks, iter_validated)
+
+
+logger = logging.getLogger('pyramid_oas3')
+
+# レンダラへ渡す前のデータでレスポンスを検証済みであることを示す environ のキー
+_RENDERER_DATA_VALIDATED = 'pyramid_oas3.renderer_data_validated'
+
+
+class OAS3Context(object):
+    def __init__(self, registry):
+        settings = {
+            k[13:]: v
+            for k, v in registry.settings.items()
+            if k.startswith('pyramid_oas3.')}
+        self.validate_response = settings.get('validate_response', False)
+        self.response_reviver = settings.get('response_reviver', None)
+        if self.response_reviver:
+            # レスポンス全体を事前に走査・再構築するので、検証と同じ走査で
+            # 適用する response_schema_reviver を利用する
+            warnings.warn(
+                'pyramid_oas3.response_reviver is deprecated, '
+                'use pyramid_oas3.response_schema_reviver instead',
+                DeprecationWarning)
+        # 検証と同じ走査の中でスキーマの各ノードに適用する reviver。
+        # null の値のプロパティには適用されず、oneOf/anyOf では試した分岐ごとに
+        # 呼ばれるので、副作用の無い関数である必要がある
+        self.response_schema_reviver = DottedNameResolver().maybe_resolve(
+            settings.get('response_schema_reviver'))
+        # ストリーミング中のレスポンスで検証エラーを検出した場合のコールバック
+        self.response_stream_error_handler = DottedNameResolver(
+        ).maybe_resolve(settings.get('response_stream_error_handler'))
+        self.max_errors = settings.get('max_errors')
+        if self.max_errors:
+            self.max_errors = int(self.max_errors)
+        fill_default = asbool(settings.get('fill_by_default', False))
+        self.json_loads = resolve_json_loads(settings.get('json_backend'))
+        self.stream_chunk_size = int(
+            settings.get('stream_chunk_size', DEFAULT_CHUNK_SIZE))
+        # レスポンスの検証をワーカースレッドで実行する (0: 同期して検証)
+        self.background = None
+        workers = int(settings.get('response_validation_workers', 0))
+        if workers > 0:
+            sink = DottedNameResolver().maybe_resolve(
+                settings.get('response_validation_sink'))
+            self.background = BackgroundValidator(
+                workers,
+                int(settings.get('response_validation_queue_size', 100)),
+                sink or log_failure)
+        # ステージごとの処理時間の計測 (無効な場合は None)
+        self.metrics = self.instrumentation = None
+        hooks = settings.get('instrumentation_hooks', ())
+        if isinstance(hooks, str):
+            hooks = aslist(hooks)
+        hooks = [DottedNameResolver().maybe_resolve(h) for h in hooks]
+        # tracemalloc によるステージごとのメモリ確保量の計測 (デバッグ用)
+        self.allocations = None
+        if asbool(settings.get('allocation_tracking', False)):
+            self.allocations = AllocationTracker()
+            registry.registerUtility(self.allocations, IAllocationTracker)
+            hooks.append(self.allocations)
+        if asbool(settings.get('metrics', False)):
+            self.metrics = StageMetrics()
+            registry.registerUtility(self.metrics, IStageMetrics)
+        if self.metrics is not None or hooks:
+            self.instrumentation = Instrumentation(self.metrics, hooks)
+        # シリアライズ前のデータでレスポンスを検証するレンダラ名
+        self.renderer_validation = set(
+            aslist(settings.get('renderer_validation', '')))
+        # 参照を解決済みの定義を利用する (settings の schema は変更しない)。
+        # codegen で生成したモジュールを指定した場合はその定義を利用する
+        compiled_module = DottedNameResolver().maybe_resolve(
+            settings.get('compiled_module'))
+        if compiled_module is not None:
+            schema = compiled_module.SCHEMA
+        else:
+            schema = load_spec(
+                settings.get('schema'), settings.get('schema_file'),
+                settings.get('schema_cache_dir'))
+            if asbool(settings.get('compact_spec', False)):
+                schema = compact(schema)
+                # 元の定義を解放できるように settings の schema を置き換える
+                if registry.settings.get('pyramid_oas3.schema') is not None:
+                    registry.settings['pyramid_oas3.schema'] = schema
+        resolver = self._resolver = Resolver('', schema)
+        prefixes = list(set([
+            urlparse(server['url']).path.rstrip('/')
+            for server in schema.get('servers', [])]))
+        if not prefixes:
+            prefixes = ['/']
+        self._prefixes = prefixes
+
+        configure_errors(**{
+            k: settings.get('error_' + k)
+            for k in ('max_length', 'max_context', 'max_depth', 'max_errors')})
+
+        bypass = aslist(settings.get('bypass_routes', ''))
+        self._bypass_names = set(b for b in bypass if not b.endswith('*'))
+        self._bypass_prefixes = tuple(
+            b[:-1] for b in bypass if b.endswith('*'))
+
+        prefill_regex_cache(schema)
+        # スキーマの位置ごとの検証時間の集計 (無効な場合は None)
+        profiler = self.profiler = None
+        if asbool(settings.get('schema_profiler', False)):
+            profiler = self.profiler = SchemaProfiler()
+            registry.registerUtility(profiler, ISchemaProfiler)
+        # 生成済みの関数はキーワード単位で計測できないので profiler とは併用しない
+        convert = check = None
+        if compiled_module is not None and profiler is None:
+            # python -m pyramid_oas3.codegen の実行時に、パッケージの読み込みで
+            # codegen が先に import されないよう、ここで import する
+            from pyramid_oas3.codegen import precompiled
+            if fill_default != compiled_module.FILL_BY_DEFAULT:
+                raise ValueError(
+                    'pyramid_oas3.compiled_module was generated with '
+                    'fill_by_default={}'.format(
+                        compiled_module.FILL_BY_DEFAULT))
+            convert = precompiled(
+                compiled_module.NODES, compiled_module.CONVERT)
+            check = precompiled(compiled_module.NODES, compiled_module.CHECK)
+        # 構造が同じスキーマ (インラインで重複した定義など) は一度だけコンパイルする
+        keys = self.structure_keys = None
+        if asbool(settings.get('dedup_schemas', True)):
+            keys = self.structure_keys = StructureKeys()
+        self.Validator = ValidatorCache(
+            OAS3Validator, resolver=resolver, fill_by_default=fill_default,
+            profiler=profiler, precompiled=convert, structure_keys=keys)
+        # レスポンスの検証結果は利用しないので、常に変換なしで検証する
+        self.CheckValidator = ValidatorCache(
+            OAS3Validator, resolver=resolver, check_only=True,
+            profiler=profiler, precompiled=check, structure_keys=keys)
+        registry.registerUtility(self.Validator, IValidatorCache)
+        # ビューの戻り値は format による変換後の値 (datetime など) を含む
+        self.NativeValidator = ValidatorCache(
+            OAS3NativeValidator, resolver=resolver, check_only=True,
+            profiler=profiler, structure_keys=keys)
+        registry.registerUtility(
+            self.CheckValidator, IValidatorCache, name='check_only')
+        registry.registerUtility(
+            self.NativeValidator, IValidatorCache, name='native')
+        self.ResponseValidator = self.CheckValidator
+        if self.response_schema_reviver is not None:
+            self.ResponseValidator = ValidatorCache(
+                OAS3Validator, resolver=resolver, check_only=True,
+                reviver=self.response_schema_reviver, profiler=profiler)
+
+        sample_rate = float(settings.get('response_sample_rate', 1.0))
+        sample_adaptive = int(settings.get('response_sample_adaptive', 0))
+        sample_min_rate = float(
+            settings.get('response_sample_min_rate', 0.01))
+
+        def sampler_factory(rate):
+            if rate is None:
+                rate = sample_rate
+            if rate >= 1.0 and not sample_adaptive:
+                return None
+            return ResponseSampler(rate, sample_adaptive, sample_min_rate)
+
+        self._plans = compile_operations(
+            schema, self.Validator, resolver, fill_default,
+            CheckValidator=self.CheckValidator,
+            check_only=asbool(settings.get('check_only', False)),
+            max_errors=self.max_errors,
+            sampler_factory=sampler_factory, dereferenced=True)
+        self._route_plans = {}
+        self._response_streams = {}
+        if keys is not None:
+            logger.info(
+                'compiled %(compiled)d schema nodes, %(deduplicated)d '
+                'shared by structure (%(structures)d distinct structures)',
+                self.dedup_report())
+        # 定義とコンパイル済みの検証関数を GC の追跡対象から外す (fork 前に作成する場合)
+        if asbool(settings.get('gc_freeze', False)):
+            freeze()
+
+    def dedup_report(self):
+        # 構造による共有の集計。起動時に計算した分に加えて、
+        # レスポンスなど遅延してコンパイルしたノードも含む
+        caches = [self.Validator, self.CheckValidator, self.NativeValidator]
+        dedups = [c.dedup for c in caches if c.dedup is not None]
+        return {
+            'compiled': sum(d.compiled for d in dedups),
+            'deduplicated': sum(d.deduplicated for d in dedups),
+            'structures': len(self.structure_keys) if dedups else 0,
+        }
 
-    def get_operation_object(path, method):
+    def get_operation_plan(self, path, method):
         if path and path[0] != '/':
             path = '/' + path
-        for prefix in prefixes:
+        for prefix in self._prefixes:
             if not path.startswith(prefix):
                 continue
-            path_item = paths.get(path[len(prefix):])
-            if path_item:
-                return path_item.get(method.lower())
+            plan = self._plans.get((path[len(prefix):], method.lower()))
+            if plan is not None:
+                return plan
         return None
 
-    def validator_tween(request):
-        route_info = route_mapper(request)
-        route = route_info.get('route', None)
-        if not route:  # pragma: no cover
-            return handler(request)
-        op_obj = get_operation_object(route.path, request.method)
-        if not op_obj:  # pragma: no cover
-            return handler(request)
-
-        _check_security(default_security, request, op_obj)
+    def get_route_plan(self, route, method):
+        # ルート名ごとに一度だけ OperationPlan を探し、以降は辞書引きのみ。
+        # クライアントが任意のメソッドを送れるので、OpenAPI のメソッド以外は
+        # キャッシュせずに None を返す
+        method = method.lower()
+        key = (route.name, method)
+        try:
+            return self._route_plans[key]
+        except KeyError:
+            if method not in METHODS:
+                return None
+        plan = None
+        if not self.is_bypassed(route.name):
+            plan = self.get_operation_plan(route.path, method)
+        self._route_plans[key] = plan
+        return plan
+
+    def bind_route(self, route):
+        for method in METHODS:
+            self.get_route_plan(route, method)
+
+    def is_bypassed(self, route_name):
+        return (route_name in self._bypass_names or
+                route_name.startswith(self._bypass_prefixes))
+
+    def handle(self, handler, request, plan, path_matches):
+        _check_security(plan, request)
+        inst = self.instrumentation
+        # リクエストに追加するプロパティはまとめて設定する
+        # (set_property は呼び出すごとにクラスを作成する)
+        properties = InstancePropertyHelper()
         params, body = _validate_and_parse(
-            Validator, resolver, request, route_info.get('match', {}),
-            op_obj, fill_default)
+            plan, request, path_matches, self.json_loads,
+            self.stream_chunk_size, inst, properties)
 
         def oas3_data(_):
             return params
@@ -81,78 +270,388 @@ def validation_tween_factory(handler, registry):
         def oas3_body(_):
             return body
 
-        request.set_property(oas3_data)
-        request.set_property(oas3_body)
-        response = handler(request)
-        if not validate_response:
+        properties.add_property(oas3_data)
+        properties.add_property(oas3_body)
+        properties.apply(request)
+        response = _timed(
+            inst, request, plan.name, 'handler', handler, request)
+        if (not self.validate_response or
+                request.environ.pop(_RENDERER_DATA_VALIDATED, False)):
+            return response
+        sampler = plan.response_sampler
+        if sampler is not None and not sampler.should_validate():
             return response
+        if (self.background is not None and
+                isinstance(response.app_iter, (list, tuple))):
+            # ストリーミングしないレスポンスはワーカーで検証する。
+            # ワーカーからは response を読まない (送出中の response.body の
+            # 読み込みは app_iter を置き換えるため) ので、必要な値をここで取り出す
+            self.background.submit(
+                request, self._check_response, request, response, plan,
+                response.status_code, response.content_type,
+                b''.join(response.app_iter))
+            return response
+        _timed(inst, request, plan.name, 'response',
+               self._check_response, request, response, plan,
+               response.status_code, response.content_type)
+        return response
 
+    def _check_response(self, request, response, plan, status_code,
+                        media_type, body=None):
+        # body を指定した場合は response の状態を参照しない
+        sampler = plan.response_sampler
         try:
-            responses_obj = op_obj['responses']
-            res_obj = responses_obj.get(
-                str(response.status_code), responses_obj.get('default'))
-            if res_obj is None:
-                raise ValidationErrors(ValidationError(
-                    'invalid response status code'))
-            content_prop = res_obj.get('content')
-            if response.content_type == MIME_JSON:
-                res_schema = content_prop.get(MIME_JSON, {}).get('schema')
-                if res_schema:
-                    res_json = json.loads(response.body.decode('utf8'))
-                    if response_reviver:
-                        res_json = apply_reviver(res_json, response_reviver)
-                    _validate(Validator, res_schema, res_json)
+            res_schema = _get_response_schema(
+                plan, status_code, media_type,
+                media_type == MIME_JSON or media_type in MIME_LINE_DELIMITED)
+            completed = True
+            if res_schema:
+                completed = self._validate_response_body(
+                    request, response, res_schema, media_type, sampler, body)
         except Exception as e:
+            if sampler is not None:
+                sampler.record(False)
             raise ResponseValidationError(response, e)
-        return response
+        # ストリーミングするレスポンスの結果は送出し終えた時点で記録する
+        if sampler is not None and completed:
+            sampler.record(True)
+
+    def validate_renderer_data(self, request, plan, data):
+        # JSON へシリアライズする前のビューの戻り値を検証する。
+        # 検証済みとして記録し、handle でボディを再度パースしないようにする
+        request.environ[_RENDERER_DATA_VALIDATED] = True
+        sampler = plan.response_sampler
+        if sampler is not None and not sampler.should_validate():
+            return
+        if self.background is not None:
+            self.background.submit(
+                request, self._check_renderer_data, request, plan, data)
+            return
+        _timed(self.instrumentation, request, plan.name, 'response',
+               self._check_renderer_data, request, plan, data)
+
+    def _check_renderer_data(self, request, plan, data):
+        sampler = plan.response_sampler
+        response = request.response
+        try:
+            res_schema = _get_response_schema(
+                plan, response.status_code, MIME_JSON)
+            if res_schema:
+                self.NativeValidator(res_schema).validate_result(
+                    data, max_errors=self.max_errors).raise_for_errors()
+        except Exception as e:
+            if sampler is not None:
+                sampler.record(False)
+            raise ResponseValidationError(response, e)
+        if sampler is not None:
+            sampler.record(True)
+
+    def _validate_response_body(
+            self, request, response, schema, media_type, sampler=None,
+            body=None):
+        # 検証を終えた場合は True、送出時に検証する場合は False を返す
+        buffered = body is not None or isinstance(
+            response.app_iter, (list, tuple))
+        stream = None
+        if media_type in MIME_LINE_DELIMITED or not (
+                buffered or self.response_reviver):
+            stream = self.get_response_stream(schema, media_type)
+        if stream is None:
+            res_json = self.json_loads(
+                response.body if body is None else body)
+            if self.response_reviver:
+                res_json = apply_reviver(res_json, self.response_reviver)
+            res_json = self.ResponseValidator(schema).validate_result(
+                res_json, max_errors=self.max_errors).raise_for_errors()
+            if res_json is UNDEFINED:
+                raise RuntimeError('reviver cannot remove root object')
+            return True
+        validator = StreamValidator(stream, self.max_errors, self.json_loads)
+        if buffered:
+            for chunk in (response.app_iter if body is None else (body,)):
+                validator.feed(chunk)
+            validator.close()
+            return True
+        # app_iter を読み込まずに、送出するチャンクを順に検証する
+        content_length = response.content_length
+        response.app_iter = _ValidatingAppIter(
+            request, response, validator, self.response_stream_error_handler,
+            sampler)
+        response.content_length = content_length
+        return False
+
+    def get_response_stream(self, schema, media_type):
+        key = (id(schema), media_type)
+        try:
+            return self._response_streams[key]
+        except KeyError:
+            pass
+        if media_type in MIME_LINE_DELIMITED:
+            stream = compile_line_stream(schema, self.ResponseValidator)
+        else:
+            try:
+                stream = compile_stream(
+                    schema, self.ResponseValidator, self._resolver)
+            except ValueError:
+                # 配列全体を必要とするスキーマはバッファして検証する
+                stream = None
+        self._response_streams[key] = stream
+        return stream
+
+
+class _ValidatingAppIter(object):
+    def __init__(self, request, response, validator, on_error,
+                 sampler=None):
+        self._request = request
+        self._response = response
+        self._app_iter = response.app_iter
+        self._validator = validator
+        self._on_error = on_error
+        self._sampler = sampler
+
+    def __iter__(self):
+        for chunk in self._app_iter:
+            if chunk and self._validator is not None:
+                self._check(self._validator.feed, chunk)
+            yield chunk
+        if self._validator is not None:
+            self._check(self._validator.close)
+            if self._validator is not None and self._sampler is not None:
+                self._sampler.record(True)
+
+    def _check(self, method, *args):
+        # 送出を開始した後のエラーは、コールバックが設定されていれば通知して
+        # 以降の検証を打ち切る。設定されていなければ例外としてストリームを中断する
+        try:
+            method(*args)
+        except ValidationErrors as e:
+            self._validator = None
+            if self._sampler is not None:
+                self._sampler.record(False)
+            exc = ResponseValidationError(self._response, e)
+            if self._on_error is None:
+                raise exc
+            self._on_error(self._request, exc)
+
+    def close(self):
+        close = getattr(self._app_iter, 'close', None)
+        if close is not None:
+            close()
+
+
+def get_context(registry):
+    ctx = registry.queryUtility(IOAS3Context)
+    if ctx is None:
+        ctx = OAS3Context(registry)
+        registry.registerUtility(ctx, IOAS3Context)
+    return ctx
+
+
+def validation_tween_factory(handler, registry):
+    from pyramid.interfaces import IRoutesMapper
+    ctx = get_context(registry)
+    route_mapper = registry.queryUtility(IRoutesMapper)
+
+    def validator_tween(request):
+        inst = ctx.instrumentation
+        if inst is not None:
+            # オペレーションが決まるまで hook には通知しない (検証しない
+            # ルートで start だけが呼ばれないようにする)
+            started = inst.clock()
+        route_info = route_mapper(request)
+        route = route_info.get('route', None)
+        if not route:  # pragma: no cover
+            return handler(request)
+        plan = ctx.get_route_plan(route, request.method)
+        if not plan:
+            return handler(request)
+        if inst is not None:
+            inst.record(request, plan.name, 'route', started)
+        return ctx.handle(
+            handler, request, plan, route_info.get('match', {}))
     return validator_tween
 
 
-def _check_security(default_security, request, op_obj):
-    requires = op_obj.get('security', default_security)
-    if not requires:
+def validation_view_deriver(view, info):
+    # Pyramid のルーティング結果 (request.matched_route) を利用するため、
+    # tween の様にリクエスト毎にルーティングを二重に実行しない
+    from pyramid.interfaces import IRoutesMapper
+    if getattr(info, 'exception_only', False):
+        return view
+    route_name = info.options.get('route_name')
+    if route_name is None:
+        return view
+    ctx = get_context(info.registry)
+    if ctx.is_bypassed(route_name):
+        return view
+    route_mapper = info.registry.queryUtility(IRoutesMapper)
+    route = route_mapper.get_route(route_name) if route_mapper else None
+    if route is not None:
+        ctx.bind_route(route)
+
+    def validator_view(context, request):
+        route = request.matched_route
+        if route is None or getattr(request, 'exception', None) is not None:
+            return view(context, request)
+        plan = ctx.get_route_plan(route, request.method)
+        if not plan:
+            return view(context, request)
+        return ctx.handle(
+            lambda req: view(context, req), request, plan, request.matchdict)
+    return validator_view
+
+
+def validation_renderer_deriver(view, info):
+    # rendered_view の内側に配置し、レンダラへ渡す前のデータを検証する
+    from pyramid.interfaces import IResponse
+    if getattr(info, 'exception_only', False):
+        return view
+    ctx = get_context(info.registry)
+    renderer = info.options.get('renderer')
+    renderer_name = getattr(renderer, 'name', renderer)
+    route_name = info.options.get('route_name')
+    if (not ctx.validate_response or route_name is None or
+            renderer_name not in ctx.renderer_validation or
+            ctx.is_bypassed(route_name)):
+        return view
+
+    def validator_view(context, request):
+        result = view(context, request)
+        route = request.matched_route
+        if (route is None or IResponse.providedBy(result) or
+                getattr(request, 'exception', None) is not None):
+            return result
+        plan = ctx.get_route_plan(route, request.method)
+        if plan:
+            ctx.validate_renderer_data(request, plan, result)
+        return result
+    return validator_view
+
+
+def _get_response_schema(plan, status_code, media_type, validates=True):
+    responses_obj = plan.op_obj['responses']
+    res_obj = responses_obj.get(
+        str(status_code), responses_obj.get('default'))
+    if res_obj is None:
+        raise ValidationErrors(ValidationError(
+            'invalid response status code'))
+    if not validates:
+        return None
+    content_prop = res_obj.get('content')
+    if content_prop is None:
+        raise ValidationErrors(ValidationError(
+            'response content is not defined'))
+    return (content_prop.get(media_type) or {}).get('schema')
+
+
+def _check_security(plan, request):
+    if not plan.security:
         return
     if request.authenticated_userid is None:
         raise HTTPUnauthorized
 
 
+def _timed(inst, request, operation, stage, func, *args):
+    if inst is None:
+        return func(*args)
+    started = inst.start(request, operation, stage)
+    try:
+        return func(*args)
+    finally:
+        inst.end(request, operation, stage, started)
+
+
 def _validate_and_parse(
-        Validator, resolver, request, path_matches, op_obj, fill_by_default):
-    params, queries = {}, {}
-    if request.query_string:
-        try:
-            queries = parse_qs(request.query_string,
-                               keep_blank_values=True, strict_parsing=True)
-        except Exception:
-            raise HTTPBadRequest('cannot parse query string')
-    for param_obj in op_obj.get('parameters', []):
+        plan, request, path_matches, json_loads,
+        chunk_size=DEFAULT_CHUNK_SIZE, inst=None, properties=None):
+    name = plan.name
+    queries = _timed(inst, request, name, 'query', _parse_query, request)
+    params = _timed(
+        inst, request, name, 'params', _validate_and_parse_params,
+        plan, request, path_matches, queries)
+
+    reqbody = plan.request_body
+    if not reqbody:
+        return params, None
+    stream = reqbody.line_streams.get(request.content_type, reqbody.stream)
+    if stream is not None:
+        return params, _timed(
+            inst, request, name, 'body_stream', _validate_and_parse_stream,
+            plan, request, stream, json_loads, chunk_size)
+    body, is_json = _timed(
+        inst, request, name, 'body_decode', _decode_body,
+        reqbody, request, json_loads, properties)
+    if is_json and reqbody.json_validator is not None:
+        body = _timed(
+            inst, request, name, 'body_validate',
+            _validate_body, plan, body)
+    return params, body
+
+
+def _parse_query(request):
+    if not request.query_string:
+        return {}
+    try:
+        return parse_qs(request.query_string,
+                        keep_blank_values=True, strict_parsing=True)
+    except Exception:
+        raise HTTPBadRequest('cannot parse query string')
+
+
+def _validate_and_parse_params(plan, request, path_matches, queries):
+    params = {}
+    for param in plan.parameters:
         params.update(_validate_and_parse_param(
-            Validator, request, param_obj, path_matches, queries,
-            fill_by_default))
-
-    body = None
-    reqbody = op_obj.get('requestBody')
-    if reqbody:
-        if '$ref' in reqbody:
-            _, reqbody = resolver.resolve(reqbody['$ref'])
-        required = reqbody.get('required', False)
-        body = request.body
-        if required and not body:
+            param, request, path_matches, queries, plan.max_errors))
+    return params
+
+
+def _decode_body(reqbody, request, json_loads, properties=None):
+    body = request.body
+    if reqbody.required and not body:
+        raise ValidationErrors(ValidationError('body is required'))
+    if (body and not _validate_media_types(
+            request.content_type, reqbody.media_types)):
+        raise HTTPNotAcceptable
+    if not (reqbody.accepts_json and body):
+        return body, False
+    try:
+        body = json_loads(body)
+    except Exception:
+        raise ValidationErrors(ValidationError('invalid json'))
+    if properties is not None:
+        _share_json_body(properties, body)
+    return body, True
+
+
+def _validate_body(plan, body):
+    return plan.request_body.json_validator.validate_result(
+        body, max_errors=plan.max_errors).raise_for_errors()
+
+
+def _validate_and_parse_stream(plan, request, stream, json_loads, chunk_size):
+    # request.body を読まずに body_file からチャンク単位で読み込んで検証する
+    reqbody = plan.request_body
+    if not request.content_length and not request.is_body_readable:
+        if reqbody.required:
             raise ValidationErrors(ValidationError('body is required'))
-        accept_types = set(reqbody.get('content', {}).keys())
-        if (body and
-                not _validate_media_types(request.content_type, accept_types)):
-            raise HTTPNotAcceptable
-        media_type_obj = reqbody.get('content', {}).get(MIME_JSON)
-        if media_type_obj is not None and body:
-            try:
-                body = json.loads(body.decode('utf8'))
-            except Exception:
-                raise ValidationErrors(ValidationError('invalid json'))
-            json_schema = media_type_obj.get('schema')
-            if json_schema:
-                body = _validate(Validator, json_schema, body)
-    return params, body
+        return None
+    if not _validate_media_types(request.content_type, reqbody.media_types):
+        raise HTTPNotAcceptable
+    items = iter_validated(
+        stream, iter_chunks(request.body_file, chunk_size),
+        plan.max_errors, json_loads)
+    if stream.lazy:
+        return items
+    return list(items)
+
+
+def _share_json_body(properties, body):
+    # 検証は copy-on-write で元のオブジェクトを変更しないので、
+    # デコード結果をそのまま request.json_body として再利用する
+    def json_body(_):
+        return body
+    properties.add_property(json_body, reify=True)
 
 
 def _validate_media_types(media_type, media_types):
@@ -166,104 +665,66 @@ def _validate_media_types(media_type, media_types):
 
 
 def _validate_and_parse_param(
-        Validator, request, param_obj, path_matches, queries, fill_by_default):
-    if param_obj.get('allowEmptyValue', False):
+        param, request, path_matches, queries, max_errors=None):
+    if param.unsupported:
         raise NotImplementedError  # pragma: no cover
-    in_, name, schema, value = (
-        param_obj['in'], param_obj['name'], param_obj.get('schema'), None)
-    style = param_obj.get(
-        'style', 'form' if in_ in ('query', 'cookie') else 'simple')
-    explode = param_obj.get('explode', True if style == 'form' else False)
-    type_tries = set()
-    if not schema:
-        typ = 'object'
-    elif 'type' in schema:
-        typ = schema['type']
-    else:
-        # QUICKHACK(kazuki): プリミティブ型のoneOf/anyOfのみ許容する
-        def _check_subschemas(s):
-            st = s.get('type')
-            if st is not None:
-                if st in ('integer', 'number', 'string', 'boolean'):
-                    type_tries.add(st)
-                    return st
-                raise NotImplementedError
-            ss_list = s.get('oneOf', s.get('anyOf'))
-            if not ss_list:
-                raise NotImplementedError
-            for ss in ss_list:
-                t = _check_subschemas(ss)
-            return t
-        typ = _check_subschemas(schema)
-        if typ is None:
-            raise NotImplementedError
-
-    if style in ('matrix', 'label', 'spaceDelimited', 'pipeDelimited'):
-        raise NotImplementedError  # pragma: no cover
-
+    in_, name, value = param.in_, param.name, None
     if in_ == 'path':
         value = path_matches[name]  # always successful
     elif in_ == 'query':
-        if style == 'form' and typ == 'object' and explode:
-            raise NotImplementedError  # pragma: no cover
-        if style == 'deepObject':
+        if param.deep_object:
             value = {}
+            prefix = param.deep_object_prefix
             for k, v in queries.items():
-                if k.startswith(name + '[') and k[-1] == ']':
-                    value[k[len(name)+1:-1]] = v[0]
+                if k.startswith(prefix) and k[-1] == ']':
+                    value[k[len(prefix):-1]] = v[0]
             if not value:
                 value = None
-        else:
-            if name in queries:
-                value = queries[name]
-                if not (style == 'form' and explode and typ == 'array'):
-                    value = value[0]
-            elif schema and fill_by_default and 'default' in schema:
-                return {name: schema['default']}
+        elif name in queries:
+            value = queries[name]
+            if not param.keep_list:
+                value = value[0]
+        elif param.has_default:
+            return {name: copy_default(param.default)}
     elif in_ == 'header' and name in request.headers:
         value = request.headers[name]
-    elif in_ == 'cookie':  # pragma: no cover
-        raise NotImplementedError
-    if param_obj.get('required', False) and value is None:
+    if param.required and value is None:
         raise ValidationErrors(ValidationError(
             'required parameter "{}" is not found in {}'.format(name, in_)))
     if value is None:
         return {}
 
-    if not type_tries:
-        type_tries.add(typ)
-
     errors = []
-    for typ in type_tries:
-        if not isinstance(value, dict):
+    for typ, style_converter, type_converter in param.decoders:
+        converted = value
+        if not isinstance(converted, dict):
             try:
-                value = _convert_style(style, explode, typ, value)
+                converted = style_converter(converted)
             except Exception as e:
                 errors.append(StyleError(
                     'invalid style of "{}": {}'.format(name, e)))
                 continue
-        if schema:
+        if type_converter is not None:
             try:
-                value = _convert_type(schema, value, default_type=typ)
+                converted = type_converter(converted)
             except Exception as e:
                 errors.append(ValueError(
                     'invalid value of "{}": {}'.format(name, e)))
                 continue
             try:
-                value = _validate(Validator, schema, value)
+                result = param.validator.validate_result(
+                    converted, max_errors=max_errors)
             except Exception as e:
                 errors.append(e)
                 continue
-        return {name: value}
+            if not result:
+                errors.append(ValidationErrors(result.errors))
+                continue
+            converted = result.instance
+        return {name: converted}
     raise ValidationErrors(errors)
 
 
-def _validate(Validator, schema, instance):
-    validator = Validator(schema)
-    new_instance, _ = validator.validate(instance)
-    return new_instance
-
-
 class ResponseValidationError(Exception):
     def __init__(self, response, exception):
         self.response = response
@@ -271,24 +732,26 @@ class ResponseValidationError(Exception):
 
 
 def apply_reviver(obj, reviver):
-    obj = _apply_reviver(obj, reviver)
-    obj = reviver('', obj)
-    if obj == UNDEFINED:
+    obj = reviver('', _apply_reviver(obj, reviver))
+    if obj is UNDEFINED:
         raise RuntimeError('reviver cannot remove root object')
     return obj
 
 
 def _apply_reviver(obj, reviver):
+    # 削除された要素は UNDEFINED との同一性で判定する (__eq__ を呼ばない)
     if isinstance(obj, dict):
-        return {
-            k: v for k, v in [
-                (k, reviver(k, _apply_reviver(v, reviver)))
-                for k, v in obj.items()]
-            if v != UNDEFINED}
+        ret = {}
+        for k, v in obj.items():
+            v = reviver(k, _apply_reviver(v, reviver))
+            if v is not UNDEFINED:
+                ret[k] = v
+        return ret
     if isinstance(obj, list):
-        return [
-            v for v in [
-                reviver(k, _apply_reviver(v, reviver))
-                for k, v in enumerate(obj)]
-            if v != UNDEFINED]
+        ret = []
+        for k, v in enumerate(obj):
+            v = reviver(k, _apply_reviver(v, reviver))
+            if v is not UNDEFINED:
+                ret.append(v)
+        return ret
     return obj
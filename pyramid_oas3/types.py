@@ -10,92 +10,135 @@ def _is_primitive_type(type_name):
         type_name == 'boolean')
 
 
-def _convert_style(style, explode, typ, value):
+def _style_raw(value):
+    return value
+
+
+def _style_array(value):
+    return value.split(',')
+
+
+def _style_object_explode(value):
+    tmp = value.split(',')
+    value = {}
+    for t in tmp:
+        k, v = parse_qsl(
+            t, keep_blank_values=True, strict_parsing=True)[0]
+        value[k] = v
+    return value
+
+
+def _style_object(value):
+    tmp = value.split(',')
+    value = {}
+    for i in range(0, len(tmp), 2):
+        value[tmp[i]] = tmp[i + 1]
+    return value
+
+
+_STYLE_MAPPING = {
+    ('simple', 'string'): _style_raw,
+    ('simple', 'array'): _style_array,
+    ('simple', 'object', True): _style_object_explode,
+    ('simple', 'object', False): _style_object,
+    ('form', 'string'): _style_raw,
+    ('form', 'array', True): _style_raw,
+    ('form', 'array', False): _style_array,
+    ('form', 'object', False): _style_object,
+}
+
+
+def _raise_error(exc):
+    def _raise(value):
+        raise exc
+    return _raise
+
+
+def _compile_style(style, explode, typ):
     if _is_primitive_type(typ):
         typ = 'string'
-    mapping = {
-        ('simple', 'string'): 0,
-        ('simple', 'array'): 1,
-        ('simple', 'object', True): 2,
-        ('simple', 'object', False): 3,
-        ('form', 'string'): 0,
-        ('form', 'array', True): 0,
-        ('form', 'array', False): 1,
-        ('form', 'object', False): 3,
-    }
-    method = mapping.get((style, typ, explode))
+    method = _STYLE_MAPPING.get((style, typ, explode))
     if method is None:
-        method = mapping.get((style, typ))
+        method = _STYLE_MAPPING.get((style, typ))
         if method is None:
-            raise NotImplementedError  # pragma: no cover
-    if method == 0:
-        return value
-    elif method == 1:
-        return value.split(',')
-    elif method == 2:
-        tmp = value.split(',')
-        value = {}
-        for t in tmp:
-            k, v = parse_qsl(
-                t, keep_blank_values=True, strict_parsing=True)[0]
-            value[k] = v
-        return value
-    elif method == 3:
-        tmp = value.split(',')
-        value = {}
-        for i in range(0, len(tmp), 2):
-            value[tmp[i]] = tmp[i + 1]
-        return value
-    raise NotImplementedError('style={}, explode={}, type={}'.format(
-        style, explode, typ))  # pragma: no cover
+            return _raise_error(NotImplementedError(
+                'style={}, explode={}, type={}'.format(
+                    style, explode, typ)))  # pragma: no cover
+    return method
 
 
-def _convert_type(schema, value, default_type='object'):
+def _convert_style(style, explode, typ, value):
+    return _compile_style(style, explode, typ)(value)
+
+
+def _to_boolean(value):
+    value = value.lower()
+    if value == 'true':
+        return True
+    elif value == 'false':
+        return False
+    else:
+        raise ValueError('invalid value')
+
+
+def _compile_type(schema, default_type='object'):
     typ = schema.get('type', default_type)
     fmt = schema.get('format')
     if typ == 'string':
-        return value
+        return _style_raw
     elif typ == 'boolean':
-        value = value.lower()
-        if value == 'true':
-            return True
-        elif value == 'false':
-            return False
-        else:
-            raise ValueError('invalid value')
+        return _to_boolean
     elif typ == 'integer':
-        value = int(value)
         if fmt is None:
-            return value
+            return int
         elif fmt == 'int32':
             rang = (-2**31, 2**31 - 1)
         elif fmt == 'int64':
             rang = (-2**63, 2**63 - 1)
         else:
-            raise ValueError('invalid integer format')  # pragma: no cover
-        if value < rang[0] or value > rang[1]:
-            raise ValueError('out of range')
-        return value
+            return _raise_error(
+                ValueError('invalid integer format'))  # pragma: no cover
+
+        def _to_integer(value):
+            value = int(value)
+            if value < rang[0] or value > rang[1]:
+                raise ValueError('out of range')
+            return value
+        return _to_integer
     elif typ == 'number':
-        return float(value)
+        return float
     elif typ == 'object':
         props = schema.get('properties', {})
-        for pn, ps in props.items():
-            if pn in value:
-                value[pn] = _convert_type(ps, value[pn])
+        converters = [(pn, _compile_type(ps)) for pn, ps in props.items()]
         aprops = schema.get('additionalProperties', True)
+        aprops_converter = None
         if isinstance(aprops, dict):
-            others = set(value.keys()) - set(props.keys())
-            for k in others:
-                value[k] = _convert_type(aprops, value[k])
-        return value
+            aprops_converter = _compile_type(aprops)
+
+        def _to_object(value):
+            for pn, converter in converters:
+                if pn in value:
+                    value[pn] = converter(value[pn])
+            if aprops_converter is not None:
+                for k in set(value.keys()) - set(props.keys()):
+                    value[k] = aprops_converter(value[k])
+            return value
+        return _to_object
     elif typ == 'array':
-        item_schema = schema['items']
-        if isinstance(item_schema, dict):
+        item_schema = schema.get('items')
+        if not isinstance(item_schema, dict):
+            return _raise_error(ValueError(
+                'array items is must be dict'))  # pragma: no cover
+        item_converter = _compile_type(item_schema)
+
+        def _to_array(value):
             for i in range(len(value)):
-                value[i] = _convert_type(item_schema, value[i])
-        else:
-            raise ValueError('array items is must be dict')  # pragma: no cover
-        return value
+                value[i] = item_converter(value[i])
+            return value
+        return _to_array
     else:
-        raise ValueError('invalid type')  # pragma: no cover
+        return _raise_error(ValueError('invalid type'))  # pragma: no cover
+
+
+def _convert_type(schema, value, default_type='object'):
+    return _compile_type(schema, default_type)(value)
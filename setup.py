@@ -30,4 +30,9 @@ setup(
     install_requires=_load_lines('requirements.txt'),
     tests_requires=_load_lines('test-requirements.txt'),
     test_suite='nose2.collector.collector',
+    entry_points={
+        'console_scripts': [
+            'pyramid-oas3-codegen = pyramid_oas3.codegen:main',
+        ],
+    },
 )
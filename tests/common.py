@@ -10,15 +10,24 @@ from webtest import TestApp
 from pyramid_oas3 import ValidationErrors, ResponseValidationError
 
 
-def create_webapp(schema_name, patterns, func=None, settings=None):
+def load_schema(schema_name):
     import yaml
-    temp = settings
     with open(os.path.join(
             os.path.dirname(__file__), '{}.yaml'.format(schema_name))) as f:
-        yaml_text = f.read()
+        return yaml.load(f.read())
+
+
+def create_traffic(schema_name, seed=0, **kwargs):
+    # スキーマから生成したリクエスト (GeneratedRequest.send(app) で送信する)
+    from pyramid_oas3.traffic import RequestGenerator
+    return RequestGenerator(load_schema(schema_name), seed=seed, **kwargs)
+
+
+def create_webapp(schema_name, patterns, func=None, settings=None):
+    temp = settings
     settings = {
         'pyramid.includes': 'pyramid_oas3',
-        'pyramid_oas3.schema': yaml.load(yaml_text),
+        'pyramid_oas3.schema': load_schema(schema_name),
     }
     if temp:
         settings.update(temp)
@@ -0,0 +1,36 @@
+import threading
+import unittest
+
+from pyramid_oas3 import ResponseValidationError
+from pyramid_oas3.background import BackgroundValidator
+
+
+class BackgroundValidatorTests(unittest.TestCase):
+    def test_sink(self):
+        failures = []
+        background = BackgroundValidator(
+            2, sink=lambda request, exc: failures.append((request, exc)))
+
+        def fail(v):
+            raise ResponseValidationError(None, ValueError(v))
+        for i in range(4):
+            self.assertTrue(background.submit(i, fail, i))
+        background.submit(4, lambda: None)
+        background.join()
+        self.assertEqual(sorted(r for r, _ in failures), [0, 1, 2, 3])
+        self.assertEqual((background.submitted, background.failed), (5, 4))
+
+    def test_backpressure(self):
+        started, release = threading.Event(), threading.Event()
+
+        def block():
+            started.set()
+            release.wait()
+        background = BackgroundValidator(1, queue_size=1)
+        background.submit(None, block)
+        started.wait()
+        self.assertTrue(background.submit(None, lambda: None))
+        self.assertFalse(background.submit(None, lambda: None))
+        release.set()
+        background.join()
+        self.assertEqual((background.submitted, background.dropped), (2, 1))
@@ -0,0 +1,47 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from benchmarks import runner
+from benchmarks.__main__ import main
+from benchmarks.cases import CASES
+
+
+class BenchmarkTests(unittest.TestCase):
+    def test_cases(self):
+        # 各ケースが例外なく実行できることのみを確認する
+        for name, setup in sorted(CASES.items()):
+            setup()()
+
+    def test_compare(self):
+        base = {'results': {
+            'a': {'median': 1.0}, 'b': {'median': 1.0},
+            'c': {'median': 1.0}}}
+        now = {'results': {
+            'a': {'median': 1.05}, 'b': {'median': 1.5},
+            'c': {'median': 0.5}, 'd': {'median': 1.0}}}
+        self.assertEqual(
+            [(row[0], row[4]) for row in runner.compare(base, now)],
+            [('a', 'same'), ('b', 'regression'), ('c', 'improvement'),
+             ('d', 'new')])
+
+    def test_main(self):
+        # 結果の表は出力せずに捕捉する (テストの出力を汚さない)
+        out, err = io.StringIO(), io.StringIO()
+        with tempfile.TemporaryDirectory() as d, \
+                contextlib.redirect_stdout(out), \
+                contextlib.redirect_stderr(err):
+            path = os.path.join(d, 'result.json')
+            args = ['types.convert_type', '--repeat', '1',
+                    '--min-time', '0.001', '-o', path]
+            self.assertEqual(main(args), 0)
+            with open(path) as f:
+                result = json.load(f)
+            self.assertEqual(list(result['results']), ['types.convert_type'])
+            self.assertEqual(
+                main(args[:-2] + ['-b', path, '--threshold', '1000']), 0)
+        self.assertIn('types.convert_type', out.getvalue())
+        self.assertIn('status', err.getvalue())
@@ -1,9 +1,18 @@
-from base64 import b64decode
+from base64 import b64decode, b64encode
 from datetime import date, datetime, timezone
+import copy
+import json
+import math
 import pickle
 import unittest
+from unittest import mock
+
+from nose2.tools import params
+from pyramid.request import Request
+from pyramid.response import Response
 
 from pyramid_oas3 import ValidationErrors
+from pyramid_oas3.json_backend import _with_fallback, resolve_json_loads
 from .common import create_webapp, get_last_exception
 
 
@@ -27,6 +36,9 @@ class BodyTests(unittest.TestCase):
                 '/test_empty0',
                 '/test_empty1',
                 '/test_empty2',
+                '/test_check_only',
+                '/test_max_errors',
+                '/test_stream',
             ], settings={'pyramid_oas3.fill_by_default': True})
 
     def _post(self, url, body, **kwargs):
@@ -92,6 +104,31 @@ class BodyTests(unittest.TestCase):
         self.assertEqual(m1, self._post(
             '/test_fill_dict_ref', m0, status=200))
 
+    @params(False, True)
+    def test_fill_mutable(self, compact_spec):
+        # ビューで default 値を変更しても以降のリクエストに影響しない
+        received = []
+
+        def view(request):
+            body = request.oas3_body
+            received.append(copy.deepcopy(body))
+            body['tags'].append('MUTATED')
+            body['options']['sizes'].append(2)
+            return Response()
+
+        def add_view(config):
+            config.add_route('mutable', '/test_fill_mutable')
+            config.add_view(view, route_name='mutable')
+
+        app = create_webapp('test_body', [], add_view, settings={
+            'pyramid_oas3.fill_by_default': True,
+            'pyramid_oas3.compact_spec': compact_spec,
+        })
+        for _ in range(2):
+            app.post_json('/test_fill_mutable', {})
+        expected = {'tags': ['a'], 'options': {'sizes': [1]}}
+        self.assertEqual(received, [expected, expected])
+
     def test_oneOf_error(self):
         self._post('/test_oneOf_error', 123, status=400)
         exc = get_last_exception()
@@ -138,9 +175,150 @@ class BodyTests(unittest.TestCase):
                       [('Content-Type', 'application/json')], status=400)
         self.app.post('/test_empty0', '', [], status=200)
 
+    def test_check_only(self):
+        m = {'created': '2017-07-26'}
+        self.assertEqual(m, self._post('/test_check_only', m, status=200))
+        self._post('/test_check_only', {'created': 'hoge'}, status=400)
+
+    def test_max_errors(self):
+        self._post('/test_max_errors', ['a', {'foo': 1}], status=200)
+        self._post('/test_max_errors', [1, 2, 3, 4, 5, 6], status=400)
+        exc = get_last_exception()
+        self.assertEqual(len(exc.errors), 2)
+        self.assertEqual(len(exc.errors[0].context), 2)
+
+    def test_stream(self):
+        m = [{'id': 1, 'created': '2017-07-26'}, {'id': 2}]
+        self.assertEqual(
+            [{'id': 1, 'created': date(2017, 7, 26)}, {'id': 2}],
+            self._post('/test_stream', m, status=200))
+        self._post('/test_stream', [], status=400)
+        self._post('/test_stream', [{'id': 1}] * 4, status=400)
+        self._post('/test_stream', {'id': 1}, status=400)
+        self._post('/test_stream', [{'id': 1}, {'id': 'x'}], status=400)
+        exc = get_last_exception()
+        self.assertEqual(list(exc.errors[0].path), [1, 'id'])
+        self.app.post('/test_stream', b'[{"id": 1}', status=400,
+                      content_type='application/json')
+        ret = self.app.post('/test_stream', b'', status=200)
+        self.assertIsNone(pickle.loads(b64decode(ret.body))[1])
+
     def test_invalid_json(self):
         self.app.post(
             '/test_simple',
             params=b'{""test"": "hoge"}',
             status=400,
             content_type='application/json')
+
+
+class JSONBackendTests(unittest.TestCase):
+    def _create(self, backend):
+        def view(request):
+            # oas3_data/oas3_body/json_body はまとめて設定される
+            self.assertEqual(
+                len(type(request).__mro__), len(Request.__mro__) + 1)
+            return Response(b64encode(pickle.dumps(
+                (request.oas3_body, request.json_body,
+                 request.json_body is request.json_body))))
+
+        def setup(config):
+            config.add_route('simple', '/test_simple')
+            config.add_view(view, route_name='simple')
+        return create_webapp('test_body', [], func=setup, settings={
+            'pyramid_oas3.json_backend': backend})
+
+    def test_shared_json_body(self):
+        calls = []
+
+        def loads(body):
+            calls.append(body)
+            return json.loads(body)
+        now = datetime.now(timezone.utc)
+        m = {'foo': 'bar', 'hoge': 123, 'created': now.isoformat()}
+        ret = self._create(loads).post_json('/test_simple', m, status=200)
+        oas3_body, json_body, same = pickle.loads(b64decode(ret.body))
+        self.assertEqual(oas3_body['created'], now)
+        self.assertEqual(json_body, m)
+        self.assertTrue(same)
+        self.assertEqual(len(calls), 1)
+        self.assertIsInstance(calls[0], bytes)
+
+    def test_resolve(self):
+        self.assertIs(resolve_json_loads('json'), json.loads)
+        self.assertIs(resolve_json_loads('json.loads'), json.loads)
+        self.assertIs(resolve_json_loads(json.loads), json.loads)
+        self.assertTrue(callable(resolve_json_loads()))
+        self.assertEqual(resolve_json_loads('auto')(b'[1]'), [1])
+        with self.assertRaises(ValueError):
+            resolve_json_loads('pyramid_oas3.plan.MIME_JSON')
+        self._create('json').post(
+            '/test_simple', params=b'{', status=400,
+            content_type='application/json')
+
+    def test_fallback(self):
+        # 標準ライブラリでの再試行は NaN/Infinity や巨大な整数の場合のみ
+        calls = []
+
+        def fast(body):
+            calls.append(body)
+            if b'1' * 30 in body:
+                raise ValueError('Integer exceeds 64-bit range')
+            raise ValueError('unexpected character')
+        loads = _with_fallback(fast)
+        self.assertTrue(math.isnan(loads(b'[NaN]')[0]))
+        self.assertEqual(loads(b'[-Infinity]'), [-math.inf])
+        self.assertEqual(loads(b'[' + b'1' * 30 + b']'), [int('1' * 30)])
+        with mock.patch('json.loads') as json_loads:
+            with self.assertRaises(ValueError):
+                loads(b'{"a": 1')
+            self.assertFalse(json_loads.called)
+        self.assertEqual(len(calls), 4)
+
+
+class StreamTests(unittest.TestCase):
+    def setUp(self):
+        def view(request):
+            items = []
+            try:
+                for item in request.oas3_body:
+                    items.append(item)
+            except ValidationErrors as e:
+                error = e.errors[0]
+                return Response('{}:{}:{}'.format(
+                    len(items), list(error.path), error.message))
+            return Response(str(len(items)))
+
+        def setup(config):
+            config.add_route('stream', '/test_stream_iter')
+            config.add_view(view, route_name='stream')
+            config.add_route('ndjson', '/test_ndjson')
+            config.add_view(view, route_name='ndjson')
+        self.app = create_webapp('test_body', [], func=setup, settings={
+            'pyramid_oas3.stream_chunk_size': '3'})
+
+    def test_iterator(self):
+        ret = self.app.post_json('/test_stream_iter', [{'id': 1}, {'id': 2}])
+        self.assertEqual(ret.text, '2')
+        ret = self.app.post_json(
+            '/test_stream_iter', [{'id': 1}, {'id': 'x'}, {'id': 3}])
+        self.assertTrue(ret.text.startswith("1:[1, 'id']:"))
+        self.app.post('/test_stream_iter', status=400)
+
+    def test_ndjson(self):
+        def post(body, **kwargs):
+            return self.app.post(
+                '/test_ndjson', body, content_type='application/x-ndjson',
+                **kwargs)
+        self.assertEqual(post(b'{"id": 1}\n{"id": 2}\n').text, '2')
+        self.assertEqual(post(b'{"id": 1}\r\n{"id": 2}').text, '2')
+        self.assertTrue(post(
+            b'{"id": 1}\n{"id": 2}\n{"id": "x"}\n'
+        ).text.startswith("2:[2, 'id']:"))
+        self.assertEqual(post(b'{"id": 1}\n\n  \n{"id": 2}\n\n').text, '2')
+        self.assertTrue(post(
+            b'{"id": 1}\n\n{"id": "x"}\n'
+        ).text.startswith("1:[1, 'id']:"))
+        self.assertIn('record 1:', post(b'{"id": 1}\n\n{"id"\n').text)
+        post(b'', status=400)
+        self.app.post('/test_ndjson', b'{"id": "x"}',
+                      content_type='text/plain', status=200)
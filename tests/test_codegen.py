@@ -0,0 +1,197 @@
+from base64 import b64decode
+import copy
+import datetime
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import types
+import unittest
+
+from nose2.tools import params
+
+from pyramid_oas3 import codegen
+from pyramid_oas3.compact import FrozenDict, FrozenList
+from pyramid_oas3.interfaces import IOAS3Context
+from pyramid_oas3.jsonschema import OAS3Validator, Resolver
+from pyramid_oas3.jsonschema._utils import BudgetExhausted, ErrorList
+from pyramid_oas3.traffic import InstanceGenerator
+from .common import create_webapp, load_schema
+
+
+def _load(source):
+    module = types.ModuleType('generated')
+    exec(compile(source, 'generated', 'exec'), module.__dict__)
+    return module
+
+
+def _run(check, instance, limit):
+    errors = ErrorList(limit)
+    try:
+        ret = check(instance, errors)
+    except BudgetExhausted:
+        ret = instance
+    except Exception as e:
+        return type(e).__name__, False, []
+    return ret, ret is instance, [e.as_dict() for e in errors]
+
+
+class CodegenTests(unittest.TestCase):
+    @params(
+        ('test_codegen', False), ('test_codegen', True),
+        ('test_body', True), ('test_nullable', False),
+        ('test_nullable', True))
+    def test_equivalence(self, name, fill_by_default):
+        # 生成した関数はクロージャに変換したものと同じ結果・エラーを返す
+        module = _load(codegen.generate(load_schema(name), fill_by_default))
+        resolver = Resolver('', module.SCHEMA)
+        generator = InstanceGenerator(module.SCHEMA, seed=0)
+        for table, kwargs in (
+                (module.CONVERT, {'fill_by_default': fill_by_default}),
+                (module.CHECK, {'check_only': True})):
+            self.assertTrue(table)
+            for index, func in table.items():
+                schema = module.NODES[index]
+                validator = OAS3Validator(
+                    schema, resolver=resolver, compiled={}, **kwargs)
+                instances = [None, 1, 'x', [], {}, True, 1.5, '2020-01-01']
+                for _ in range(3):
+                    for generate in (
+                            generator.generate, generator.generate_invalid):
+                        try:
+                            instances.append(generate(schema))
+                        except Exception:
+                            pass
+                for instance, limit in (
+                        (i, limit) for i in instances for limit in (None, 1)):
+                    self.assertEqual(
+                        _run(func, copy.deepcopy(instance), limit),
+                        _run(validator._check, copy.deepcopy(instance), limit),
+                        (index, instance))
+
+    def test_default_copy(self):
+        # list/dict の default 値はリクエストごとに複製する
+        module = _load(codegen.generate(load_schema('test_codegen'), True))
+        item = module.SCHEMA['components']['schemas']['Item']
+        check = module.CONVERT[module.NODES.index(item)]
+        first = check({'name': 'a'}, ErrorList(None))
+        first['aliases'].append('MUTATED')
+        second = check({'name': 'a'}, ErrorList(None))
+        self.assertEqual(second['aliases'], ['a'])
+        self.assertIs(type(second['aliases']), list)
+        # default: null もキーが無ければ設定する
+        self.assertIsNone(second['memo'])
+        self.assertIn('memo', second)
+
+    def test_node_table(self):
+        # 参照の解決と変換は生成時に済ませ、読み込み時はノードの表を作るだけ
+        spec = load_schema('test_codegen')
+        module = _load(codegen.generate(spec))
+        self.assertFalse(hasattr(module, 'SPEC'))
+        self.assertEqual(
+            [id(node) for node in codegen.index_nodes(module.SCHEMA)],
+            [id(node) for node in module.NODES])
+        self.assertTrue(all(
+            type(node) is FrozenDict for node in module.NODES))
+        self.assertIs(type(module.SCHEMA['servers']), FrozenList)
+        item = module.SCHEMA['components']['schemas']['Item']
+        self.assertIs(item['properties']['children']['items'], item)
+
+        # 読み込み時に定義から作成した場合と同じ内容・参照関係になる
+        _, nodes = codegen.prepare(spec, len(module.NODES))
+
+        def shape(table):
+            ids = {id(node): i for i, node in enumerate(table)}
+
+            def value(v):
+                if isinstance(v, dict):
+                    return ids[id(v)]
+                if isinstance(v, list):
+                    return [value(x) for x in v]
+                return v
+            return [{k: value(v) for k, v in node.items()} for node in table]
+        self.assertEqual(shape(module.NODES), shape(nodes))
+
+    def test_unsupported(self):
+        # 生成に対応していないノードとその祖先はクロージャでの変換に任せる
+        spec = {'components': {'schemas': {
+            'Parent': {'type': 'object', 'properties': {
+                'child': {'$ref': '#/components/schemas/Child'},
+                'name': {'type': 'string'}}},
+            'Child': {'type': 'object', 'dependencies': {'a': ['b']}},
+        }}}
+        module = _load(codegen.generate(spec))
+        schemas = module.SCHEMA['components']['schemas']
+        generated = [module.NODES[i] for i in module.CONVERT]
+        self.assertIn(schemas['Parent']['properties']['name'], generated)
+        self.assertNotIn(schemas['Parent'], generated)
+        self.assertNotIn(schemas['Child'], generated)
+        with self.assertRaises(ValueError):
+            codegen.prepare(spec, len(module.NODES) + 1)
+
+    def test_settings(self):
+        module = _load(codegen.generate(load_schema('test_codegen'), True))
+        app = create_webapp('test_codegen', ['/items/{id}'], settings={
+            'pyramid_oas3.schema': None,
+            'pyramid_oas3.compiled_module': module,
+            'pyramid_oas3.fill_by_default': True,
+        })
+        ctx = app.app.registry.getUtility(IOAS3Context)
+        item = module.SCHEMA['components']['schemas']['Item']
+        functions = set(module.CONVERT.values())
+        self.assertIn(ctx.Validator(item)._check, functions)
+        plan = ctx.get_operation_plan('/items/{id}', 'get')
+        self.assertIn(plan.parameters[0].validator._check, functions)
+
+        ret = app.post_json('/items/1', {
+            'name': 'abc', 'created': '2020-01-02T03:04:05Z'})
+        body = pickle.loads(b64decode(ret.body))[1]
+        self.assertEqual(body['count'], 3)
+        self.assertEqual(body['kind'], 'normal')
+        self.assertEqual(body['created'], datetime.datetime(
+            2020, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc))
+        app.post_json('/items/1', {'name': 'ABC'}, status=400)
+        app.get('/items/1?tags=a&tags=b')
+        app.get('/items/1?tags=a&tags=a', status=400)
+
+        with self.assertRaisesRegex(Exception, 'fill_by_default'):
+            create_webapp('test_codegen', ['/items/{id}'], settings={
+                'pyramid_oas3.compiled_module': module,
+            })
+
+        # 文字列の設定値も bool として扱う
+        module = _load(codegen.generate(load_schema('test_codegen'), False))
+        app = create_webapp('test_codegen', ['/items/{id}'], settings={
+            'pyramid_oas3.compiled_module': module,
+            'pyramid_oas3.fill_by_default': 'false',
+        })
+        ret = app.post_json('/items/1', {'name': 'abc'})
+        self.assertNotIn('count', pickle.loads(b64decode(ret.body))[1])
+        # 生成していないスキーマの検証も設定に従う
+        ctx = app.app.registry.getUtility(IOAS3Context)
+        schema = {'type': 'object', 'properties': {'a': {'default': 1}}}
+        self.assertEqual(
+            ctx.Validator(schema)._check({}, ErrorList(None)), {})
+
+    def test_main(self):
+        path = os.path.join(os.path.dirname(__file__), 'test_codegen.yaml')
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'validators.py')
+            self.assertEqual(codegen.main(
+                [path, '-o', output, '--fill-by-default']), 0)
+            with open(output, encoding='utf-8') as f:
+                module = _load(f.read())
+        self.assertTrue(module.FILL_BY_DEFAULT)
+        self.assertIn('Item', module.SCHEMA['components']['schemas'])
+
+    def test_run_module(self):
+        # パッケージの読み込みで codegen が import されていると
+        # python -m の実行時に RuntimeWarning が出力される
+        path = os.path.join(os.path.dirname(__file__), 'test_codegen.yaml')
+        ret = subprocess.run(
+            [sys.executable, '-W', 'error::RuntimeWarning', '-m',
+             'pyramid_oas3.codegen', path],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.assertEqual(ret.returncode, 0, ret.stderr)
+        self.assertIn(b'CONVERT = {', ret.stdout)
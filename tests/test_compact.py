@@ -0,0 +1,64 @@
+import sys
+import unittest
+from unittest import mock
+
+from pyramid_oas3 import freeze
+from pyramid_oas3.compact import FrozenDict, FrozenList, compact
+from pyramid_oas3.jsonschema import OAS3Validator, Resolver
+from pyramid_oas3.resolve import dereference
+from .common import create_webapp
+from .test_snapshot import SPEC
+
+
+class CompactTests(unittest.TestCase):
+    def test_compact(self):
+        spec = dereference(SPEC, Resolver('', SPEC))
+        spec['components']['schemas']['Limit']['default'] = {'a': [1]}
+        frozen = compact(spec)
+        self.assertIsInstance(frozen, FrozenDict)
+        self.assertEqual(
+            frozen['components']['parameters'],
+            spec['components']['parameters'])
+        node = frozen['components']['schemas']['Node']
+        self.assertIs(node['properties']['children']['items'], node)
+        self.assertIs(
+            frozen['paths']['/nodes']['post']['parameters'][0]['schema'],
+            frozen['components']['schemas']['Limit'])
+        self.assertIsInstance(
+            frozen['paths']['/nodes']['post']['parameters'], FrozenList)
+        for key in node:
+            self.assertIs(key, sys.intern(key))
+
+        with self.assertRaises(TypeError):
+            node['type'] = 'array'
+        with self.assertRaises(TypeError):
+            node.update(type='array')
+        with self.assertRaises(TypeError):
+            frozen['paths']['/nodes']['post']['parameters'].append({})
+        default = frozen['components']['schemas']['Limit']['default']
+        self.assertIsInstance(default, FrozenDict)
+        self.assertIsInstance(default['a'], FrozenList)
+
+        v = OAS3Validator(node)
+        self.assertTrue(v.is_valid({'children': [{'value': 1}]}))
+        self.assertFalse(v.is_valid({'children': [{'value': 101}]}))
+
+    def test_settings(self):
+        app = create_webapp('test_body', ['/test_fill_ref'], settings={
+            'pyramid_oas3.compact_spec': True,
+            'pyramid_oas3.fill_by_default': True,
+        })
+        self.assertIsInstance(
+            app.app.registry.settings['pyramid_oas3.schema'], FrozenDict)
+        app.post_json('/test_fill_ref', {'hoge': 'x'})
+        app.post_json('/test_fill_ref', {'hoge': 1}, status=400)
+
+    def test_freeze(self):
+        with mock.patch('gc.freeze') as gc_freeze, \
+                mock.patch('gc.get_freeze_count', return_value=10):
+            self.assertEqual(freeze(), 10)
+            self.assertEqual(gc_freeze.call_count, 1)
+            create_webapp('test_body', ['/test_fill_ref'], settings={
+                'pyramid_oas3.gc_freeze': True,
+            })
+            self.assertEqual(gc_freeze.call_count, 2)
@@ -0,0 +1,83 @@
+import base64
+import pickle
+import unittest
+import warnings
+
+from nose2.tools import params
+from pyramid.response import Response
+
+from pyramid_oas3.interfaces import IOAS3Context
+from .common import create_webapp
+
+
+class IntegrationTests(unittest.TestCase):
+    def _create(self, integration, bypass=''):
+        return create_webapp(
+            'test_params', [
+                '/test_required',
+                '/path_test/{d0}/{d1}/{d2}/{d3}/{d4}',
+            ], settings={
+                'pyramid_oas3.integration': integration,
+                'pyramid_oas3.bypass_routes': bypass,
+            })
+
+    def _get(self, app, url, **kwargs):
+        return pickle.loads(base64.b64decode(
+            app.get(url, **kwargs).body))[0]
+
+    @params('tween', 'view')
+    def test_validation(self, integration):
+        app = self._create(integration)
+        self.assertEqual(
+            self._get(app, '/test_required?p1=A', status=200), {'p1': 'A'})
+        app.get('/test_required?p0=A', status=400)
+        path = '/path_test/foo/123/a,b,c/R,255,G,255,B,255/R=255,G=255,B=255'
+        self.assertEqual(self._get(app, path, status=200)['d1'], 123)
+
+    @params('tween', 'view')
+    def test_bypass(self, integration):
+        def setup(config):
+            config.add_route('health', '/test_required')
+            config.add_view(lambda r: Response('ok'), route_name='health')
+
+        def create(bypass):
+            return create_webapp('test_params', [], func=setup, settings={
+                'pyramid_oas3.integration': integration,
+                'pyramid_oas3.bypass_routes': bypass,
+            })
+        create('').get('/test_required?p0=A', status=400)
+        create('health').get('/test_required?p0=A', status=200)
+        create('foo health*').get('/test_required?p0=A', status=200)
+
+    @params('tween', 'view')
+    def test_unknown_methods(self, integration):
+        # 任意のメソッドでリクエストされてもキャッシュが増えない
+        def setup(config):
+            config.add_route('required', '/test_required')
+            config.add_view(lambda r: Response('ok'), route_name='required')
+
+        app = create_webapp('test_params', [], func=setup, settings={
+            'pyramid_oas3.integration': integration,
+        })
+        ctx = app.app.registry.getUtility(IOAS3Context)
+        app.get('/test_required?p0=A', status=400)
+        size = len(ctx._route_plans)
+        with warnings.catch_warnings():
+            # webtest の lint が未知のメソッドを警告する
+            warnings.simplefilter('ignore')
+            for i in range(10):
+                app.request(
+                    '/test_required?p0=A', method='X{}'.format(i), status=200)
+        self.assertEqual(len(ctx._route_plans), size)
+        self.assertIn(('required', 'get'), ctx._route_plans)
+
+    def test_unknown_integration(self):
+        with self.assertRaises(Exception):
+            self._create('unknown')
+
+    def test_dedup_report(self):
+        with self.assertLogs('pyramid_oas3', 'INFO') as cm:
+            app = self._create('tween')
+        self.assertIn('shared by structure', cm.output[0])
+        self.assertEqual(
+            self._get(app, '/test_required?p1=A', status=200), {'p1': 'A'})
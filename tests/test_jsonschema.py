@@ -0,0 +1,454 @@
+from datetime import date, datetime, timezone
+import unittest
+
+from nose2.tools import params
+
+from pyramid_oas3.jsonschema import (
+    OAS3NativeValidator, OAS3Validator, Resolver, SchemaProfiler,
+    StructureKeys, ValidatorCache, regex_cache_info)
+from pyramid_oas3.jsonschema import exceptions
+from pyramid_oas3.jsonschema._utils import UNDEFINED, prefill_regex_cache
+from pyramid_oas3.jsonschema.exceptions import ValidationErrors
+
+
+class CompiledValidatorTests(unittest.TestCase):
+    def test_empty_schema(self):
+        v = OAS3Validator({})
+        self.assertIsNone(v._check)
+        obj = {'foo': [1, 2]}
+        self.assertIs(obj, v.validate(obj)[0])
+
+    def test_type(self):
+        v = OAS3Validator({'type': 'integer'})
+        v.validate(1)
+        for invalid in (1.5, True, '1', None, [], {}):
+            self.assertFalse(v.is_valid(invalid))
+        v = OAS3Validator({'type': ['number', 'null']})
+        for valid in (1, 1.5, None):
+            v.validate(valid)
+        self.assertFalse(v.is_valid(False))
+
+    def test_nullable(self):
+        v = OAS3Validator({'type': 'string', 'nullable': True})
+        v.validate(None)
+        v.validate('foo')
+        self.assertFalse(v.is_valid(1))
+
+    def test_recursive_ref(self):
+        schema = {
+            'components': {'schemas': {'Node': {
+                'type': 'object',
+                'properties': {
+                    'value': {'type': 'string', 'format': 'date'},
+                    'children': {
+                        'type': 'array',
+                        'items': {'$ref': '#/components/schemas/Node'},
+                    },
+                },
+            }}},
+            '$ref': '#/components/schemas/Node',
+        }
+        v = OAS3Validator(schema)
+        tree = {'value': '2018-01-01', 'children': [
+            {'value': '2018-01-02', 'children': []}]}
+        new, _ = v.validate(tree)
+        self.assertEqual(new['children'][0]['value'], date(2018, 1, 2))
+        with self.assertRaises(ValidationErrors) as cm:
+            v.validate({'children': [{'children': [{'value': 1}]}]})
+        error = cm.exception.errors[0]
+        self.assertEqual(
+            list(error.path), ['children', 0, 'children', 0, 'value'])
+
+    def test_pattern_properties(self):
+        v = OAS3Validator({
+            'type': 'object',
+            'patternProperties': {
+                '^d_': {'type': 'string', 'format': 'date'}},
+            'additionalProperties': False,
+        })
+        new, _ = v.validate({'d_foo': '2018-01-01'})
+        self.assertEqual(new, {'d_foo': date(2018, 1, 1)})
+        self.assertFalse(v.is_valid({'foo': 1}))
+
+
+class NativeTests(unittest.TestCase):
+    def test_native_formats(self):
+        # 文字列から変換する場合と同じ規則で判定する
+        v = OAS3NativeValidator({'type': 'string', 'format': 'date'})
+        self.assertTrue(v.is_valid(date(2020, 1, 1)))
+        self.assertTrue(v.is_valid('2020-01-01'))
+        self.assertFalse(v.is_valid(datetime(2020, 1, 1, tzinfo=timezone.utc)))
+        v = OAS3NativeValidator({'type': 'string', 'format': 'date-time'})
+        self.assertTrue(v.is_valid(datetime(2020, 1, 1, tzinfo=timezone.utc)))
+        self.assertTrue(v.is_valid('2020-01-01T00:00:00Z'))
+        self.assertFalse(v.is_valid(datetime(2020, 1, 1)))
+        self.assertFalse(v.is_valid('2020-01-01T00:00:00'))
+        self.assertFalse(v.is_valid(date(2020, 1, 1)))
+        v = OAS3NativeValidator({'type': 'string', 'format': 'byte'})
+        self.assertTrue(v.is_valid(b'x'))
+        self.assertFalse(v.is_valid(1))
+
+
+class CopyOnWriteTests(unittest.TestCase):
+    def test_share_untouched_subtrees(self):
+        v = OAS3Validator({
+            'type': 'object',
+            'properties': {
+                'items': {'type': 'array', 'items': {
+                    'type': 'object',
+                    'properties': {
+                        'date': {'type': 'string', 'format': 'date'},
+                        'tags': {'type': 'array'},
+                    }}},
+                'meta': {'type': 'object'},
+            },
+        })
+        obj = {
+            'items': [{'tags': ['a']}, {'date': '2018-01-01', 'tags': []}],
+            'meta': {'foo': 'bar'},
+        }
+        new, _ = v.validate(obj)
+        self.assertIsNot(obj, new)
+        self.assertIs(obj['meta'], new['meta'])
+        self.assertIs(obj['items'][0], new['items'][0])
+        self.assertIs(obj['items'][1]['tags'], new['items'][1]['tags'])
+        self.assertEqual(new['items'][1]['date'], date(2018, 1, 1))
+        self.assertEqual(obj['items'][1]['date'], '2018-01-01')
+
+        obj = {'items': [{'tags': []}], 'meta': {}}
+        self.assertIs(obj, v.validate(obj)[0])
+
+    def test_merge_sibling_changes(self):
+        v = OAS3Validator({
+            'type': 'object',
+            'properties': {'a': {'type': 'string', 'format': 'date'}},
+            'additionalProperties': {'type': 'string', 'format': 'date'},
+        })
+        new, _ = v.validate({'a': '2018-01-01', 'b': '2018-01-02'})
+        self.assertEqual(
+            new, {'a': date(2018, 1, 1), 'b': date(2018, 1, 2)})
+
+
+class CheckOnlyTests(unittest.TestCase):
+    schema = {
+        'type': 'object',
+        'properties': {
+            'items': {'type': 'array', 'items': {
+                'type': 'object',
+                'properties': {
+                    'id': {'type': 'integer', 'format': 'int32'},
+                    'email': {'type': 'string', 'format': 'email'},
+                }}},
+            'created': {'type': 'string', 'format': 'date'},
+            'name': {'type': 'string', 'default': 'foo'},
+        },
+    }
+
+    def test_static_detection(self):
+        v = OAS3Validator(self.schema['properties']['items'])
+        self.assertFalse(getattr(v._check, 'transforms', False))
+        obj = [{'id': 1, 'email': 'a@example.com'}]
+        self.assertIs(obj, v.validate(obj)[0])
+        self.assertFalse(v.is_valid([{'id': 2**31}]))
+        v = OAS3Validator(self.schema)
+        self.assertTrue(v._check.transforms)
+
+    def test_check_only(self):
+        v = OAS3Validator(self.schema, fill_by_default=True, check_only=True)
+        obj = {'items': [{'id': 1}], 'created': '2018-01-01'}
+        self.assertIs(obj, v.validate(obj)[0])
+        self.assertEqual(obj, {'items': [{'id': 1}], 'created': '2018-01-01'})
+        self.assertFalse(v.is_valid({'created': 'foo'}))
+        self.assertFalse(v.is_valid({'items': [{'email': 'foo'}]}))
+
+
+class ErrorBudgetTests(unittest.TestCase):
+    schema = {'type': 'array', 'items': {
+        'anyOf': [{'type': 'string'}, {'not': {'type': 'string'}}],
+        'oneOf': [{'type': 'string'}, {'type': 'integer'}],
+    }}
+
+    def test_validate_result(self):
+        v = OAS3Validator(self.schema)
+        result = v.validate_result(['a', 1])
+        self.assertTrue(result)
+        self.assertEqual(result.instance, ['a', 1])
+        result = v.validate_result([None, [], {}])
+        self.assertFalse(result.valid)
+        self.assertEqual(len(result.errors), 3)
+        self.assertEqual(
+            [list(e.path) for e in result.errors], [[0], [1], [2]])
+        with self.assertRaises(ValidationErrors):
+            result.raise_for_errors()
+
+    def test_max_errors(self):
+        v = OAS3Validator(self.schema)
+        result = v.validate_result([None, [], {}], max_errors=1)
+        self.assertEqual(len(result.errors), 1)
+        self.assertEqual(list(result.errors[0].path), [0])
+        self.assertEqual(len(result.errors[0].context), 2)
+        result = v.validate_result(['a', 1, None, []], max_errors=2)
+        self.assertEqual([list(e.path) for e in result.errors], [[2], [3]])
+        self.assertTrue(v.validate_result(['a', 1, 2], max_errors=1))
+        with self.assertRaises(ValidationErrors) as cm:
+            v.validate([None, None], max_errors=1)
+        self.assertEqual(len(cm.exception.errors), 1)
+
+
+class ReviverTests(unittest.TestCase):
+    schema = {
+        'type': 'object',
+        'properties': {
+            'num': {'type': 'number'},
+            'secret': {'$ref': '#/definitions/Secret'},
+            'items': {'type': 'array', 'items': {'type': 'number'}},
+        },
+        'definitions': {'Secret': {'type': 'string', 'x-secret': True}},
+    }
+
+    def _reviver(self, calls):
+        def reviver(value, schema):
+            calls.append(schema)
+            if schema.get('x-secret'):
+                return UNDEFINED
+            if isinstance(value, dict) and 'nan' in value:
+                return float('nan')
+            return value
+        return reviver
+
+    def test_reviver(self):
+        calls = []
+        v = OAS3Validator(
+            self.schema, check_only=True, reviver=self._reviver(calls))
+        instance = {'num': {'nan': 1}, 'secret': 'x',
+                    'items': [1, {'nan': 1}, 2]}
+        result = v.validate_result(instance)
+        self.assertTrue(result)
+        self.assertEqual(sorted(result.instance), ['items', 'num'])
+        self.assertEqual(len(result.instance['items']), 3)
+        self.assertIsNot(result.instance, instance)
+        self.assertEqual(instance['secret'], 'x')
+        # $ref のノードでは適用せず参照先のノードで一度だけ適用する
+        self.assertEqual(
+            calls.count(self.schema['definitions']['Secret']), 1)
+        self.assertEqual(len(calls), 7)
+
+    def test_null_and_branches(self):
+        # null の値のプロパティには適用しない。oneOf/anyOf では試した
+        # 分岐ごとに適用する
+        calls = []
+        v = OAS3Validator(
+            self.schema, check_only=True, reviver=self._reviver(calls))
+        self.assertTrue(v.is_valid({'num': None}))
+        self.assertNotIn(self.schema['properties']['num'], calls)
+
+        branches = [{'type': 'string'}, {'type': 'number'}]
+        calls = []
+        v = OAS3Validator(
+            {'oneOf': branches}, check_only=True,
+            reviver=self._reviver(calls))
+        self.assertTrue(v.is_valid(1))
+        self.assertEqual([c for c in calls if c in branches], branches)
+
+    def test_unchanged(self):
+        v = OAS3Validator(
+            self.schema, check_only=True, reviver=lambda v, s: v)
+        instance = {'num': 1, 'items': [1, 2]}
+        self.assertIs(v.validate_result(instance).instance, instance)
+        self.assertFalse(v.is_valid({'items': ['x']}))
+
+
+class ProfilerTests(unittest.TestCase):
+    def test_profiler(self):
+        schema = {
+            'paths': {'/a/b': {'type': 'object', 'properties': {
+                'x': {'$ref': '#/definitions/S'},
+                'y': {'type': 'array', 'items': {'$ref': '#/definitions/S'}},
+            }}},
+            'definitions': {'S': {'type': 'string', 'pattern': '^a'}},
+        }
+        profiler = SchemaProfiler()
+        v = OAS3Validator(
+            schema['paths']['/a/b'], resolver=Resolver('', schema),
+            profiler=profiler)
+        self.assertTrue(v.is_valid({'x': 'a', 'y': ['a', 'ab']}))
+        self.assertFalse(v.is_valid({'x': 1}))
+        stats = {(loc, kw): calls
+                 for loc, kw, calls, _, _ in profiler.top()}
+        self.assertEqual(stats[('#/paths/~1a~1b', 'properties')], 2)
+        self.assertEqual(stats[('#/definitions/S', 'pattern')], 3)
+        # string の場合 type の検証は静的に省略される
+        self.assertEqual(stats[('#/definitions/S', 'type')], 1)
+        for _, _, _, total, own in profiler.top():
+            self.assertGreaterEqual(total, own)
+        top = profiler.top(1, key='total')[0]
+        self.assertEqual(top[:2], ('#/paths/~1a~1b', 'properties'))
+        report = profiler.report(limit=2).splitlines()
+        self.assertEqual(len(report), 3)
+        self.assertIn('location', report[0])
+        profiler.reset()
+        self.assertEqual(profiler.top(), [])
+
+
+class CacheTests(unittest.TestCase):
+    def test_regex_cache(self):
+        schema = {
+            'type': 'object',
+            'properties': {'code': {'type': 'string', 'pattern': '^c[0-9]+$'}},
+            'patternProperties': {'^x-': {}},
+            'additionalProperties': False,
+        }
+        prefill_regex_cache(schema)
+        before = regex_cache_info()
+        v = OAS3Validator(schema)
+        after = regex_cache_info()
+        self.assertEqual(before.misses, after.misses)
+        self.assertGreater(after.hits, before.hits)
+        v.validate({'code': 'c123', 'x-foo': 1})
+        self.assertFalse(v.is_valid({'code': 'd123'}))
+
+    def test_validator_cache(self):
+        schema = {'type': 'object', 'properties': {
+            'a': {'$ref': '#/definitions/S'},
+            'b': {'$ref': '#/definitions/S'}},
+            'definitions': {'S': {'type': 'string'}}}
+        cache = ValidatorCache(OAS3Validator, resolver=Resolver('', schema))
+        v = cache(schema)
+        self.assertIs(v, cache(schema))
+        self.assertIsNot(v, cache(schema['properties']['a']))
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (1, 2, 2))
+        self.assertFalse(v.is_valid({'a': 1}))
+        self.assertFalse(cache(schema['properties']['a']).is_valid(1))
+
+    def test_structure_keys(self):
+        keys = StructureKeys()
+        node = {'type': 'object', 'properties': {}}
+        node['properties']['child'] = node
+        self.assertEqual(
+            keys({'type': 'string', 'enum': ['a']}),
+            keys({'type': 'string', 'enum': ['a']}))
+        # キーの順序や値の型が異なるものは別の構造
+        self.assertNotEqual(
+            keys({'type': 'string', 'maxLength': 1}),
+            keys({'maxLength': 1, 'type': 'string'}))
+        self.assertNotEqual(keys({'minimum': 1}), keys({'minimum': True}))
+        self.assertIsNone(keys(node))
+        self.assertIsNotNone(keys({'items': {'type': 'string'}}))
+
+    def test_structural_dedup(self):
+        def item():
+            return {'type': 'object', 'properties': {
+                'id': {'type': 'integer', 'minimum': 1}}}
+        schema = {'type': 'object', 'properties': {
+            'a': item(), 'b': item(), 'c': {'type': 'array', 'items': item()}}}
+        cache = ValidatorCache(
+            OAS3Validator, resolver=Resolver('', schema),
+            structure_keys=StructureKeys())
+        v = cache(schema)
+        props = schema['properties']
+        self.assertIs(v._compile(props['a']), v._compile(props['b']))
+        self.assertIs(
+            cache(props['c']['items'])._check, v._compile(props['a']))
+        self.assertEqual(
+            (cache.dedup.compiled, cache.dedup.deduplicated), (4, 2))
+        with self.assertRaises(ValidationErrors) as cm:
+            v.validate({'a': {'id': 0}, 'b': {'id': 0}, 'c': [{'id': 0}]})
+        self.assertEqual(
+            sorted(list(e.path) for e in cm.exception.errors),
+            [['a', 'id'], ['b', 'id'], ['c', 0, 'id']])
+
+        # ノードの同一性に依存する profiler/reviver とは併用しない
+        cache = ValidatorCache(
+            OAS3Validator, resolver=Resolver('', schema),
+            structure_keys=StructureKeys(), profiler=SchemaProfiler())
+        self.assertIsNone(cache.dedup)
+
+
+class ErrorTests(unittest.TestCase):
+    def tearDown(self):
+        exceptions.configure(max_length=256, max_context=16, max_errors=100)
+
+    def test_lazy_bounded_message(self):
+        v = OAS3Validator({'type': 'array', 'maxItems': 1})
+        instance = list(range(100000))
+        with self.assertRaises(ValidationErrors) as cm:
+            v.validate(instance)
+        error = cm.exception.errors[0]
+        self.assertIsNone(error._message)
+        self.assertLess(len(error.message), 300)
+        self.assertIn('is too long', error.message)
+        self.assertFalse(hasattr(error, '__dict__') and error.__dict__)
+
+        exceptions.configure(max_length=8)
+        v = OAS3Validator({'type': 'string', 'maxLength': 1})
+        with self.assertRaises(ValidationErrors) as cm:
+            v.validate('x' * 100)
+        self.assertEqual(
+            cm.exception.errors[0].message,
+            'xxxxx...(100 chars) is too long')
+
+    @params(
+        ({'type': 'object', 'properties': {'a': {}},
+          'additionalProperties': False}, {'a': 1, 'b': 2},
+         "Additional properties are not allowed ({'b'} were unexpected)"),
+        ({'type': 'object', 'patternProperties': {'^x-': {}, '^y': {}},
+          'additionalProperties': False}, {'b': 2, 'c': 3},
+         "'b', 'c' do not match any of the regexes: '^x-', '^y'"),
+        ({'type': 'array', 'items': [{}], 'additionalItems': False},
+         [1, 'x', 3],
+         'Additional items are not allowed (x, 3 were unexpected)'),
+        ({'oneOf': [{'type': 'integer'}, {'minimum': 0}]}, 1,
+         "1 is valid under each of {'type': 'integer'}, {'minimum': 0}"),
+        ({'type': 'string'}, {'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': [5, (6,)]},
+         "{'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': [5, (6,)]} "
+         "is not of type string"),
+    )
+    def test_message_wording(self, schema, instance, message):
+        # 上限に収まる値は str.format で埋め込んだ場合と同じ文字列になる
+        with self.assertRaises(ValidationErrors) as cm:
+            OAS3Validator(schema).validate(instance)
+        self.assertEqual(cm.exception.errors[0].message, message)
+
+    def test_bounded_nested(self):
+        exceptions.configure(max_length=16)
+        instance = [list(range(100000))]
+        instance.append(instance)
+        with self.assertRaises(ValidationErrors) as cm:
+            OAS3Validator({'type': 'string'}).validate(instance)
+        self.assertEqual(
+            cm.exception.errors[0].message,
+            '[[0, 1, 2, 3,... is not of type string')
+
+        exceptions.configure(max_length=256)
+        instance = [1]
+        instance.append(instance)
+        with self.assertRaises(ValidationErrors) as cm:
+            OAS3Validator({'type': 'string'}).validate(instance)
+        self.assertEqual(
+            cm.exception.errors[0].message, '[1, [...]] is not of type string')
+
+    def test_bounded_context(self):
+        exceptions.configure(max_context=2)
+        v = OAS3Validator({'oneOf': [{'type': 'string'}] * 5})
+        with self.assertRaises(ValidationErrors) as cm:
+            v.validate(1)
+        error = cm.exception.errors[0]
+        self.assertEqual(len(error.context), 2)
+        self.assertEqual(error.context_truncated, 3)
+
+    def test_as_dict(self):
+        exceptions.configure(max_errors=2)
+        v = OAS3Validator({'type': 'array', 'items': {'type': 'string'}})
+        with self.assertRaises(ValidationErrors) as cm:
+            v.validate([1, 2, 3])
+        self.assertEqual(cm.exception.as_dict(), {
+            'message': 'found 3 validation error(s)',
+            'errors': [
+                {'message': '1 is not of type string',
+                 'path': [0], 'schema_path': []},
+                {'message': '2 is not of type string',
+                 'path': [1], 'schema_path': []},
+            ],
+            'truncated': 1,
+        })
+        self.assertIn('... and 1 more', str(cm.exception))
@@ -0,0 +1,181 @@
+from datetime import datetime, timezone
+import tracemalloc
+import unittest
+
+from nose2.tools import params
+from pyramid.response import Response
+
+from pyramid_oas3.interfaces import (
+    IAllocationTracker, ISchemaProfiler, IStageMetrics)
+from pyramid_oas3.metrics import StageMetrics
+from .common import create_webapp
+
+
+class RecordingHook(object):
+    def __init__(self):
+        self.events = []
+
+    def on_stage_start(self, request, operation, stage):
+        self.events.append(('start', operation, stage))
+
+    def on_stage_end(self, request, operation, stage, seconds):
+        assert seconds >= 0
+        self.events.append(('end', operation, stage))
+
+
+class StageMetricsTests(unittest.TestCase):
+    def test_prometheus_text(self):
+        metrics = StageMetrics()
+        metrics.observe('get"op', 'handler', 0.0002)
+        metrics.observe('get"op', 'handler', 3.0)
+        text = metrics.prometheus_text()
+        self.assertIn('# TYPE pyramid_oas3_stage_seconds histogram', text)
+        labels = 'operation="get\\"op",stage="handler"'
+        for line in (
+                'pyramid_oas3_stage_seconds_bucket{%s,le="0.0001"} 0',
+                'pyramid_oas3_stage_seconds_bucket{%s,le="0.00025"} 1',
+                'pyramid_oas3_stage_seconds_bucket{%s,le="2.5"} 1',
+                'pyramid_oas3_stage_seconds_bucket{%s,le="5.0"} 2',
+                'pyramid_oas3_stage_seconds_bucket{%s,le="+Inf"} 2',
+                'pyramid_oas3_stage_seconds_count{%s} 2'):
+            self.assertIn(line % labels, text)
+
+
+class InstrumentationTests(unittest.TestCase):
+    def _create(self, integration, settings):
+        settings = dict(settings, **{'pyramid_oas3.integration': integration})
+        return create_webapp(
+            'test_body', ['/test_simple', '/test_stream'], settings=settings)
+
+    @params('tween', 'view')
+    def test_hooks(self, integration):
+        hook = RecordingHook()
+        app = self._create(integration, {
+            'pyramid_oas3.instrumentation_hooks': [hook]})
+        app.post_json('/test_simple', params={
+            'foo': 'bar', 'hoge': 1,
+            'created': datetime.now(timezone.utc).isoformat()})
+        op = 'POST /test_simple'
+        stages = ['query', 'params', 'body_decode', 'body_validate',
+                  'handler']
+        if integration == 'tween':
+            stages.insert(0, 'route')
+        expected = []
+        for stage in stages:
+            expected.append(('start', op, stage))
+            expected.append(('end', op, stage))
+        self.assertEqual(hook.events, expected)
+
+        del hook.events[:]
+        app.post_json('/test_simple', params={'foo': 'bar'}, status=400)
+        self.assertEqual(hook.events[-1], ('end', op, 'body_validate'))
+
+    @params('tween', 'view')
+    def test_unvalidated_routes(self, integration):
+        # 検証しないルートや 404 では hook も tracker も呼ばれない
+        def setup(config):
+            config.add_route('health', '/health')
+            config.add_view(lambda r: Response('ok'), route_name='health')
+
+        hook = RecordingHook()
+        app = create_webapp('test_body', [], func=setup, settings={
+            'pyramid_oas3.integration': integration,
+            'pyramid_oas3.instrumentation_hooks': [hook],
+            'pyramid_oas3.allocation_tracking': 'true',
+        })
+        try:
+            for _ in range(3):
+                app.get('/health')
+            app.get('/unknown', status=404)
+            self.assertEqual(hook.events, [])
+            tracker = app.app.registry.getUtility(IAllocationTracker)
+            self.assertFalse(getattr(tracker._local, 'stack', None))
+        finally:
+            tracemalloc.stop()
+
+    def test_metrics_view(self):
+        def setup(config):
+            config.add_route('echo', '/test_simple')
+            config.add_view(
+                lambda request: Response(
+                    request.body, content_type='application/json'),
+                route_name='echo')
+
+        app = create_webapp('test_response', [], func=setup, settings={
+            'pyramid_oas3.metrics': 'true',
+            'pyramid_oas3.metrics_path': '/metrics',
+            'pyramid_oas3.validate_response': 'true'})
+        app.post_json('/test_simple', params={'num': 1})
+        metrics = app.app.registry.getUtility(IStageMetrics)
+        self.assertEqual(
+            sorted(stage for (_, stage) in metrics.histograms),
+            ['handler', 'params', 'query', 'response', 'route'])
+        res = app.get('/metrics')
+        self.assertEqual(res.content_type, 'text/plain')
+        self.assertIn(
+            'pyramid_oas3_stage_seconds_count{'
+            'operation="POST /test_simple",stage="response"} 1',
+            res.text)
+
+    def test_disabled(self):
+        app = self._create('tween', {})
+        app.post_json('/test_stream', params=[{'id': 1}])
+        self.assertIsNone(app.app.registry.queryUtility(IStageMetrics))
+        app.get('/metrics', status=404)
+
+    def test_schema_profiler(self):
+        app = self._create('tween', {'pyramid_oas3.schema_profiler': 'true'})
+        app.post_json('/test_stream', params=[{'id': 1}])
+        profiler = app.app.registry.getUtility(ISchemaProfiler)
+        locations = [loc for loc, _, _, _, _ in profiler.top()]
+        self.assertIn('#/components/schemas/StreamItems/items', locations)
+
+    def test_allocation_tracking(self):
+        app = self._create('tween', {
+            'pyramid_oas3.allocation_tracking': 'true'})
+        try:
+            app.post_json('/test_simple', params={
+                'foo': 'bar', 'hoge': 1, 'created': 'x' * 100000},
+                status=400)
+            tracker = app.app.registry.getUtility(IAllocationTracker)
+            stats = {(op, stage): (count, peak)
+                     for op, stage, count, _, peak in tracker.top()}
+            count, peak = stats[('POST /test_simple', 'body_decode')]
+            self.assertEqual(count, 1)
+            self.assertGreater(peak, 100000)
+            self.assertIn('body_validate', tracker.report())
+        finally:
+            tracemalloc.stop()
+
+    def test_allocation_tracking_nested(self):
+        # renderer_validation の response は handler の中で実行される
+        def setup(config):
+            config.add_route('renderer', '/test_renderer')
+            config.add_view(
+                lambda r: dict(r.json_body, created='2020-01-01T00:00:00Z'),
+                route_name='renderer', renderer='json')
+
+        app = create_webapp('test_response', [], func=setup, settings={
+            'pyramid_oas3.validate_response': True,
+            'pyramid_oas3.renderer_validation': 'json',
+            'pyramid_oas3.allocation_tracking': 'true',
+        })
+        try:
+            app.post_json('/test_renderer', {'num': 1}, status=200)
+            tracker = app.app.registry.getUtility(IAllocationTracker)
+            self.assertEqual(
+                sorted(stage for _, stage, _, _, _ in tracker.top()),
+                ['handler', 'params', 'query', 'response', 'route'])
+
+            tracker.reset()
+            tracker.on_stage_start(None, 'op', 'handler')
+            data = bytearray(1000000)
+            del data
+            tracker.on_stage_start(None, 'op', 'response')
+            tracker.on_stage_end(None, 'op', 'response', 0)
+            tracker.on_stage_end(None, 'op', 'handler', 0)
+            stats = {stage: peak for _, stage, _, _, peak in tracker.top()}
+            self.assertGreater(stats['handler'], 1000000)
+            self.assertLess(stats['response'], 1000000)
+        finally:
+            tracemalloc.stop()
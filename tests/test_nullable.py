@@ -18,7 +18,11 @@ class NullableTests(unittest.TestCase):
             return pickle.loads(b64decode(ret.body))[1]
 
     def test_00(self):
-        expected = {'int-array?': [None, 1, 2, 3]}
+        # default: null の場合もキーを設定する
+        expected = {'int-array?': [None, 1, 2, 3], 'str?': None}
         self.assertEqual(expected, self._post('/test_00', {}, status=200))
         self.assertEqual(expected, self._post('/test_00', {'int-array?': None},
                                               status=200))
+        self.assertEqual(
+            dict(expected, **{'str?': 'x'}),
+            self._post('/test_00', {'str?': 'x'}, status=200))
@@ -1,11 +1,16 @@
+from datetime import datetime, timezone
 import json
 import math
 import unittest
 
 from nose2.tools import params
+from pyramid.renderers import JSON
 from pyramid.response import Response
 
-from .common import create_webapp
+from pyramid_oas3 import ResponseValidationError
+from pyramid_oas3.interfaces import IValidatorCache
+from pyramid_oas3.tween import get_context
+from .common import create_webapp, load_schema
 
 
 class ResponseTests(unittest.TestCase):
@@ -36,10 +41,12 @@ class ResponseTests(unittest.TestCase):
                 config.add_route(name, path)
                 config.add_view(handler, route_name=name)
 
-        self.app = create_webapp('test_response', [], func=setup, settings={
-            'pyramid_oas3.validate_response': True,
-            'pyramid_oas3.response_reviver': _reviver
-        })
+        with self.assertWarns(DeprecationWarning):
+            self.app = create_webapp(
+                'test_response', [], func=setup, settings={
+                    'pyramid_oas3.validate_response': True,
+                    'pyramid_oas3.response_reviver': _reviver
+                })
 
     def _post(self, url, body, **kwargs):
         self.app.post_json(url, params=body, **kwargs)
@@ -51,6 +58,15 @@ class ResponseTests(unittest.TestCase):
         self._post(path, {'num': 123, 'str': 'test'}, status=500)
         self._post(path, {'num': 'test'}, status=500)
 
+    def test_validator_cache(self):
+        cache = self.app.app.registry.getUtility(
+            IValidatorCache, name='check_only')
+        self._post('/test_simple', {'num': 123, 'str': 'hoge'}, status=200)
+        size, hits = len(cache), cache.hits
+        self._post('/test_simple', {'num': 123, 'str': 'hoge'}, status=200)
+        self.assertEqual(size, len(cache))
+        self.assertEqual(hits + 1, cache.hits)
+
     def test_not_json(self):
         self.app.get('/test_not_json', status=200)
 
@@ -83,3 +99,232 @@ def _reviver(key, value):
     if typ != 'number':
         return value
     return float(value['value'])
+
+
+class StreamResponseTests(unittest.TestCase):
+    def _create(self, **settings):
+        self.sent = []
+
+        def array(request):
+            def app_iter():
+                yield b'['
+                for i, v in enumerate(request.json_body):
+                    self.sent.append(v)
+                    yield (b', ' if i else b'') + json.dumps(v).encode()
+                yield b']'
+            return Response(app_iter=app_iter(),
+                            content_type='application/json')
+
+        def ndjson(request):
+            def app_iter():
+                for v in request.json_body:
+                    self.sent.append(v)
+                    yield json.dumps(v).encode() + b'\n'
+            return Response(app_iter=app_iter(),
+                            content_type='application/x-ndjson')
+
+        def setup(config):
+            for path, view in (('/test_stream_array', array),
+                               ('/test_stream_unique', array),
+                               ('/test_stream_ndjson', ndjson)):
+                config.add_route(path, path)
+                config.add_view(view, route_name=path)
+        settings['pyramid_oas3.validate_response'] = True
+        return create_webapp('test_response', [], func=setup,
+                             settings=settings)
+
+    @params('array', 'ndjson')
+    def test_stream(self, typ):
+        app = self._create()
+        path = '/test_stream_{}'.format(typ)
+        ret = app.post_json(path, [1, 2, 3], status=200)
+        self.assertEqual(self.sent, [1, 2, 3])
+        self.assertEqual(
+            [int(v) for v in ret.text.strip('[]\n').replace(
+                '\n', ',').split(',')], [1, 2, 3])
+        self.sent = []
+        with self.assertRaises(ResponseValidationError) as cm:
+            app.post_json(path, [1, 'x', 3, 4], status=200)
+        self.assertEqual(list(cm.exception.exception.errors[0].path), [1])
+        # 違反が見つかった時点でストリームを打ち切る
+        self.assertEqual(self.sent, [1, 'x'])
+
+    def test_stream_error_handler(self):
+        errors = []
+        app = self._create(**{
+            'pyramid_oas3.response_stream_error_handler':
+                lambda request, exc: errors.append(exc)})
+        ret = app.post_json('/test_stream_array', [1, 2, 3, 4], status=200)
+        self.assertEqual(json.loads(ret.text), [1, 2, 3, 4])
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], ResponseValidationError)
+
+    def test_stream_sampling(self):
+        # ストリーミングするレスポンスは送出し終えてから結果を記録する
+        app = self._create(**{'pyramid_oas3.response_sample_adaptive': '2'})
+        sampler = get_context(app.app.registry).get_operation_plan(
+            '/test_stream_array', 'post').response_sampler
+        records = []
+        sampler.record = records.append
+        app.post_json('/test_stream_array', [1, 2], status=200)
+        self.assertEqual(records, [True])
+        with self.assertRaises(ResponseValidationError):
+            app.post_json('/test_stream_array', [1, 'x'], status=200)
+        self.assertEqual(records, [True, False])
+
+    def test_buffered_fallback(self):
+        app = self._create()
+        app.post_json('/test_stream_unique', [1, 2], status=200)
+        app.post_json('/test_stream_unique', [1, 1], status=500)
+
+
+class SamplingTests(unittest.TestCase):
+    def _create(self, **settings):
+        def test(request):
+            return Response(json.dumps(request.json_body),
+                            content_type='application/json; charset=utf8')
+
+        def setup(config):
+            for path in ('/test_simple', '/test_not_sampled'):
+                config.add_route(path, path)
+                config.add_view(test, route_name=path)
+        settings['pyramid_oas3.validate_response'] = True
+        return create_webapp('test_response', [], func=setup,
+                             settings=settings)
+
+    def test_rate(self):
+        app = self._create(**{'pyramid_oas3.response_sample_rate': '0.5'})
+        statuses = [
+            app.post_json('/test_simple', {'num': 'x'}, expect_errors=True
+                          ).status_code for _ in range(4)]
+        self.assertEqual(statuses, [500, 200, 500, 200])
+        app.post_json('/test_not_sampled', 'x', status=200)
+
+    def test_rate_string(self):
+        # YAML などで文字列として書かれた割合も受け付ける
+        schema = load_schema('test_response')
+        schema['paths']['/test_not_sampled']['post'][
+            'x-pyramid-oas3-response-sample-rate'] = '0'
+        app = self._create(**{'pyramid_oas3.schema': schema})
+        app.post_json('/test_not_sampled', 'x', status=200)
+
+    def test_adaptive(self):
+        app = self._create(**{
+            'pyramid_oas3.response_sample_adaptive': '2',
+            'pyramid_oas3.response_sample_min_rate': '0.25'})
+        for _ in range(2):
+            app.post_json('/test_simple', {'num': 1}, status=200)
+        # 2回連続で成功したので 1/2 の割合になる
+        app.post_json('/test_simple', {'num': 'x'}, status=200)
+        app.post_json('/test_simple', {'num': 'x'}, status=500)
+        # 失敗したので元の割合に戻る
+        app.post_json('/test_simple', {'num': 'x'}, status=500)
+
+
+class RendererTests(unittest.TestCase):
+    def _create(self, integration):
+        self.loads = []
+
+        def loads(body):
+            self.loads.append(body)
+            return json.loads(body)
+
+        def view(request):
+            ret = dict(request.json_body)
+            ret['created'] = datetime.now(timezone.utc)
+            return ret
+
+        def setup(config):
+            renderer = JSON()
+            renderer.add_adapter(datetime, lambda v, request: v.isoformat())
+            config.add_renderer('json', renderer)
+            config.add_route('renderer', '/test_renderer')
+            config.add_view(view, route_name='renderer', renderer='json')
+        return create_webapp('test_response', [], func=setup, settings={
+            'pyramid_oas3.validate_response': True,
+            'pyramid_oas3.renderer_validation': 'json',
+            'pyramid_oas3.integration': integration,
+            'pyramid_oas3.json_backend': loads,
+        })
+
+    @params('tween', 'view')
+    def test_renderer_data(self, integration):
+        app = self._create(integration)
+        app.post_json('/test_renderer', {'num': 1}, status=200)
+        app.post_json('/test_renderer', {'num': 'x'}, status=500)
+        # レスポンスのボディを再パースしない
+        self.assertEqual(self.loads, [])
+
+
+class BackgroundTests(unittest.TestCase):
+    def test_background(self):
+        failures = []
+
+        def test(request):
+            return Response(json.dumps(request.json_body),
+                            content_type='application/json; charset=utf8')
+
+        def setup(config):
+            config.add_route('simple', '/test_simple')
+            config.add_view(test, route_name='simple')
+        app = create_webapp('test_response', [], func=setup, settings={
+            'pyramid_oas3.validate_response': True,
+            'pyramid_oas3.response_validation_workers': '1',
+            'pyramid_oas3.response_validation_sink':
+                lambda request, exc: failures.append(exc),
+        })
+        app.post_json('/test_simple', {'num': 1}, status=200)
+        # 検証に失敗してもレスポンスはそのまま返却され、sink へ通知される
+        app.post_json('/test_simple', {'num': 'x'}, status=200)
+        get_context(app.app.registry).background.join()
+        self.assertEqual(len(failures), 1)
+        self.assertIsInstance(failures[0], ResponseValidationError)
+
+    def test_background_chunks(self):
+        # ワーカーは送出中の response を読まない (app_iter を置き換えない)
+        failures, responses = [], []
+
+        def test(request):
+            body = json.dumps(request.json_body).encode('utf8')
+            response = Response(
+                app_iter=[body[:3], body[3:]],
+                content_type='application/json', charset='utf8')
+            responses.append((response, response.app_iter))
+            return response
+
+        def setup(config):
+            config.add_route('simple', '/test_simple')
+            config.add_view(test, route_name='simple')
+        app = create_webapp('test_response', [], func=setup, settings={
+            'pyramid_oas3.validate_response': True,
+            'pyramid_oas3.response_validation_workers': '1',
+            'pyramid_oas3.response_validation_sink':
+                lambda request, exc: failures.append(exc),
+        })
+        app.post_json('/test_simple', {'num': 1}, status=200)
+        app.post_json('/test_simple', {'num': 'x'}, status=200)
+        get_context(app.app.registry).background.join()
+        self.assertEqual(len(failures), 1)
+        for response, app_iter in responses:
+            self.assertIs(response.app_iter, app_iter)
+            self.assertIsNone(response.content_length)
+
+
+class SchemaReviverTests(unittest.TestCase):
+    def test_schema_reviver(self):
+        def test(request):
+            return Response(json.dumps(request.json_body),
+                            content_type='application/json; charset=utf8')
+
+        def setup(config):
+            config.add_route('reviver', '/test_reviver')
+            config.add_view(test, route_name='reviver')
+        app = create_webapp('test_response', [], func=setup, settings={
+            'pyramid_oas3.validate_response': True,
+            'pyramid_oas3.response_schema_reviver':
+                lambda value, schema: _reviver(None, value),
+        })
+        ext = {'__extendData__': True, 'type': 'number', 'value': 'NaN'}
+        app.post_json('/test_reviver', [ext, 1.5], status=200)
+        app.post_json('/test_reviver', {'a': ext}, status=200)
+        app.post_json('/test_reviver', ['foo'], status=500)
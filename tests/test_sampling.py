@@ -0,0 +1,28 @@
+import unittest
+
+from pyramid_oas3.sampling import ResponseSampler
+
+
+class ResponseSamplerTests(unittest.TestCase):
+    def _run(self, sampler, n):
+        return [sampler.should_validate() for _ in range(n)]
+
+    def test_rate(self):
+        self.assertTrue(all(self._run(ResponseSampler(), 10)))
+        self.assertFalse(any(self._run(ResponseSampler(0), 10)))
+        self.assertEqual(sum(self._run(ResponseSampler(0.1), 100)), 10)
+        self.assertEqual(
+            self._run(ResponseSampler(0.25), 5),
+            [True, False, False, False, True])
+
+    def test_adaptive(self):
+        sampler = ResponseSampler(1.0, adaptive=3, min_rate=0.2)
+        for expected in (0.5, 0.25, 0.2, 0.2):
+            for _ in range(3):
+                sampler.record(True)
+            self.assertEqual(sampler.rate, expected)
+        sampler.record(False)
+        self.assertEqual(sampler.rate, 1.0)
+        sampler = ResponseSampler(0.5)
+        sampler.record(True)
+        self.assertEqual(sampler.rate, 0.5)
@@ -0,0 +1,152 @@
+import copy
+import datetime
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from pyramid_oas3.jsonschema import OAS3Validator, Resolver
+from pyramid_oas3.resolve import dereference, resolve_refs
+from pyramid_oas3.snapshot import load_spec
+from .common import create_webapp, load_schema
+
+
+SPEC = {
+    'paths': {'/nodes': {'post': {
+        'parameters': [{'$ref': '#/components/parameters/Limit'}],
+        'requestBody': {'content': {'application/json': {
+            'schema': {'$ref': '#/components/schemas/Node'}}}},
+    }}},
+    'components': {
+        'parameters': {'Limit': {
+            'name': 'limit', 'in': 'query',
+            'schema': {'$ref': '#/components/schemas/Limit'}}},
+        'schemas': {
+            'Limit': {'type': 'integer', 'maximum': 100},
+            'Node': {'type': 'object', 'properties': {
+                'value': {'$ref': '#/components/schemas/Limit'},
+                'children': {'type': 'array', 'items': {
+                    '$ref': '#/components/schemas/Node'}},
+            }},
+            'Remote': {'$ref': 'http://example.com/remote.json'},
+        },
+    },
+}
+
+
+class DereferenceTests(unittest.TestCase):
+    def test_dereference(self):
+        spec = copy.deepcopy(SPEC)
+        deref = dereference(spec, Resolver('', spec))
+        self.assertEqual(spec, SPEC)
+        schemas = deref['components']['schemas']
+        node = schemas['Node']
+        op = deref['paths']['/nodes']['post']
+        self.assertIs(op['parameters'][0], deref['components']['parameters'][
+            'Limit'])
+        self.assertIs(op['parameters'][0]['schema'], schemas['Limit'])
+        self.assertIs(
+            op['requestBody']['content']['application/json']['schema'], node)
+        # 再帰的なスキーマは循環したグラフになる
+        self.assertIs(node['properties']['children']['items'], node)
+        self.assertEqual(
+            schemas['Remote'], {'$ref': 'http://example.com/remote.json'})
+
+        v = OAS3Validator(node)
+        self.assertTrue(v.is_valid({'children': [{'value': 1}]}))
+        self.assertFalse(v.is_valid({'children': [{'value': 101}]}))
+
+    def test_resolve_refs(self):
+        # 互換のために残した resolve_refs は以前と同じく node をその場で更新する。
+        # dict/list は置き換えず、$ref を持つ dict を参照先の内容で更新する
+        spec = copy.deepcopy(SPEC)
+        parameters = spec['paths']['/nodes']['post']['parameters']
+        param = parameters[0]
+        node = spec['components']['schemas']['Node']
+        with self.assertWarns(DeprecationWarning):
+            resolve_refs(spec, Resolver('', spec))
+        self.assertIs(
+            spec['paths']['/nodes']['post']['parameters'], parameters)
+        self.assertIs(parameters[0], param)
+        self.assertEqual(param['name'], 'limit')
+        self.assertEqual(
+            param['schema'], spec['components']['schemas']['Limit'])
+        self.assertIs(spec['components']['schemas']['Node'], node)
+        self.assertEqual(node['properties']['value']['maximum'], 100)
+        self.assertTrue(OAS3Validator(node).is_valid(
+            {'children': [{'value': 1}]}))
+
+    def test_circular(self):
+        spec = {'a': {'$ref': '#/b'}, 'b': {'$ref': '#/a'}}
+        with self.assertRaises(ValueError):
+            dereference(spec, Resolver('', spec))
+
+
+class SnapshotTests(unittest.TestCase):
+    def test_cache(self):
+        path = os.path.join(os.path.dirname(__file__), 'test_body.yaml')
+        with tempfile.TemporaryDirectory() as cache_dir:
+            spec = load_spec(path=path, cache_dir=cache_dir)
+            files = os.listdir(cache_dir)
+            self.assertEqual(len(files), 1)
+            # 2回目以降は YAML のパースと参照の解決を行わない
+            with mock.patch('pyramid_oas3.snapshot._parse') as parse, \
+                    mock.patch('pyramid_oas3.snapshot.dereference') as deref:
+                cached = load_spec(path=path, cache_dir=cache_dir)
+                self.assertFalse(parse.called or deref.called)
+            self.assertEqual(cached, spec)
+            schemas = cached['components']['schemas']
+            body = cached['paths']['/test_stream']['post']['requestBody']
+            self.assertIs(
+                body['content']['application/json']['schema'],
+                schemas['StreamItems'])
+
+            schema = copy.deepcopy(SPEC)
+            load_spec(schema, cache_dir=cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+            node = load_spec(schema, cache_dir=cache_dir)[
+                'components']['schemas']['Node']
+            self.assertIs(node['properties']['children']['items'], node)
+
+    def test_cache_key_types(self):
+        # 同じ内容でも型が異なる値 (date と文字列) は別のキャッシュになる
+        def spec(default):
+            return {'components': {'schemas': {'Day': {
+                'type': 'string', 'format': 'date', 'default': default}}}}
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            load_spec(spec(datetime.date(2017, 7, 26)), cache_dir=cache_dir)
+            loaded = load_spec(spec('2017-07-26'), cache_dir=cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+        self.assertEqual(
+            loaded['components']['schemas']['Day']['default'], '2017-07-26')
+
+    def test_untrusted_snapshot(self):
+        # 他のユーザーが書き込めるファイルは読み込まずに作り直す
+        schema = copy.deepcopy(SPEC)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            load_spec(schema, cache_dir=cache_dir)
+            path = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+            os.chmod(path, 0o666)
+            with mock.patch('pickle.load') as load:
+                load_spec(schema, cache_dir=cache_dir)
+                self.assertFalse(load.called)
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+            with mock.patch('os.getuid', return_value=os.getuid() + 1), \
+                    mock.patch('pickle.load') as load:
+                load_spec(schema, cache_dir=cache_dir)
+                self.assertFalse(load.called)
+
+    def test_settings(self):
+        schema = load_schema('test_body')
+        original = copy.deepcopy(schema)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            app = create_webapp('test_body', ['/test_fill_ref'], settings={
+                'pyramid_oas3.schema': schema,
+                'pyramid_oas3.schema_cache_dir': cache_dir,
+                'pyramid_oas3.fill_by_default': True,
+            })
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+        app.post_json('/test_fill_ref', {'hoge': 'x'})
+        app.post_json('/test_fill_ref', {'hoge': 1}, status=400)
+        self.assertEqual(schema, original)
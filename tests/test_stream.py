@@ -0,0 +1,80 @@
+import json
+import unittest
+
+from pyramid_oas3.jsonschema import OAS3Validator, Resolver
+from pyramid_oas3.plan import compile_stream
+from pyramid_oas3.stream import (
+    JSONArrayDecoder, NDJSONDecoder, NotAnArray)
+
+
+class JSONArrayDecoderTests(unittest.TestCase):
+    def _decode(self, data, chunk_size):
+        decoder = JSONArrayDecoder()
+        items = []
+        for i in range(0, len(data), chunk_size):
+            items += decoder.feed(data[i:i + chunk_size])
+        return items + decoder.close()
+
+    def test_chunk_boundaries(self):
+        value = [
+            1, -12.5e3, 'a\\u3042"b', 'あい', True, False, None,
+            {'a': [1, {'b': 'c'}], 'd': {}}, [], 1234567890]
+        data = json.dumps(value, ensure_ascii=False).encode('utf8')
+        for chunk_size in range(1, len(data) + 1):
+            self.assertEqual(self._decode(data, chunk_size), value)
+        self.assertEqual(self._decode(b' [ ] ', 1), [])
+
+    def test_invalid(self):
+        for data in (b'[1,]', b'[1 2]', b'[1', b'[1]]', b'[xyz, 1]',
+                     b'[{"a" 1}]', b''):
+            with self.assertRaises(ValueError):
+                self._decode(data, 2)
+        with self.assertRaises(NotAnArray):
+            self._decode(b'{"a": 1}', 2)
+
+    def test_early_error(self):
+        # 不正な要素はボディ全体を読み込む前に検出される
+        decoder = JSONArrayDecoder()
+        decoder.feed(b'[{"a": 1}, {"a" 1}, ')
+        with self.assertRaises(ValueError):
+            decoder.feed(b'1' * 16)
+
+
+class NDJSONDecoderTests(unittest.TestCase):
+    def test_chunk_boundaries(self):
+        value = [{'a': 'あ'}, [1, 2], 'x', 3]
+        data = '\n'.join(
+            json.dumps(v, ensure_ascii=False) for v in value).encode('utf8')
+        for chunk_size in range(1, len(data) + 1):
+            decoder = NDJSONDecoder()
+            items = []
+            for i in range(0, len(data), chunk_size):
+                items += decoder.feed(data[i:i + chunk_size])
+            self.assertEqual(items + decoder.close(), value)
+
+    def test_blank_lines(self):
+        decoder = NDJSONDecoder()
+        self.assertEqual(decoder.feed(b'1\n\n  \r\n2'), [1])
+        self.assertEqual(decoder.feed(b'\n\n3\n'), [2, 3])
+        self.assertEqual(decoder.close(), [])
+
+    def test_invalid(self):
+        # レコード番号は検証エラーの path と同じく空行を除いた0始まり
+        decoder = NDJSONDecoder()
+        self.assertEqual(decoder.feed(b'1\n2'), [1])
+        with self.assertRaisesRegex(ValueError, 'record 2:'):
+            decoder.feed(b'\n\n{\n')
+
+
+class CompileStreamTests(unittest.TestCase):
+    def test_unsupported(self):
+        resolver = Resolver('', {})
+        plan = compile_stream(
+            {'type': 'array', 'maxItems': 2, 'items': {'type': 'integer'}},
+            OAS3Validator, resolver)
+        self.assertEqual((plan.min_items, plan.max_items), (0, 2))
+        for schema in ({'type': 'object'},
+                       {'type': 'array', 'uniqueItems': True},
+                       {'type': 'array', 'items': [{'type': 'integer'}]}):
+            with self.assertRaises(ValueError):
+                compile_stream(schema, OAS3Validator, resolver)
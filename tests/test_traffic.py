@@ -0,0 +1,121 @@
+import json
+import unittest
+
+from pyramid_oas3.traffic import GenerationError, InstanceGenerator
+from .common import create_traffic, create_webapp, load_schema
+
+
+class InstanceGeneratorTests(unittest.TestCase):
+    spec = {
+        'components': {'schemas': {
+            'Base': {
+                'type': 'object',
+                'required': ['id'],
+                'properties': {'id': {'type': 'integer', 'minimum': 1}},
+            },
+            'Item': {'allOf': [
+                {'$ref': '#/components/schemas/Base'},
+                {'type': 'object',
+                 'required': ['code', 'kind'],
+                 'properties': {
+                     'code': {'type': 'string',
+                              'pattern': r'^[A-Z]{3}-\d{4}$'},
+                     'kind': {'oneOf': [
+                         {'type': 'string', 'enum': ['a', 'b']},
+                         {'type': 'integer', 'multipleOf': 7}]},
+                     'email': {'type': 'string', 'format': 'email'},
+                     'created': {'type': 'string', 'format': 'date-time'},
+                     'name': {'type': 'string', 'minLength': 3,
+                              'maxLength': 5},
+                 }},
+            ]},
+        }},
+    }
+    schema = {'type': 'array', 'maxItems': 1000,
+              'items': {'$ref': '#/components/schemas/Item'}}
+
+    def test_valid(self):
+        gen = InstanceGenerator(self.spec, seed=1)
+        for _ in range(20):
+            instance = gen.generate(self.schema)
+            self.assertTrue(gen.is_valid(self.schema, instance))
+        self.assertEqual(
+            InstanceGenerator(self.spec, seed=2).generate(self.schema),
+            InstanceGenerator(self.spec, seed=2).generate(self.schema))
+
+    def test_invalid(self):
+        gen = InstanceGenerator(self.spec, seed=1)
+        for _ in range(20):
+            instance = gen.generate_invalid(self.schema)
+            self.assertFalse(gen.is_valid(self.schema, instance))
+        with self.assertRaises(GenerationError):
+            gen.generate_invalid({})
+
+    def test_multiple_of(self):
+        # 小数の multipleOf でも範囲内の倍数 (integer なら整数) を生成する
+        gen = InstanceGenerator(self.spec, seed=1)
+        for schema in (
+                {'type': 'integer', 'multipleOf': 0.5,
+                 'minimum': 1, 'maximum': 10},
+                {'type': 'integer', 'multipleOf': 1.5,
+                 'minimum': 2, 'maximum': 20, 'exclusiveMaximum': True},
+                {'type': 'integer', 'multipleOf': 7},
+                {'type': 'number', 'multipleOf': 0.5,
+                 'minimum': 0.2, 'maximum': 0.9}):
+            for _ in range(20):
+                instance = gen.generate(schema)
+                self.assertTrue(gen.is_valid(schema, instance), instance)
+                if schema['type'] == 'integer':
+                    self.assertIs(type(instance), int)
+
+    def test_size(self):
+        gen = InstanceGenerator(self.spec, seed=1)
+        instance = gen.generate(self.schema, size=50000)
+        self.assertTrue(gen.is_valid(self.schema, instance))
+        self.assertGreaterEqual(len(json.dumps(instance)), 50000)
+        limited = dict(self.schema, maxItems=3)
+        self.assertLessEqual(len(gen.generate(limited, size=50000)), 3)
+
+
+class RequestGeneratorTests(unittest.TestCase):
+    def _check(self, schema_name, patterns, settings=None):
+        app = create_webapp(schema_name, patterns, settings=settings)
+        traffic = create_traffic(schema_name)
+        for op in traffic.operations:
+            if op.path not in patterns:
+                continue
+            for _ in range(5):
+                req = traffic.generate(op)
+                self.assertEqual(req.send(app).status_int, 200, req)
+                try:
+                    req = traffic.generate(op, invalid=True)
+                except GenerationError:
+                    break
+                self.assertEqual(req.send(app).status_int, 400, req)
+
+    def test_params(self):
+        self._check('test_params', [
+            '/test_type_convert',
+            '/test_required',
+            '/path_test/{d0}/{d1}/{d2}/{d3}/{d4}',
+            '/test_invalid',
+            '/test_fill',
+            '/test_in_query',
+        ], settings={'pyramid_oas3.fill_by_default': True})
+
+    def test_body(self):
+        patterns = [
+            path for path in load_schema('test_body')['paths']
+            if path not in ('/test_stream_iter', '/test_ndjson')]
+        self._check('test_body', patterns)
+
+    def test_iter_requests(self):
+        traffic = create_traffic('test_body', seed=3)
+        requests = list(traffic.iter_requests(
+            len(traffic.operations), body_size=2000))
+        self.assertEqual(
+            [r.operation for r in requests],
+            [op.name for op in traffic.operations])
+        stream = [r for r in requests if r.operation == 'POST /test_stream']
+        # maxItems: 3 の配列は大きくできない
+        self.assertLessEqual(len(json.loads(stream[0].body)), 3)